@@ -0,0 +1,275 @@
+"""Lexer benchmarks.
+
+Run with `python -m benchmarks.bench_lexer` from the repository root.
+"""
+import copy
+import random
+import re
+import time
+import timeit
+import tracemalloc
+
+from parsergen.lexer import Lexer, LexerMeta, _group_count
+from parsergen.lexer_generator import LexerGenerator
+
+KEYWORDS = [
+    "and", "as", "assert", "async", "await", "break", "class", "continue",
+    "def", "del", "elif", "else", "except", "finally", "for", "from",
+    "global", "if", "import", "in", "is", "lambda", "nonlocal", "not",
+    "or", "pass", "raise", "return", "try", "while", "with", "yield",
+    "match", "case", "type", "let", "var", "const", "enum", "struct",
+]
+OPERATORS = [
+    r"\*\*", r"//", r"==", r"!=", r"<=", r">=", r"\+", r"-", r"\*", r"/",
+    r"%", r"<", r">", r"=", r"\(", r"\)", r"\[", r"\]", r"\{", r"\}",
+]
+
+
+def make_lexer(keywords=False):
+    """Builds a 60-token lexer: 40 keywords, 20 operators, plus literals.
+    With `keywords`, the keywords are given as a `keywords` table instead of
+    as rules."""
+    namespace = LexerMeta.__prepare__("BenchLexer", (Lexer,))
+    if keywords:
+        namespace["keywords"] = {kw: kw.upper() for kw in KEYWORDS}
+    else:
+        for kw in KEYWORDS:
+            namespace[kw.upper()] = kw
+    for c, op in enumerate(OPERATORS):
+        namespace[f"OP{c}"] = op
+    namespace["NUMBER"] = r"[0-9]+"
+    namespace["NAME"] = r"[A-Za-z_][A-Za-z0-9_]*"
+    namespace["ignore"] = " \t\n"
+    namespace["ignore_comment"] = r"\#.*"
+    return LexerMeta("BenchLexer", (Lexer,), namespace)
+
+
+def make_source(n_tokens, seed=0):
+    rng = random.Random(seed)
+    words = KEYWORDS + ["foo", "bar", "baz", "x", "value", "12", "3456"]
+    ops = [re.sub(r"\\", "", op) for op in OPERATORS]
+    parts = []
+    for i in range(n_tokens):
+        parts.append(rng.choice(words) if i % 2 == 0 else rng.choice(ops))
+        if i % 16 == 15:
+            parts.append("\n")
+    return " ".join(parts)
+
+
+class CountingPattern:
+    def __init__(self, pattern, counter):
+        self.pattern = pattern
+        self.counter = counter
+
+    def match(self, text, pos):
+        self.counter[0] += 1
+        return self.pattern.match(text, pos)
+
+
+def per_rule_lexer(lexer_cls, counter, dispatch=False):
+    """A copy of `lexer_cls` that tries each rule's regex in turn, like
+    the lexer did before the rules were merged into one regex. With
+    `dispatch`, only the rules that can start with the next character
+    are tried."""
+    table = copy.copy(lexer_cls._table)
+    table.master = None
+
+    def counting(compiled):
+        return [(name, rule, CountingPattern(pattern, counter)) for name, rule, pattern in compiled]
+
+    table.compiled = counting(table.compiled)
+    if dispatch:
+        table.dispatch = {c: (None, [], counting(entry[2])) for c, entry in table.dispatch.items()}
+        table.default = (None, [], counting(table.default[2]))
+    else:
+        table.dispatch = {}
+        table.default = (None, [], table.compiled)
+    per_rule = type(f"PerRule{lexer_cls.__name__}", (lexer_cls,), {})
+    per_rule._table = table
+    return per_rule
+
+
+def without_dispatch(lexer_cls):
+    """A copy of `lexer_cls` that always matches against all its rules"""
+    table = copy.copy(lexer_cls._table)
+    table.dispatch = {}
+    table.default = (table.master, table.groups, table.compiled)
+    full = type(f"Full{lexer_cls.__name__}", (lexer_cls,), {})
+    full._table = table
+    return full
+
+
+def bench_master_regex(n_tokens=5000, repeat=5):
+    BenchLexer = without_dispatch(make_lexer())
+    source = make_source(n_tokens)
+
+    lexer = BenchLexer()
+    master = min(timeit.repeat(lambda: lexer.lex_string(source), number=1, repeat=repeat))
+
+    counter = [0]
+    legacy_lexer = per_rule_lexer(BenchLexer, counter)()
+    legacy = min(timeit.repeat(lambda: legacy_lexer.lex_string(source), number=1, repeat=repeat))
+    calls = counter[0] / repeat
+
+    assert lexer.lex_string(source).tokens == legacy_lexer.lex_string(source).tokens
+    print(f"{len(BenchLexer.tokens)} token rules, {n_tokens} tokens")
+    print(f"  per-rule loop : {legacy * 1000:8.2f} ms  ({calls / n_tokens:.1f} match calls per token)")
+    print(f"  master regex  : {master * 1000:8.2f} ms  (1 match call per token)")
+    print(f"  speedup       : {legacy / master:8.2f}x")
+
+
+def bench_first_char(n_tokens=20000, repeat=5):
+    """Only trying the rules that can start with the next character"""
+    BenchLexer = make_lexer()
+    source = make_source(n_tokens)
+    counts = {}
+    for dispatch in (False, True):
+        counter = [0]
+        per_rule_lexer(BenchLexer, counter, dispatch)().lex_string(source)
+        counts[dispatch] = counter[0] / n_tokens
+    full = min(timeit.repeat(lambda: without_dispatch(BenchLexer)().lex_string(source), number=1, repeat=repeat))
+    dispatched = min(timeit.repeat(lambda: BenchLexer().lex_string(source), number=1, repeat=repeat))
+    print(f"first character dispatch, {len(BenchLexer.tokens)} token rules, {n_tokens} tokens")
+    print(f"  rules tried per token : {counts[False]:6.1f} -> {counts[True]:.1f}")
+    print(f"  master regex          : {full * 1000:8.2f} ms -> {dispatched * 1000:.2f} ms")
+
+
+def bench_ignore(n_lines=20000, repeat=5):
+    """A whitespace and comment heavy source: indented lines with comments"""
+    BenchLexer = make_lexer()
+    source = "".join(
+        f"{'    ' * (c % 6)}foo = bar + {c}    # comment {c}\n\n" for c in range(n_lines)
+    )
+    elapsed = min(timeit.repeat(lambda: BenchLexer().lex_string(source), number=1, repeat=repeat))
+    streamed = min(timeit.repeat(lambda: list(BenchLexer().lex_iter([source])), number=1, repeat=repeat))
+    print(f"ignored input, {n_lines} indented lines with comments")
+    print(f"  lex_string : {elapsed * 1000:8.2f} ms")
+    print(f"  lex_iter   : {streamed * 1000:8.2f} ms")
+
+
+def bench_keywords(n_tokens=20000, repeat=5):
+    """Keywords as rules tried before NAME, or as a promotion table"""
+    source = make_source(n_tokens)
+    print(f"keywords, {n_tokens} tokens")
+    for keywords in (False, True):
+        BenchLexer = make_lexer(keywords)
+        lexer = BenchLexer(instrument=True)
+        lexer.lex_string(source)
+        calls = sum(stats.attempts for stats in lexer.stats.rules.values()) / n_tokens
+        elapsed = min(timeit.repeat(lambda: BenchLexer().lex_string(source), number=1, repeat=repeat))
+        name = "keywords table" if keywords else "keyword rules"
+        print(f"  {name:15}: {elapsed * 1000:8.2f} ms  ({calls:.2f} regexes tried per token)")
+
+
+def bench_generated(n_tokens=20000, repeat=20):
+    """The lexer class against the module LexerGenerator makes from it"""
+    source = make_source(n_tokens)
+    code = compile(LexerGenerator().generate(make_lexer()), "generated", "exec")
+
+    def load():
+        namespace = {}
+        exec(code, namespace)
+        return namespace["BenchLexer"]
+
+    def fresh(create):
+        # don't reuse patterns compiled by the previous run
+        re.purge()
+        _group_count.cache_clear()
+        return create()
+
+    built = min(timeit.repeat(lambda: fresh(make_lexer), number=1, repeat=repeat))
+    loaded = min(timeit.repeat(lambda: fresh(load), number=1, repeat=repeat))
+    BenchLexer, Generated = make_lexer(), load()
+    assert BenchLexer().lex_string(source).tokens == Generated().lex_string(source).tokens
+    lexed = min(timeit.repeat(lambda: BenchLexer().lex_string(source), number=1, repeat=repeat))
+    generated = min(timeit.repeat(lambda: Generated().lex_string(source), number=1, repeat=repeat))
+    print(f"generated lexer module, {n_tokens} tokens")
+    print(f"  class creation : {built * 1000:8.2f} ms -> {loaded * 1000:.2f} ms")
+    print(f"  lex_string     : {lexed * 1000:8.2f} ms -> {generated * 1000:.2f} ms")
+
+
+def bench_parallel(n_tokens=1000000, workers=(2, 4, 8)):
+    BenchLexer = make_lexer()
+    BenchLexer.__module__ = __name__ # let worker processes find the class
+    globals()["BenchLexer"] = BenchLexer
+    source = make_source(n_tokens)
+    lexer = BenchLexer()
+    start = time.perf_counter()
+    expected = lexer.lex_string(source)
+    serial = time.perf_counter() - start
+    print(f"parallel lexing, {n_tokens} tokens")
+    print(f"  {'lex_string':24}: {serial * 1000:8.2f} ms")
+    for n in workers:
+        start = time.perf_counter()
+        result = lexer.lex_parallel(source, workers=n)
+        elapsed = time.perf_counter() - start
+        assert len(result.tokens) == len(expected.tokens)
+        print(f"  {f'lex_parallel, {n} workers':24}: {elapsed * 1000:8.2f} ms  ({serial / elapsed:.2f}x)")
+
+
+def bench_relex(sizes=(25000, 100000, 400000), repeat=5, edits=200):
+    """Re-lexing after a one character edit in the middle of the input, and
+    per edit over a run of edits, each made on the previous result. Only
+    copying the edited source should grow with the input size."""
+    BenchLexer = make_lexer()
+    lexer = BenchLexer()
+    print("relex after a one character edit")
+    for n in sizes:
+        source = make_source(n)
+        previous = lexer.lex_string(source)
+        previous.line_text(1)
+        middle = source.index(" ", len(source) // 2)
+        full = min(timeit.repeat(lambda: lexer.lex_string(source[:middle] + "x" + source[middle:]), number=1, repeat=repeat))
+        copy_source = min(timeit.repeat(lambda: source[:middle] + "x" + source[middle:], number=1, repeat=repeat))
+        relex = min(timeit.repeat(lambda: lexer.relex(previous, middle, middle, "x"), number=1, repeat=repeat))
+        
+        result = previous
+        start = time.perf_counter()
+        for c in range(edits):
+            result = lexer.relex(result, middle + c, middle + c, "x")
+            result.tokens[len(result.tokens) // 2].start # as an editor would
+        run = (time.perf_counter() - start) / edits
+        print(f"  {len(source):10} chars : lex_string {full * 1000:8.2f} ms, relex {relex * 1000:6.2f} ms "
+              f"(copying the source {copy_source * 1000:5.2f} ms), {run * 1000:6.2f} ms per edit of {edits}")
+
+
+def bench_scaling(sizes=(25000, 50000, 100000, 200000)):
+    """Lex time should grow linearly with the input size"""
+    BenchLexer = make_lexer()
+    print("input size scaling")
+    previous = None
+    for n_tokens in sizes:
+        source = make_source(n_tokens)
+        elapsed = min(timeit.repeat(lambda: BenchLexer().lex_string(source), number=1, repeat=3))
+        ratio = f"  ({elapsed / previous:.2f}x previous)" if previous else ""
+        print(f"  {len(source):>9} chars : {elapsed * 1000:8.2f} ms{ratio}")
+        previous = elapsed
+
+
+def bench_memory(n_tokens=100000):
+    """Memory held per token by a LexerResult"""
+    BenchLexer = make_lexer()
+    source = make_source(n_tokens)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    result = BenchLexer().lex_string(source)
+    buffer_size = tracemalloc.get_traced_memory()[0] - baseline
+    tokens = list(result.tokens) # a list of Token objects, as LexerResult used to hold
+    list_size = tracemalloc.get_traced_memory()[0] - baseline - buffer_size
+    tracemalloc.stop()
+    count = len(tokens)
+    print(f"memory per token ({count} tokens)")
+    print(f"  list of Token : {list_size / count:8.1f} bytes")
+    print(f"  TokenBuffer   : {buffer_size / count:8.1f} bytes")
+
+
+if __name__ == "__main__":
+    bench_master_regex()
+    bench_first_char()
+    bench_ignore()
+    bench_keywords()
+    bench_generated()
+    bench_parallel()
+    bench_relex()
+    bench_scaling()
+    bench_memory()
@@ -0,0 +1,260 @@
+"""Parser benchmarks.
+
+Run with `python -m benchmarks.bench_parser` from the repository root.
+"""
+import random
+import re
+import sys
+import timeit
+
+from parsergen.grammar_utils import GrammarLexer
+from parsergen.lexer import Lexer, TokenStream
+from parsergen.parser_utils import GeneratedParser, LRU, Unbounded, Window, memoize
+from parsergen.parsergen import Generator
+
+
+class CalcLexer(Lexer):
+    INT    = r"[0-9]+"
+    ADD    = r"\+"
+    SUB    = r"\-"
+    POW    = r"\*\*"
+    MUL    = r"\*"
+    DIV    = r"\/"
+    LPAREN = r"\("
+    RPAREN = r"\)"
+    ignore = " \t\n"
+
+
+class LegacyParser(GeneratedParser):
+    """How tokens were matched before rules had memo ids"""
+    expect = memoize(GeneratedParser.expect)
+    expect_constant = memoize(GeneratedParser.expect_constant)
+
+
+class MemoizeAllGenerator(Generator):
+    """Memoizes every rule, as before rules were memoized selectively"""
+    def memoized_rules(self, grammar, left_recursive, leaders):
+        return set(grammar) - (left_recursive - leaders)
+
+
+class ExpectGenerator(Generator):
+    """Matches tokens by calling expect() and expect_constant(), as before
+    token matching was inlined"""
+    def gen_TokenPointer(self, item, queue):
+        self.push(f"part = self.expect({item.target!r})")
+
+    def gen_ConstantString(self, item, queue):
+        self.push(f"part = self.expect_constant({item.value!r})")
+
+
+class NoDispatchGenerator(Generator):
+    """Tries every alternative of a rule, as before alternatives were
+    dispatched on the next token"""
+    def alternative_guards(self, grammar):
+        return {name: [None] * len(stmts) for name, stmts in grammar.items()}
+
+
+class WordLexer(Lexer):
+    WORD = r"[a-e]"
+    X    = r"x"
+    ignore = " "
+
+WORD_GRAMMAR = """
+start :  items=item* EOF { len(items) };
+item  :  'a' 'b' 'c' 'd';
+      :  'a' 'b' 'c' 'e';
+      :  'a' 'b' X;
+      :  X X X;
+      :  X 'a';
+      :  X WORD WORD;
+"""
+
+
+def make_parser(path, legacy=False, generator_cls=Generator, grammar=None, **options):
+    """Generates the parser for the grammar at `path`. With `legacy`, the
+    rules are memoized by (pos, func, args) keys instead of by rule id."""
+    if grammar is None:
+        with open(path) as f:
+            grammar = f.read()
+    generator = generator_cls(**options)
+    code = generator.generate(grammar, display=False)
+    if legacy:
+        code = re.sub(r"@memoize_rule\(\d+\)", "@memoize", code)
+        code = re.sub(r"@memoize_left_rec_rule\(\d+\)", "@memoize_left_rec", code)
+        code = code.replace("(GeneratedParser)", "(LegacyParser)")
+    # the metagrammar's header imports relative to parsergen
+    namespace = {"__name__": "parsergen.generated", "__package__": "parsergen", "LegacyParser": LegacyParser}
+    exec(code, namespace)
+    return namespace[generator.config["class_name"]]
+
+
+def make_expression(n_terms, seed=0):
+    rng = random.Random(seed)
+    parts = [str(rng.randint(1, 9))]
+    for i in range(1, n_terms):
+        parts.append(rng.choice("+-*"))
+        term = str(rng.randint(1, 9))
+        if i % 7 == 0:
+            term = f"({term} + {rng.randint(1, 9)}) ** 1"
+        parts.append(term)
+    return " ".join(parts)
+
+
+def make_grammar_source(copies):
+    with open("parsergen/metagrammar.gram") as f:
+        grammar = f.read()
+    return "\n".join(grammar for _ in range(copies))
+
+
+def count_lookups(parser_cls, result, rule):
+    """Number of memo lookups for rules during a parse, leaving out those
+    for the tokens matched by the legacy parsers"""
+    count = 0
+    wrappers = {"memoize_wrapper", "memoize_left_rec_wrapper"}
+    token_methods = {"expect", "expect_constant"}
+
+    def profile(frame, event, arg):
+        nonlocal count
+        if event == "call" and frame.f_code.co_name in wrappers:
+            if frame.f_locals["func"].__name__ not in token_methods:
+                count += 1
+
+    sys.setprofile(profile)
+    try:
+        getattr(parser_cls(TokenStream(result)), rule)()
+    finally:
+        sys.setprofile(None)
+    return count
+
+
+def compare(name, variants, result, rule, repeat):
+    print(name)
+    for label, parser_cls in variants:
+        parse = lambda: getattr(parser_cls(TokenStream(result)), rule)()
+        best = min(timeit.repeat(parse, number=1, repeat=repeat))
+        lookups = count_lookups(parser_cls, result, rule)
+        print(f"  {label:<16} {best * 1000:8.1f} ms  {lookups:>7} lookups  {lookups / best / 1e6:5.2f}M lookups/s")
+
+
+def bench_memo_calc(n_terms=3000, repeat=10):
+    """Memo lookups by (pos, func, args) key against by rule id, calc grammar"""
+    result = CalcLexer().lex_string(make_expression(n_terms))
+    variants = [
+        ("tuple keys", make_parser("examples/calc.gram", legacy=True)),
+        ("rule ids", make_parser("examples/calc.gram")),
+    ]
+    compare("calc grammar", variants, result, "start", repeat)
+
+
+def bench_memo_grammar(copies=20, repeat=10):
+    """The same for GrammarParser, parsing copies of the metagrammar"""
+    result = GrammarLexer().lex_string(make_grammar_source(copies))
+    variants = [
+        ("tuple keys", make_parser("parsergen/metagrammar.gram", legacy=True)),
+        ("rule ids", make_parser("parsergen/metagrammar.gram")),
+    ]
+    compare("metagrammar", variants, result, "parser_definition", repeat)
+
+
+def bench_selective(n_terms=3000, copies=20, repeat=10):
+    """Memoizing every rule against only those that can be tried twice at
+    the same position"""
+    calc = CalcLexer().lex_string(make_expression(n_terms))
+    grammar = GrammarLexer().lex_string(make_grammar_source(copies))
+    for name, path, result, rule in [
+        ("calc grammar", "examples/calc.gram", calc, "start"),
+        ("metagrammar", "parsergen/metagrammar.gram", grammar, "parser_definition"),
+    ]:
+        variants = [
+            ("all rules", make_parser(path, generator_cls=MemoizeAllGenerator)),
+            ("selective", make_parser(path)),
+        ]
+        compare(name, variants, result, rule, repeat)
+
+
+def bench_token_matching(n_items=20000, repeat=10):
+    """Tokens matched by calling expect() against inline checks, on a
+    grammar that tries many terminals at each position"""
+    rng = random.Random(0)
+    items = ["a b c d", "a b c e", "a b x", "x x x", "x a", "x b c"]
+    result = WordLexer().lex_string(" ".join(rng.choice(items) for _ in range(n_items)))
+    variants = [
+        ("expect()", make_parser(None, generator_cls=ExpectGenerator, grammar=WORD_GRAMMAR)),
+        ("inline", make_parser(None, grammar=WORD_GRAMMAR)),
+    ]
+    compare("terminal heavy grammar", variants, result, "start", repeat)
+
+
+def bench_dispatch(n_terms=3000, copies=20, repeat=10):
+    """Trying every alternative against skipping those that can't start
+    with the next token"""
+    calc = CalcLexer().lex_string(make_expression(n_terms))
+    grammar = GrammarLexer().lex_string(make_grammar_source(copies))
+    for name, path, result, rule in [
+        ("calc grammar", "examples/calc.gram", calc, "start"),
+        ("metagrammar", "parsergen/metagrammar.gram", grammar, "parser_definition"),
+    ]:
+        variants = [
+            ("all", make_parser(path, generator_cls=NoDispatchGenerator)),
+            ("dispatch", make_parser(path)),
+        ]
+        compare(name, variants, result, rule, repeat)
+
+
+def bench_straight_line(n_terms=3000, copies=20, repeat=10):
+    """Alternatives in a loop collecting parts against straight line code,
+    and the size of the generated modules"""
+    calc = CalcLexer().lex_string(make_expression(n_terms))
+    grammar = GrammarLexer().lex_string(make_grammar_source(copies))
+    for name, path, result, rule in [
+        ("calc grammar", "examples/calc.gram", calc, "start"),
+        ("metagrammar", "parsergen/metagrammar.gram", grammar, "parser_definition"),
+    ]:
+        with open(path) as f:
+            source = f.read()
+        sizes = [len(Generator(**options).generate(source, display=False)) for options in ({}, {"straight_line": True, "docstrings": False})]
+        variants = [
+            ("parts", make_parser(path)),
+            ("straight", make_parser(path, straight_line=True, docstrings=False)),
+        ]
+        compare(f"{name}, {sizes[0]} against {sizes[1]} bytes", variants, result, rule, repeat)
+
+
+def bench_inline(copies=20, repeat=10):
+    """Helper methods for every group, alternation and quantifier against
+    inlining the small ones, on the metagrammar, which has many `X?` and
+    `(A | B)` items"""
+    result = GrammarLexer().lex_string(make_grammar_source(copies))
+    path = "parsergen/metagrammar.gram"
+    variants = [
+        ("helpers", make_parser(path, inline_size=0)),
+        ("inline", make_parser(path)),
+        ("inline, straight", make_parser(path, straight_line=True, docstrings=False)),
+    ]
+    compare("metagrammar", variants, result, "parser_definition", repeat)
+
+
+def bench_memo_policy(copies=20, repeat=10):
+    """Parse time and rows of results held under each memo policy"""
+    result = GrammarLexer().lex_string(make_grammar_source(copies))
+    parser_cls = make_parser("parsergen/metagrammar.gram")
+    print("memo policies, metagrammar")
+    for policy in (Unbounded(), LRU(1000), LRU(100), Window(200), Window(20)):
+        parse = lambda: parser_cls(TokenStream(result), memo_policy=policy).parser_definition()
+        best = min(timeit.repeat(parse, number=1, repeat=repeat))
+        parser = parser_cls(TokenStream(result), memo_policy=policy)
+        parser.parser_definition()
+        stats = parser.memo_stats
+        label = type(policy).__name__ + "".join(f" {v}" for v in vars(policy).values())
+        print(f"  {label:<12} {best * 1000:8.1f} ms  {stats.created:>6} rows  {stats.evicted:>6} evicted  {stats.peak:>6} peak")
+
+
+if __name__ == "__main__":
+    bench_memo_calc()
+    bench_memo_grammar()
+    bench_selective()
+    bench_token_matching()
+    bench_dispatch()
+    bench_straight_line()
+    bench_inline()
+    bench_memo_policy()
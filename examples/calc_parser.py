@@ -1,265 +1,381 @@
 # Code @generated by parsergen; do not edit!
 from parsergen.parser_utils import GeneratedParser, TokenStream, Node, Filler
-from parsergen.parser_utils import memoize, memoize_left_rec
+from parsergen.parser_utils import memoize, memoize_left_rec, memoize_rule, memoize_left_rec_rule
+from parsergen.lexer import token_type_id
 from functools import reduce
+ADD = token_type_id('ADD')
+SUB = token_type_id('SUB')
+MUL = token_type_id('MUL')
+DIV = token_type_id('DIV')
+POW = token_type_id('POW')
+INT = token_type_id('INT')
+LPAREN = token_type_id('LPAREN')
+RPAREN = token_type_id('RPAREN')
+_first_0 = frozenset((INT, LPAREN))
+
 class CalcParser(GeneratedParser):
-    @memoize
+    memo_size = 4
+    
     def start(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        e=expr EOF { e };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expr()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('EOF')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            e = parts[0]
-            return e
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_0:
+            """
+            e=expr EOF { e };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.expr()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.expect('EOF')
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                e = parts[0]
+                return e
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize_left_rec
+    @memoize_left_rec_rule(0)
     def expr(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        left=expr ADD right=term { left + right };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expr()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('ADD')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.term()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            left = parts[0]
-            right = parts[2]
-            return left + right
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_0:
+            """
+            left=expr ADD right=term { left + right };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.expr()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('ADD')
+                elif _types[_at] == ADD:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.term()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                left = parts[0]
+                right = parts[2]
+                return left + right
+            self.goto(pos)
+        else:
+            self.fail()
         
-        """
-        left=expr SUB right=term { left - right };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expr()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('SUB')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.term()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            left = parts[0]
-            right = parts[2]
-            return left - right
-        self.goto(pos)
+        if _next is None or _next in _first_0:
+            """
+            left=expr SUB right=term { left - right };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.expr()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('SUB')
+                elif _types[_at] == SUB:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.term()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                left = parts[0]
+                right = parts[2]
+                return left - right
+            self.goto(pos)
+        else:
+            self.fail()
         
-        """
-        e=term { e };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.term()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            e = parts[0]
-            return e
-        self.goto(pos)
+        if _next is None or _next in _first_0:
+            """
+            e=term { e };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.term()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                e = parts[0]
+                return e
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize_left_rec
+    @memoize_left_rec_rule(1)
     def term(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        left=term MUL right=factor { left * right };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.term()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('MUL')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.factor()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            left = parts[0]
-            right = parts[2]
-            return left * right
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_0:
+            """
+            left=term MUL right=factor { left * right };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.term()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('MUL')
+                elif _types[_at] == MUL:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.factor()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                left = parts[0]
+                right = parts[2]
+                return left * right
+            self.goto(pos)
+        else:
+            self.fail()
         
-        """
-        left=term DIV right=factor { left / right };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.term()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('DIV')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.factor()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            left = parts[0]
-            right = parts[2]
-            return left / right
-        self.goto(pos)
+        if _next is None or _next in _first_0:
+            """
+            left=term DIV right=factor { left / right };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.term()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('DIV')
+                elif _types[_at] == DIV:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.factor()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                left = parts[0]
+                right = parts[2]
+                return left / right
+            self.goto(pos)
+        else:
+            self.fail()
         
-        """
-        e=factor { e };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.factor()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            e = parts[0]
-            return e
-        self.goto(pos)
+        if _next is None or _next in _first_0:
+            """
+            e=factor { e };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.factor()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                e = parts[0]
+                return e
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize_left_rec
+    @memoize_rule(2)
     def factor(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        left=item POW right=factor { left ** right };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.item()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('POW')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.factor()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            left = parts[0]
-            right = parts[2]
-            return left ** right
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_0:
+            """
+            left=item POW right=factor { left ** right };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.item()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('POW')
+                elif _types[_at] == POW:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.factor()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                left = parts[0]
+                right = parts[2]
+                return left ** right
+            self.goto(pos)
+        else:
+            self.fail()
         
-        """
-        e=item { e };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.item()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            e = parts[0]
-            return e
-        self.goto(pos)
+        if _next is None or _next in _first_0:
+            """
+            e=item { e };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.item()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                e = parts[0]
+                return e
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize_left_rec
+    @memoize_rule(3)
     def item(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        n=INT { int(n.value) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('INT')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            n = parts[0]
-            return int(n.value)
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next == INT:
+            """
+            n=INT { int(n.value) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('INT')
+                elif _types[_at] == INT:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                n = parts[0]
+                return int(n.value)
+            self.goto(pos)
+        else:
+            self.fail()
         
-        """
-        LPAREN e=expr RPAREN { e };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('LPAREN')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expr()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('RPAREN')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            e = parts[1]
-            return e
-        self.goto(pos)
+        if _next is None or _next == LPAREN:
+            """
+            LPAREN e=expr RPAREN { e };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('LPAREN')
+                elif _types[_at] == LPAREN:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.expr()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('RPAREN')
+                elif _types[_at] == RPAREN:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                e = parts[1]
+                return e
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
@@ -1,23 +1,53 @@
 from .parsergen import *
+from .lexer_generator import LexerGenerator
 from . import __version__
 import argparse
+import importlib
+import sys
+import os
 
-def main():
+def output(result: str, outfile: Optional[str]):
+    if outfile:
+        with open(outfile, "w") as f:
+            f.write(result)
+    else:
+        print(result)
+
+def load_lexer(target: str):
+    """Imports a Lexer class given as 'module:ClassName'"""
+    module_name, _, class_name = target.partition(":")
+    if not class_name:
+        raise SystemExit(f"parsergen lexer: expected 'module:ClassName', got {target!r}")
+    sys.path.insert(0, os.getcwd())
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+def lexer_main(argv: List[str]):
+    p = argparse.ArgumentParser("parsergen lexer", description="Generate a precompiled lexer module from a Lexer class")
+    p.add_argument("lexer", type=str, metavar="module:ClassName")
+    p.add_argument("-o", type=str, metavar="outfile")
+    args = p.parse_args(argv)
+
+    generator = LexerGenerator()
+    output(generator.generate(load_lexer(args.lexer)), args.o)
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["lexer"]:
+        return lexer_main(argv[1:])
     p = argparse.ArgumentParser("parsergen")
     p.add_argument("file", type=argparse.FileType('r'))
     p.add_argument("-o", type=str, metavar="outfile")
+    p.add_argument("--straight-line", action="store_true", help="emit alternatives without parts lists, see Generator")
+    p.add_argument("--no-docstrings", action="store_true", help="leave out the grammar of each alternative")
     p.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
-    args = p.parse_args()
+    args = p.parse_args(argv)
     grammar = args.file.read()
 
-    generator = Generator()
+    generator = Generator(straight_line=args.straight_line, docstrings=not args.no_docstrings)
 
     result = generator.generate(grammar)
-    if args.o:
-        with open(args.o, "w") as f:
-            f.write(result)
-    else:
-        print(result)
+    output(result, args.o)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,12 +1,36 @@
 # Code @generated by parsergen; do not edit!
 from parsergen.parser_utils import GeneratedParser, TokenStream, Node, Filler
-from parsergen.parser_utils import memoize, memoize_left_rec
+from parsergen.parser_utils import memoize, memoize_left_rec, memoize_rule, memoize_left_rec_rule
+from parsergen.lexer import token_type_id
 from functools import reduce
 
 from .grammar_utils import *
 
+AT = token_type_id('AT')
+ID = token_type_id('ID')
+EQ = token_type_id('EQ')
+STRING = token_type_id('STRING')
+COLON = token_type_id('COLON')
+ACTION = token_type_id('ACTION')
+TERMINATE = token_type_id('TERMINATE')
+OR = token_type_id('OR')
+STAR = token_type_id('STAR')
+PLUS = token_type_id('PLUS')
+QMARK = token_type_id('QMARK')
+AND = token_type_id('AND')
+NOT = token_type_id('NOT')
+LPAREN = token_type_id('LPAREN')
+RPAREN = token_type_id('RPAREN')
+TOKEN = token_type_id('TOKEN')
+TILDE = token_type_id('TILDE')
+_first_0 = frozenset((ACTION, AND, COLON, ID, LPAREN, NOT, STRING, TERMINATE, TILDE, TOKEN))
+_first_1 = frozenset((AND, ID, LPAREN, NOT, STRING, TILDE, TOKEN))
+_first_2 = frozenset((ID, LPAREN, STRING, TILDE, TOKEN))
+_first_3 = frozenset((ID, STRING, TILDE, TOKEN))
+
 class GrammarParser(GeneratedParser):
-    @memoize
+    memo_size = 7
+    
     def parser_definition(self):
         pos = self.mark()
         """
@@ -14,7 +38,16 @@ class GrammarParser(GeneratedParser):
         """
         parts = []
         for _ in range(1):
-            part = self._loop_0()
+            # section*
+            _children_0 = []
+            while True:
+                _pos_0 = self.mark()
+                part = self.section()
+                if self.match(part): _children_0.append(part)
+                else:
+                    self.goto(_pos_0)
+                    break
+            part = _children_0
             if not self.match(part):
                 self.fail()
                 break
@@ -31,196 +64,347 @@ class GrammarParser(GeneratedParser):
         
         return None
         
-    def _loop_0(self):
-        """
-        section*
-        """
-        children = []
-        while True:
-            pos = self.mark()
-            part = self.section()
-            if self.match(part): children.append(part)
-            else:
-                self.goto(pos)
-                break
-        return children
-    @memoize
+    @memoize_rule(0)
     def section(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        s=statement { s };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.statement()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            s = parts[0]
-            return s
-        self.goto(pos)
-        
-        """
-        s=configuration { s };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.configuration()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            s = parts[0]
-            return s
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_0:
+            """
+            s=statement { s };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.statement()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                s = parts[0]
+                return s
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == AT:
+            """
+            s=configuration { s };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.configuration()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                s = parts[0]
+                return s
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == AT:
+            """
+            s=annotated_statement { s };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.annotated_statement()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                s = parts[0]
+                return s
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize
     def configuration(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        AT name=ID EQ value=STRING { ConfigurationCall(name.value, value.value) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('AT')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('ID')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('EQ')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('STRING')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            name = parts[1]
-            value = parts[3]
-            return ConfigurationCall(name.value, value.value)
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next == AT:
+            """
+            AT name=ID EQ value=STRING { ConfigurationCall(name.value, value.value) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('AT')
+                elif _types[_at] == AT:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('ID')
+                elif _types[_at] == ID:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('EQ')
+                elif _types[_at] == EQ:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('STRING')
+                elif _types[_at] == STRING:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                name = parts[1]
+                value = parts[3]
+                return ConfigurationCall(name.value, value.value)
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize
+    @memoize_rule(1)
+    def annotated_statement(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
+        pos = self.mark()
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next == AT:
+            """
+            AT a=ID s=annotated_statement { s.annotated(a.value) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('AT')
+                elif _types[_at] == AT:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('ID')
+                elif _types[_at] == ID:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.annotated_statement()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                a = parts[1]
+                s = parts[2]
+                return s.annotated(a.value)
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == AT:
+            """
+            AT a=ID s=statement { s.annotated(a.value) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('AT')
+                elif _types[_at] == AT:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('ID')
+                elif _types[_at] == ID:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.statement()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                a = parts[1]
+                s = parts[2]
+                return s.annotated(a.value)
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        return None
+        
+    @memoize_rule(2)
     def statement(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        n=(ID? COLON)? es=expr* a=ACTION? TERMINATE { Statement(
-            n[0].value if not isinstance(n, Filler) and not isinstance(n[0], Filler) else "<>", 
-            es, 
-            action=a.value if not isinstance(a, Filler) else None
-        ) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self._maybe_1()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self._loop_2()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self._maybe_3()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('TERMINATE')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            n = parts[0]
-            es = parts[1]
-            a = parts[2]
-            return Statement(
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_0:
+            """
+            n=(ID? COLON)? es=expr* a=ACTION? TERMINATE { Statement(
                 n[0].value if not isinstance(n, Filler) and not isinstance(n[0], Filler) else "<>", 
                 es, 
                 action=a.value if not isinstance(a, Filler) else None
-            )
-        self.goto(pos)
+            ) };
+            """
+            parts = []
+            for _ in range(1):
+                # (ID? COLON)?
+                _pos_1 = self.mark()
+                # (ID? COLON)
+                _pos_2 = self.mark()
+                part = None
+                # ID?
+                _pos_3 = self.mark()
+                _at = _stream.pos
+                if _at >= _count:
+                    _2_0 = self.expect('ID')
+                elif _types[_at] == ID:
+                    _2_0 = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    _2_0 = None
+                if not self.match(_2_0):
+                    self.goto(_pos_3)
+                    _2_0 = Filler()
+                if self.match(_2_0):
+                    _at = _stream.pos
+                    if _at >= _count:
+                        _2_1 = self.expect('COLON')
+                    elif _types[_at] == COLON:
+                        _2_1 = _tokens[_at]
+                        _stream.pos = _at + 1
+                    else:
+                        _2_1 = None
+                    if _2_1 is not None:
+                        part = [_2_0, _2_1]
+                    else:
+                        self.fail()
+                else:
+                    self.fail()
+                if part is None:
+                    self.goto(_pos_2)
+                if not self.match(part):
+                    self.goto(_pos_1)
+                    part = Filler()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # expr*
+                _children_4 = []
+                while True:
+                    _pos_4 = self.mark()
+                    part = self.expr()
+                    if self.match(part): _children_4.append(part)
+                    else:
+                        self.goto(_pos_4)
+                        break
+                part = _children_4
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # ACTION?
+                _pos_5 = self.mark()
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('ACTION')
+                elif _types[_at] == ACTION:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.goto(_pos_5)
+                    part = Filler()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('TERMINATE')
+                elif _types[_at] == TERMINATE:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                n = parts[0]
+                es = parts[1]
+                a = parts[2]
+                return Statement(
+                    n[0].value if not isinstance(n, Filler) and not isinstance(n[0], Filler) else "<>", 
+                    es, 
+                    action=a.value if not isinstance(a, Filler) else None
+                )
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    def _maybe_1(self):
-        """
-        (ID? COLON)?
-        """
-        pos = self.mark()
-        part = self._expr_list_4()
-        if self.match(part): return part
-        self.goto(pos)
-        return Filler()
-    def _expr_list_4(self):
-        """
-        (ID? COLON)
-        """
-        pos = self.mark()
-        parts = []
-        for _ in range(1):
-            part = self._maybe_5()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('COLON')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            return parts
-        self.goto(pos)
-        return None
-    def _maybe_5(self):
-        """
-        ID?
-        """
-        pos = self.mark()
-        part = self.expect('ID')
-        if self.match(part): return part
-        self.goto(pos)
-        return Filler()
-    def _loop_2(self):
-        """
-        expr*
-        """
-        children = []
-        while True:
-            pos = self.mark()
-            part = self.expr()
-            if self.match(part): children.append(part)
-            else:
-                self.goto(pos)
-                break
-        return children
-    def _maybe_3(self):
-        """
-        ACTION?
-        """
-        pos = self.mark()
-        part = self.expect('ACTION')
-        if self.match(part): return part
-        self.goto(pos)
-        return Filler()
-    @memoize_left_rec
     def expr_list(self):
         pos = self.mark()
         """
@@ -228,7 +412,16 @@ class GrammarParser(GeneratedParser):
         """
         parts = []
         for _ in range(1):
-            part = self._loop_6()
+            # expr*
+            _children_6 = []
+            while True:
+                _pos_6 = self.mark()
+                part = self.expr()
+                if self.match(part): _children_6.append(part)
+                else:
+                    self.goto(_pos_6)
+                    break
+            part = _children_6
             if not self.match(part):
                 self.fail()
                 break
@@ -240,390 +433,517 @@ class GrammarParser(GeneratedParser):
         
         return None
         
-    def _loop_6(self):
-        """
-        expr*
-        """
-        children = []
-        while True:
-            pos = self.mark()
-            part = self.expr()
-            if self.match(part): children.append(part)
-            else:
-                self.goto(pos)
-                break
-        return children
-    @memoize_left_rec
+    @memoize_rule(3)
     def expr(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        name=(ID EQ)? v=or_op { NamedItem(name[0].value, v) if not isinstance(name, Filler) else v };
-        """
-        parts = []
-        for _ in range(1):
-            part = self._maybe_7()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.or_op()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            name = parts[0]
-            v = parts[1]
-            return NamedItem(name[0].value, v) if not isinstance(name, Filler) else v
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_1:
+            """
+            name=(ID EQ)? v=or_op { NamedItem(name[0].value, v) if not isinstance(name, Filler) else v };
+            """
+            parts = []
+            for _ in range(1):
+                # (ID EQ)?
+                _pos_7 = self.mark()
+                # (ID EQ)
+                _pos_8 = self.mark()
+                part = None
+                _at = _stream.pos
+                if _at >= _count:
+                    _8_0 = self.expect('ID')
+                elif _types[_at] == ID:
+                    _8_0 = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    _8_0 = None
+                if _8_0 is not None:
+                    _at = _stream.pos
+                    if _at >= _count:
+                        _8_1 = self.expect('EQ')
+                    elif _types[_at] == EQ:
+                        _8_1 = _tokens[_at]
+                        _stream.pos = _at + 1
+                    else:
+                        _8_1 = None
+                    if _8_1 is not None:
+                        part = [_8_0, _8_1]
+                    else:
+                        self.fail()
+                else:
+                    self.fail()
+                if part is None:
+                    self.goto(_pos_8)
+                if not self.match(part):
+                    self.goto(_pos_7)
+                    part = Filler()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.or_op()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                name = parts[0]
+                v = parts[1]
+                return NamedItem(name[0].value, v) if not isinstance(name, Filler) else v
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    def _maybe_7(self):
-        """
-        (ID EQ)?
-        """
-        pos = self.mark()
-        part = self._expr_list_8()
-        if self.match(part): return part
-        self.goto(pos)
-        return Filler()
-    def _expr_list_8(self):
-        """
-        (ID EQ)
-        """
-        pos = self.mark()
-        parts = []
-        for _ in range(1):
-            part = self.expect('ID')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('EQ')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            return parts
-        self.goto(pos)
-        return None
-    @memoize_left_rec
+    @memoize_rule(4)
     def or_op(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        v=star_op others=(OR star_op)* { OrOp(exprs=[v]+[o[1] for o in others]) if len(others) > 0 else v };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.star_op()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self._loop_9()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            v = parts[0]
-            others = parts[1]
-            return OrOp(exprs=[v]+[o[1] for o in others]) if len(others) > 0 else v
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_1:
+            """
+            v=star_op others=(OR star_op)* { OrOp(exprs=[v]+[o[1] for o in others]) if len(others) > 0 else v };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.star_op()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # (OR star_op)*
+                _children_9 = []
+                while True:
+                    _pos_9 = self.mark()
+                    # (OR star_op)
+                    _pos_10 = self.mark()
+                    part = None
+                    _at = _stream.pos
+                    if _at >= _count:
+                        _10_0 = self.expect('OR')
+                    elif _types[_at] == OR:
+                        _10_0 = _tokens[_at]
+                        _stream.pos = _at + 1
+                    else:
+                        _10_0 = None
+                    if _10_0 is not None:
+                        _10_1 = self.star_op()
+                        if self.match(_10_1):
+                            part = [_10_0, _10_1]
+                        else:
+                            self.fail()
+                    else:
+                        self.fail()
+                    if part is None:
+                        self.goto(_pos_10)
+                    if self.match(part): _children_9.append(part)
+                    else:
+                        self.goto(_pos_9)
+                        break
+                part = _children_9
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                v = parts[0]
+                others = parts[1]
+                return OrOp(exprs=[v]+[o[1] for o in others]) if len(others) > 0 else v
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    def _loop_9(self):
-        """
-        (OR star_op)*
-        """
-        children = []
-        while True:
-            pos = self.mark()
-            part = self._expr_list_10()
-            if self.match(part): children.append(part)
-            else:
-                self.goto(pos)
-                break
-        return children
-    def _expr_list_10(self):
-        """
-        (OR star_op)
-        """
-        pos = self.mark()
-        parts = []
-        for _ in range(1):
-            part = self.expect('OR')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.star_op()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            return parts
-        self.goto(pos)
-        return None
-    @memoize_left_rec
+    @memoize_rule(5)
     def star_op(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        v=plus_op s=STAR? { ZeroOrMore(v) if not isinstance(s, Filler) else v };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.plus_op()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self._maybe_11()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            v = parts[0]
-            s = parts[1]
-            return ZeroOrMore(v) if not isinstance(s, Filler) else v
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_1:
+            """
+            v=plus_op s=STAR? { ZeroOrMore(v) if not isinstance(s, Filler) else v };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.plus_op()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # STAR?
+                _pos_11 = self.mark()
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('STAR')
+                elif _types[_at] == STAR:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.goto(_pos_11)
+                    part = Filler()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                v = parts[0]
+                s = parts[1]
+                return ZeroOrMore(v) if not isinstance(s, Filler) else v
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    def _maybe_11(self):
-        """
-        STAR?
-        """
-        pos = self.mark()
-        part = self.expect('STAR')
-        if self.match(part): return part
-        self.goto(pos)
-        return Filler()
-    @memoize_left_rec
     def plus_op(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        v=qmark_op s=PLUS? { OneOrMore(v) if not isinstance(s, Filler) else v };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.qmark_op()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self._maybe_12()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            v = parts[0]
-            s = parts[1]
-            return OneOrMore(v) if not isinstance(s, Filler) else v
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_1:
+            """
+            v=qmark_op s=PLUS? { OneOrMore(v) if not isinstance(s, Filler) else v };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.qmark_op()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # PLUS?
+                _pos_12 = self.mark()
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('PLUS')
+                elif _types[_at] == PLUS:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.goto(_pos_12)
+                    part = Filler()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                v = parts[0]
+                s = parts[1]
+                return OneOrMore(v) if not isinstance(s, Filler) else v
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    def _maybe_12(self):
-        """
-        PLUS?
-        """
-        pos = self.mark()
-        part = self.expect('PLUS')
-        if self.match(part): return part
-        self.goto(pos)
-        return Filler()
-    @memoize_left_rec
     def qmark_op(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        v=term s=QMARK? { ZeroOrOne(v) if not isinstance(s, Filler) else v };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.term()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self._maybe_13()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            v = parts[0]
-            s = parts[1]
-            return ZeroOrOne(v) if not isinstance(s, Filler) else v
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_1:
+            """
+            v=term s=QMARK? { ZeroOrOne(v) if not isinstance(s, Filler) else v };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.term()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # QMARK?
+                _pos_13 = self.mark()
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('QMARK')
+                elif _types[_at] == QMARK:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.goto(_pos_13)
+                    part = Filler()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                v = parts[0]
+                s = parts[1]
+                return ZeroOrOne(v) if not isinstance(s, Filler) else v
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    def _maybe_13(self):
-        """
-        QMARK?
-        """
-        pos = self.mark()
-        part = self.expect('QMARK')
-        if self.match(part): return part
-        self.goto(pos)
-        return Filler()
-    @memoize_left_rec
     def term(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        AND f=factor { AndPredicate(f) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('AND')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.factor()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            f = parts[1]
-            return AndPredicate(f)
-        self.goto(pos)
-        
-        """
-        NOT f=factor { NotPredicate(f) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('NOT')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.factor()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            f = parts[1]
-            return NotPredicate(f)
-        self.goto(pos)
-        
-        """
-        f=factor { f };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.factor()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            f = parts[0]
-            return f
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next == AND:
+            """
+            AND f=factor { AndPredicate(f) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('AND')
+                elif _types[_at] == AND:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.factor()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                f = parts[1]
+                return AndPredicate(f)
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == NOT:
+            """
+            NOT f=factor { NotPredicate(f) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('NOT')
+                elif _types[_at] == NOT:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.factor()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                f = parts[1]
+                return NotPredicate(f)
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next in _first_2:
+            """
+            f=factor { f };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.factor()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                f = parts[0]
+                return f
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize_left_rec
+    @memoize_rule(6)
     def factor(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        i=item { i };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.item()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            i = parts[0]
-            return i
-        self.goto(pos)
-        
-        """
-        LPAREN es=expr_list RPAREN { es };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('LPAREN')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expr_list()
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            part = self.expect('RPAREN')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            es = parts[1]
-            return es
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next in _first_3:
+            """
+            i=item { i };
+            """
+            parts = []
+            for _ in range(1):
+                part = self.item()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                i = parts[0]
+                return i
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == LPAREN:
+            """
+            LPAREN es=expr_list RPAREN { es };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('LPAREN')
+                elif _types[_at] == LPAREN:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                part = self.expr_list()
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('RPAREN')
+                elif _types[_at] == RPAREN:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                es = parts[1]
+                return es
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
-    @memoize
     def item(self):
+        _stream = self.token_stream
+        _types, _tokens, _count = self.token_arrays
         pos = self.mark()
-        """
-        i=ID { StatementPointer(i.value) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('ID')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            i = parts[0]
-            return StatementPointer(i.value)
-        self.goto(pos)
-        
-        """
-        i=TOKEN { TokenPointer(i.value) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('TOKEN')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            i = parts[0]
-            return TokenPointer(i.value)
-        self.goto(pos)
-        
-        """
-        i=STRING { ConstantString(i.value) };
-        """
-        parts = []
-        for _ in range(1):
-            part = self.expect('STRING')
-            if not self.match(part):
-                self.fail()
-                break
-            parts.append(part)
-            # match:
-            i = parts[0]
-            return ConstantString(i.value)
-        self.goto(pos)
+        _next = _types[pos] if pos < _count else None
+        if _next is None or _next == ID:
+            """
+            i=ID { StatementPointer(i.value) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('ID')
+                elif _types[_at] == ID:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                i = parts[0]
+                return StatementPointer(i.value)
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == TOKEN:
+            """
+            i=TOKEN { TokenPointer(i.value) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('TOKEN')
+                elif _types[_at] == TOKEN:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                i = parts[0]
+                return TokenPointer(i.value)
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == STRING:
+            """
+            i=STRING { ConstantString(i.value) };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('STRING')
+                elif _types[_at] == STRING:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                i = parts[0]
+                return ConstantString(i.value)
+            self.goto(pos)
+        else:
+            self.fail()
+        
+        if _next is None or _next == TILDE:
+            """
+            TILDE { Commit() };
+            """
+            parts = []
+            for _ in range(1):
+                _at = _stream.pos
+                if _at >= _count:
+                    part = self.expect('TILDE')
+                elif _types[_at] == TILDE:
+                    part = _tokens[_at]
+                    _stream.pos = _at + 1
+                else:
+                    part = None
+                if not self.match(part):
+                    self.fail()
+                    break
+                parts.append(part)
+                # match:
+                return Commit()
+            self.goto(pos)
+        else:
+            self.fail()
         
         return None
         
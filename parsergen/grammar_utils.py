@@ -95,14 +95,22 @@ class NotPredicate(Predicate):
     def __init__(self, expr: Expr) -> None:
         self.expr = expr
 
+class Commit(Expr):
+    """`~`: once the parser gets here, it won't backtrack behind this point"""
+
+
 class Section(AST):
     pass
 
 class Statement(Section):
-    def __init__(self, name: str, grammar: List[Expr], action=None) -> None:
+    def __init__(self, name: str, grammar: List[Expr], action=None, annotations: Optional[List[str]] = None) -> None:
         self.name = name
         self.grammar = grammar
         self.action = action
+        self.annotations = annotations if annotations is not None else [] # e.g. @memo
+    
+    def annotated(self, annotation: str) -> "Statement":
+        return Statement(self.name, self.grammar, self.action, [annotation] + self.annotations)
     
     def __repr__(self) -> str:
         return f"{self.__class__.__qualname__}(name={self.name!r}, grammar={self.grammar!r})"
@@ -138,11 +146,12 @@ class GrammarLexer(Lexer):
     NOT       = r"!"
     AND       = r"&"
     AT        = r"@"
+    TILDE     = r"~"
     
-    @token(r"\{([\s\S]+?)\}\s*;\s*(\n|$)")
+    # the terminating ';' is left for TERMINATE
+    @token(r"\{([\s\S]+?)\}(?=\s*;\s*(\n|$))")
     def ACTION(self, t):
-        self.source = ";\n" + self.source
-        t.value = re.match(r"\{([\s\S]+?)\}\s*;\s*(\n|$)", t.value).group(1).strip()
+        t.value = t.value[1:-1].strip()
         return t
     
     @token(r"(')")
@@ -151,15 +160,15 @@ class GrammarLexer(Lexer):
         escape = False
         result = ""
         while True:
-            if len(self.source) > 0:
-                cur_char = self.source[0]
-                self.step_source(1)
+            if not self.at_end():
+                cur_char = self.peek()
+                self.advance(1)
                 if not escape and cur_char == "\\":
                     result += cur_char
-                    if len(self.source) == 0:
+                    if self.at_end():
                         continue
-                    cur_char = self.source[0]
-                    self.step_source(1)
+                    cur_char = self.peek()
+                    self.advance(1)
                     escape = True
                 if cur_char == end and not escape:
                     t.value = codecs.getdecoder("unicode_escape")(result)[0]
@@ -169,9 +178,4 @@ class GrammarLexer(Lexer):
             else:
                 raise Exception("No end of string")
     
-    @token(r"\n")
-    def NEWLINE(self, t):
-        self.lineno += 1
-        self.column = 0
-    
-    ignore = " \t"
+    ignore = " \t\n"
@@ -3,18 +3,221 @@ from dataclasses import dataclass
 from typing import *
 import re
 from .utils import *
+from .regex_utils import first_chars, rewrite_start_assertions, scoped_flags, has_group_references
 import itertools
+import copy
+import functools
+import mmap
+import codecs
+from array import array
+from bisect import bisect_left, bisect_right
+from sys import intern
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, Executor
+import threading
+
+# Token types are numbered once per process, so the ids in the token
+# buffers of every lexer agree with each other and with generated parsers.
+TOKEN_TYPE_NAMES: List[str] = []
+_token_type_ids: Dict[str, int] = {}
+_token_type_lock = threading.Lock()
+
+def token_type_id(name: str) -> int:
+    """The id of the token type `name`, assigning it on first use"""
+    type_id = _token_type_ids.get(name)
+    if type_id is None:
+        with _token_type_lock:
+            type_id = _token_type_ids.get(name)
+            if type_id is None:
+                type_id = len(TOKEN_TYPE_NAMES)
+                TOKEN_TYPE_NAMES.append(name)
+                _token_type_ids[name] = type_id
+    return type_id
+
+EOF_TYPE = token_type_id("EOF")
 
 class Pos(NamedTuple):
     lineno: int
     col: int
 
+class LineIndex:
+    """Start offsets of the lines of a source, used to turn offsets into
+    `Pos`itions. The offsets are found on first use, unless the index is
+    `extend`ed as the source is read."""
+    # (line starts, first index, end index, offset delta) of the indexes
+    # made by `replaced`, which share the offsets of the index they were
+    # made from; they are joined into `starts` once there are too many
+    _segments = None
+    _max_segments = 64
+    
+    def __init__(self, source=None) -> None:
+        self.source = source
+        self.starts = None if source is not None else array("Q", [0])
+    
+    def _build(self):
+        self.starts = array("Q", [0])
+        self.extend(self.source, 0)
+    
+    def extend(self, text, base: int):
+        """Adds the lines starting in `text`, found at offset `base`"""
+        newline = "\n" if isinstance(text, str) else b"\n"
+        find = text.find
+        starts = self.starts
+        i = find(newline)
+        while i != -1:
+            starts.append(base + i + 1)
+            i = find(newline, i + 1)
+    
+    def reset(self, source):
+        """Makes this the index of `source`, found again on first use"""
+        self.source = source
+        self.starts = None
+        self._segments = None
+    
+    def position(self, offset: int) -> Pos:
+        if self._segments is not None:
+            lineno = self._count(offset)
+            return Pos(lineno, offset - self._start(lineno - 1))
+        if self.starts is None:
+            self._build()
+        lineno = bisect_right(self.starts, offset)
+        return Pos(lineno, offset - self.starts[lineno - 1])
+    
+    def replaced(self, source, start: int, end: int, text) -> "LineIndex":
+        """The index of `source`, which is this index's source with the
+        part from `start` to `end` replaced by `text`. Only the lines of
+        `text` are searched, the others are shared with this index."""
+        index = LineIndex(source)
+        if self.starts is None and self._segments is None:
+            return index
+        lines = LineIndex()
+        lines.extend(text, start)
+        kept = self._count(start)
+        removed = self._count(end) - kept
+        index._splice(
+            self._cut(0, kept, 0)
+            + [(lines.starts, 1, len(lines.starts), 0)]
+            + self._cut(kept + removed, self._lines(), len(text) - (end - start))
+        )
+        return index
+    
+    def _splice(self, segments):
+        segments = [segment for segment in segments if segment[1] < segment[2]]
+        self._segments = segments
+        self._bounds = [0]
+        self._firsts = []
+        for starts, first, end, delta in segments:
+            self._bounds.append(self._bounds[-1] + end - first)
+            self._firsts.append(starts[first] + delta)
+        if len(segments) > self._max_segments:
+            self._join()
+    
+    def _cut(self, first: int, end: int, delta: int):
+        """The segments holding lines `first` to `end`, moved by `delta`"""
+        if self._segments is None:
+            return [(self.starts, first, end, delta)]
+        result = []
+        for (starts, lo, hi, moved), base in zip(self._segments, self._bounds):
+            result.append((starts, max(lo, lo + first - base), min(hi, lo + end - base), moved + delta))
+        return result
+    
+    def _join(self):
+        starts = array("Q")
+        for segment, first, end, delta in self._segments:
+            if delta:
+                starts.extend(array("Q", map(delta.__add__, segment[first:end])))
+            else:
+                starts.extend(segment[first:end])
+        self.starts = starts
+        self._segments = None
+    
+    def _count(self, offset: int) -> int:
+        """The number of lines starting at or before `offset`"""
+        if self._segments is None:
+            if self.starts is None:
+                self._build()
+            return bisect_right(self.starts, offset)
+        segment = bisect_right(self._firsts, offset) - 1
+        starts, first, end, delta = self._segments[segment]
+        return self._bounds[segment] + bisect_right(starts, offset - delta, first, end) - first
+    
+    def _start(self, line: int) -> int:
+        """The offset of the start of the 0-based `line`"""
+        if self._segments is None:
+            if self.starts is None:
+                self._build()
+            return self.starts[line]
+        segment = bisect_right(self._bounds, line) - 1
+        starts, first, end, delta = self._segments[segment]
+        return starts[first + line - self._bounds[segment]] + delta
+    
+    def _lines(self) -> int:
+        if self._segments is None:
+            if self.starts is None:
+                self._build()
+            return len(self.starts)
+        return self._bounds[-1]
+    
+    def line_span(self, lineno: int) -> Optional[Tuple[int, Optional[int]]]:
+        """Start and end offsets of a line, without its newline, or `None`
+        if there is no such line. The end is `None` for the last line."""
+        count = self._lines()
+        if not 0 < lineno <= count:
+            return None
+        start = self._start(lineno - 1)
+        end = self._start(lineno) - 1 if lineno < count else None
+        return start, end
+
 class Token(object):
-    def __init__(self, type: str, value, start: Optional[Pos] = None, end: Optional[Pos] = None):
+    """A token. `start` and `end` are either given as `Pos`itions, or as
+    offsets into the source together with the source's `LineIndex`, in which
+    case the positions are only worked out when they are read."""
+    __slots__ = ("type", "value", "_start", "_end", "_lines")
+    
+    def __init__(self, type: str, value, start: Union[Pos, int, None] = None, end: Union[Pos, int, None] = None, lines: Optional[LineIndex] = None):
         self.type = type
         self.value = value
-        self.start = start or Pos(0, 0)
-        self.end = end or Pos(0, 0)
+        self._start = start
+        self._end = end
+        self._lines = lines
+    
+    @property
+    def start(self) -> Pos:
+        if self._lines is not None:
+            return self._lines.position(self._start)
+        return self._start or Pos(0, 0)
+    
+    @start.setter
+    def start(self, value: Pos):
+        self._resolve()
+        self._start = value
+    
+    @property
+    def end(self) -> Pos:
+        if self._lines is not None:
+            return self._lines.position(self._end)
+        return self._end or Pos(0, 0)
+    
+    @end.setter
+    def end(self, value: Pos):
+        self._resolve()
+        self._end = value
+    
+    @property
+    def start_offset(self) -> Optional[int]:
+        return self._start if self._lines is not None else None
+    
+    @property
+    def end_offset(self) -> Optional[int]:
+        return self._end if self._lines is not None else None
+    
+    def _resolve(self):
+        """Switches from offsets to stored positions"""
+        if self._lines is not None:
+            self._start, self._end = self.start, self.end
+            self._lines = None
     
     def __str__(self):
         return f"Token(type={self.type!r}, value={self.value!r}, start={self.start}, end={self.end})"
@@ -31,10 +234,290 @@ class Token(object):
         
         return False
 
+_UNSET = object()
+
+class SourceToken(Token):
+    """Token whose value is read from a bytes source only when it is first
+    accessed. `value` is then `bytes`, use `text` to decode it."""
+    __slots__ = ("source", "span", "encoding", "_value")
+    
+    def __init__(self, type: str, source, start: int, end: int, lines: LineIndex, encoding: str = "utf-8"):
+        super().__init__(type, None, start, end, lines)
+        self.source = source
+        self.span = (start, end)
+        self.encoding = encoding
+        self._value = _UNSET
+    
+    @property
+    def value(self):
+        if self._value is _UNSET:
+            self._value = self.source[self.span[0]:self.span[1]]
+        return self._value
+    
+    @value.setter
+    def value(self, value):
+        self._value = value
+    
+    @property
+    def text(self) -> str:
+        value = self.value
+        if isinstance(value, bytes):
+            return value.decode(self.encoding)
+        return value
+    
+    def error_format(self):
+        return f"'{self.text}' ({self.type})"
+
+class TokenBuffer:
+    """Compact, list-like storage for the tokens of one input.
+
+    Tokens are kept as parallel arrays of type ids and source offsets;
+    `Token` objects are only created when a token is accessed. Tokens that
+    can't be recreated from the source, like the ones returned by modifiers,
+    are stored as they are.
+
+    The buffers made by `Lexer.relex` share the arrays of the buffers they
+    were made from, as `spliced` segments; their own arrays are only put
+    together when they are first used.
+    """
+    # (flat buffer, first index, end index, offset delta) of spliced buffers
+    _segments = None
+    _max_segments = 64
+    
+    def __init__(self, source=None, type_names: Sequence[str] = (), encoding: Optional[str] = None, line_index: Optional[LineIndex] = None) -> None:
+        self.source = source
+        self.encoding = encoding # set for bytes sources
+        self.line_index = line_index if line_index is not None else LineIndex(source)
+        # types are stored by their process wide id, see token_type_id
+        for name in type_names:
+            token_type_id(name)
+        self.type_names = TOKEN_TYPE_NAMES
+        self.type_ids = _token_type_ids
+        self.types = array("I")
+        self.starts = array("Q")
+        self.ends = array("Q")
+        self.objects: Dict[int, Token] = {}
+    
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[Token]) -> "TokenBuffer":
+        buffer = cls()
+        for tok in tokens:
+            buffer.append(tok)
+        return buffer
+    
+    @classmethod
+    def spliced(cls, source, line_index: LineIndex, segments: List[Tuple["TokenBuffer", int, int, int]]) -> "TokenBuffer":
+        """A buffer of the tokens of `segments`, taken from other buffers
+        and moved by their offset delta"""
+        buffer = cls(source, line_index=line_index)
+        del buffer.types, buffer.starts, buffer.ends
+        buffer._segments = segments
+        buffer._bounds = [0]
+        for _, first, end, _ in segments:
+            buffer._bounds.append(buffer._bounds[-1] + end - first)
+        if len(segments) > cls._max_segments:
+            buffer._join()
+        return buffer
+    
+    def __getattr__(self, name):
+        if name in ("types", "starts", "ends") and self._segments is not None:
+            self._join()
+            return getattr(self, name)
+        raise AttributeError(name)
+    
+    def _join(self):
+        """Copies the tokens of the segments into this buffer's arrays"""
+        types, starts, ends = array("I"), array("Q"), array("Q")
+        for (buffer, first, end, delta), base in zip(self._segments, self._bounds):
+            for index, tok in buffer.objects.items():
+                if first <= index < end and base + index - first not in self.objects:
+                    self.objects[base + index - first] = self._moved(tok, delta)
+            types.extend(buffer.types[first:end])
+            if delta:
+                starts.extend(array("Q", map(delta.__add__, buffer.starts[first:end])))
+                ends.extend(array("Q", map(delta.__add__, buffer.ends[first:end])))
+            else:
+                starts.extend(buffer.starts[first:end])
+                ends.extend(buffer.ends[first:end])
+        self.types, self.starts, self.ends = types, starts, ends
+        self._segments = None
+    
+    def segments(self, first: int, end: int, delta: int = 0) -> List[Tuple["TokenBuffer", int, int, int]]:
+        """The segments holding the tokens from `first` to `end`, moved by
+        `delta`, for `spliced`"""
+        if self._segments is None:
+            return [(self, first, end, delta)] if first < end else []
+        result = []
+        for (buffer, lo, hi, moved), base in zip(self._segments, self._bounds):
+            lo, hi = max(lo, lo + first - base), min(hi, lo + end - base)
+            if lo < hi:
+                result.append((buffer, lo, hi, moved + delta))
+        return result
+    
+    def _moved(self, tok: Token, delta: int) -> Token:
+        """A copy of a token of another buffer, for this buffer's source"""
+        if tok._lines is None:
+            return tok
+        tok = copy.copy(tok)
+        tok._start += delta
+        tok._end += delta
+        tok._lines = self.line_index
+        return tok
+    
+    def _locate(self, index: int) -> Tuple["TokenBuffer", int, int]:
+        """The flat buffer, index and offset delta of a token of a spliced
+        buffer"""
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        segment = bisect_right(self._bounds, index) - 1
+        buffer, first, end, delta = self._segments[segment]
+        return buffer, first + index - self._bounds[segment], delta
+    
+    def start_of(self, index: int) -> int:
+        if self._segments is None:
+            return self.starts[index]
+        buffer, index, delta = self._locate(index)
+        return buffer.starts[index] + delta
+    
+    def find_start(self, offset: int, lo: int = 0) -> int:
+        """The index of the first token starting at or after `offset`,
+        from `lo` on"""
+        return self._find("starts", offset, lo)
+    
+    def find_end(self, offset: int) -> int:
+        """The index of the first token ending at or after `offset`"""
+        return self._find("ends", offset, 0)
+    
+    def _find(self, name: str, offset: int, lo: int) -> int:
+        if self._segments is None:
+            return bisect_left(getattr(self, name), offset, lo)
+        for (buffer, first, end, delta), base in zip(self._segments, self._bounds):
+            offsets = getattr(buffer, name)
+            if base + end - first > lo and offsets[end - 1] + delta >= offset:
+                return base + bisect_left(offsets, offset - delta, max(first, first + lo - base), end) - first
+        return len(self)
+    
+    def type_id(self, name: str) -> int:
+        return token_type_id(name)
+    
+    def add(self, type_id: int, start: int, end: int):
+        """Adds a token that is the source text between `start` and `end`"""
+        self.types.append(type_id)
+        self.starts.append(start)
+        self.ends.append(end)
+    
+    def append(self, tok: Token, start: int = 0, end: int = 0):
+        """Adds a Token object, which is kept as it is"""
+        self.objects[len(self.types)] = tok
+        self.add(self.type_id(tok.type), start, end)
+    
+    def type_of(self, index: int) -> str:
+        if self._segments is not None:
+            buffer, index, _ = self._locate(index)
+            return self.type_names[buffer.types[index]]
+        return self.type_names[self.types[index]]
+    
+    def __len__(self) -> int:
+        if self._segments is not None:
+            return self._bounds[-1]
+        return len(self.types)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        tok = self.objects.get(index)
+        if tok is not None:
+            return tok
+        if self._segments is not None:
+            buffer, i, delta = self._locate(index)
+            tok = buffer.objects.get(i)
+            if tok is not None:
+                tok = self.objects[index] = self._moved(tok, delta)
+                return tok
+            return self._token(buffer.types[i], buffer.starts[i] + delta, buffer.ends[i] + delta)
+        return self._token(self.types[index], self.starts[index], self.ends[index])
+    
+    def _token(self, type_id: int, start: int, end: int) -> Token:
+        type_name = self.type_names[type_id]
+        if self.encoding is not None:
+            return SourceToken(type_name, self.source, start, end, self.line_index, self.encoding)
+        value = self.source[start:end]
+        if value.isidentifier():
+            value = intern(value)
+        return Token(type_name, value, start, end, self.line_index)
+    
+    def __iter__(self):
+        for c in range(len(self)):
+            yield self[c]
+    
+    def __eq__(self, o: object) -> bool:
+        if isinstance(o, (TokenBuffer, list, tuple)):
+            return len(self) == len(o) and all(a == b for a, b in zip(self, o))
+        return NotImplemented
+    
+    def __repr__(self) -> str:
+        return f"TokenBuffer({list(self)!r})"
+
 @dataclass
 class LexerResult:
-    tokens: List[Token]
-    lines: List[str]
+    tokens: Union[TokenBuffer, List[Token]]
+    lines: Optional[List[str]] = None
+    source: Any = None
+    line_index: Optional[LineIndex] = None
+    encoding: Optional[str] = None # set for bytes sources
+    
+    def line_text(self, lineno: int) -> str:
+        """The text of a line, for error messages. Empty if the line is
+        unknown."""
+        if self.lines is not None:
+            return self.lines[lineno - 1] if 0 < lineno <= len(self.lines) else ""
+        if self.source is None or self.line_index is None:
+            return ""
+        span = self.line_index.line_span(lineno)
+        if span is None:
+            return ""
+        text = self.source[span[0]:span[1]]
+        if self.encoding is not None:
+            text = text.decode(self.encoding, "replace")
+        return text.rstrip("\r\n")
+
+@dataclass
+class RuleStats:
+    attempts: int = 0 # times the rule's regexes were tried
+    successes: int = 0
+    regex_time: int = 0 # in nanoseconds
+    modifier_time: int = 0
+
+class LexerStats:
+    """Per rule counts and timings collected by an instrumented Lexer"""
+    def __init__(self) -> None:
+        self.rules: Dict[str, RuleStats] = {}
+    
+    def rule(self, name: str) -> RuleStats:
+        if name not in self.rules:
+            self.rules[name] = RuleStats()
+        return self.rules[name]
+    
+    def reset(self):
+        self.rules.clear()
+    
+    def as_dict(self) -> Dict[str, Dict[str, int]]:
+        return {name: dict(vars(stats)) for name, stats in self.rules.items()}
+    
+    def table(self) -> str:
+        """The stats as a table, the most expensive rules first"""
+        lines = [f"{'rule':<20} {'attempts':>10} {'successes':>10} {'regex ms':>10} {'modifier ms':>12}"]
+        for name, stats in sorted(self.rules.items(), key=lambda item: -(item[1].regex_time + item[1].modifier_time)):
+            lines.append(
+                f"{name:<20} {stats.attempts:>10} {stats.successes:>10} "
+                f"{stats.regex_time / 1e6:>10.3f} {stats.modifier_time / 1e6:>12.3f}"
+            )
+        return "\n".join(lines)
+    
+    def __str__(self) -> str:
+        return self.table()
 
 def token(*rules):
     def inner(func):
@@ -80,6 +563,169 @@ class LexerMetaDict(dict):
         
         return super().__setitem__(k, v)
 
+def _compile(regex, encoding: Optional[str] = None) -> Pattern:
+    if encoding is None:
+        return re.compile(regex)
+    if hasattr(regex, "pattern"):
+        return re.compile(regex.pattern.encode(encoding), regex.flags & ~re.UNICODE)
+    return re.compile(regex.encode(encoding))
+
+class _LazyPattern:
+    """A rule regex compiled on first use. Normally only the master patterns
+    are matched, so the per-regex patterns of the fallback path are often
+    never needed."""
+    __slots__ = ("regex", "encoding", "_pattern")
+    
+    def __init__(self, regex, encoding: Optional[str] = None) -> None:
+        self.regex = regex
+        self.encoding = encoding
+        self._pattern = None
+    
+    def compile(self) -> Pattern:
+        if self._pattern is None:
+            self._pattern = _compile(self.regex, self.encoding)
+        return self._pattern
+    
+    def match(self, text, pos: int = 0):
+        if self._pattern is None:
+            self.compile()
+        return self._pattern.match(text, pos)
+
+@functools.lru_cache(maxsize=None)
+def _group_count(source) -> int:
+    return re.compile(source).groups
+
+def _merged_source(regex) -> Optional[str]:
+    """The source of a rule regex, a str or a compiled pattern, to merge
+    into a master pattern, or `None` if it can't be merged"""
+    if hasattr(regex, "pattern"):
+        source = scoped_flags(regex.pattern, regex.flags)
+    else:
+        source = scoped_flags(regex)
+    # group numbers change once merged
+    if source is None or has_group_references(source):
+        return None
+    return source
+
+def build_master(entries, type_ids: Dict[str, int], encoding: Optional[str] = None) -> Tuple[Optional[Pattern], List[Tuple[str, Rule, int]]]:
+    """Compiles the regexes of `entries` ((name, Rule, regex) tuples, in
+    priority order) into a single alternation.
+
+    Each regex is wrapped in its own capturing group so the `lastindex` of a
+    match identifies the rule that produced it, as a (name, rule, type id)
+    tuple. Ignored rules have a type id of -1. Returns `None` as the pattern
+    if the regexes can't be merged safely.
+    
+    The merging stops at the first regex that can't be merged (e.g. one
+    using backreferences), whose rule and the ones after it are tried one
+    at a time if the master pattern doesn't match. `groups[0]` is the
+    number of rules in the master pattern.
+    With an `encoding`, the pattern is compiled to match bytes.
+    """
+    alternatives = []
+    groups: List[Tuple[str, Rule, int]] = [0]
+    try:
+        for name, rule, regex in entries:
+            source = _merged_source(regex)
+            if source is None:
+                break
+            alternatives.append(f"({source})")
+            groups.append((name, rule, type_ids.get(name, -1)))
+            groups += [None] * _group_count(source)
+        if not alternatives:
+            return None, []
+        groups[0] = len(alternatives)
+        master = "|".join(alternatives)
+        return _compile(master, encoding), groups
+    except re.error:
+        return None, []
+
+def _start_assertions(name: str, regex):
+    try:
+        return rewrite_start_assertions(regex)
+    except ValueError as e:
+        raise ValueError(f"Rule {name}: {e}") from None
+
+class RuleTable:
+    """The compiled rules of a Lexer class, for str input or, given an
+    `encoding`, for bytes input.
+
+    Besides the master pattern of all the rules, `dispatch` maps every ASCII
+    character (or byte) to a (master, groups, compiled) entry made of only
+    the rules that can match starting with it. `default` covers the other
+    characters.
+    """
+    def __init__(self, rules: List[Tuple[str, Rule]], ignore: Optional[str], type_ids: Dict[str, int], encoding: Optional[str] = None, layout=None, keywords: Optional[Dict[str, str]] = None) -> None:
+        self.encoding = encoding
+        self.ignore = ignore or ""
+        # matches a run of ignored characters, possibly empty
+        self.skip = _compile("[" + re.escape(self.ignore) + "]*" if self.ignore else "", encoding)
+        if encoding is not None:
+            self.ignore = self.ignore.encode(encoding)
+        entries = [(name, rule, _start_assertions(name, regex)) for name, rule in rules for regex in rule.match]
+        self.master, self.groups = build_master(entries, type_ids, encoding)
+        # per-regex fallback, used when the rules can't be merged
+        self.compiled = [(name, rule, _LazyPattern(regex, encoding)) for name, rule, regex in entries]
+        self.layout = layout if layout is not None else dispatch_layout(entries)
+        self._build_dispatch(entries, type_ids)
+        self._build_keywords(entries, type_ids, keywords or {})
+    
+    def _build_keywords(self, entries, type_ids: Dict[str, int], keywords: Dict[str, str]):
+        """Tokens of a rule that matches a keyword (the identifier rule) are
+        promoted to the keyword's type when their text is a keyword.
+        `promoted` holds the names and type ids of those rules."""
+        self.keyword_types: Dict[Union[str, bytes], str] = {}
+        self.keyword_ids: Dict[Union[str, bytes], int] = {}
+        self.promoted: Set[Union[str, int]] = set()
+        for word, type_name in keywords.items():
+            for name, rule, pattern in self.compiled:
+                if not name.startswith("ignore_") and _compile(pattern.regex).fullmatch(word):
+                    break
+            else:
+                raise ValueError(f"keyword {word!r} isn't matched by any rule")
+            key = word if self.encoding is None else word.encode(self.encoding)
+            self.keyword_types[key] = type_name
+            self.keyword_ids[key] = type_ids[type_name]
+            self.promoted |= {name, type_ids[name]}
+    
+    def _build_dispatch(self, entries, type_ids: Dict[str, int]):
+        subset_indices, dispatch, default = self.layout
+        subsets = []
+        for indices in subset_indices:
+            if indices == tuple(range(len(entries))):
+                subsets.append((self.master, self.groups, self.compiled))
+            else:
+                master, groups = build_master([entries[i] for i in indices], type_ids, self.encoding)
+                subsets.append((master, groups, [self.compiled[i] for i in indices]))
+        
+        self.subsets = subsets
+        self.dispatch = {
+            (chr(code) if self.encoding is None else code): subsets[number]
+            for code, number in enumerate(dispatch)
+        }
+        self.default = subsets[default]
+
+def dispatch_layout(entries) -> Tuple[List[Tuple[int, ...]], Tuple[int, ...], int]:
+    """Works out which of `entries` ((name, Rule, regex) tuples) can match
+    starting with each ASCII character.
+
+    Returns the distinct subsets of entry indices, the subset number for
+    every ASCII code and the subset number for all other characters.
+    """
+    # rules that can't be analysed are candidates for every character
+    firsts = [first_chars(regex) for _, _, regex in entries]
+    subsets: Dict[Tuple[int, ...], int] = {}
+    
+    def number(indices):
+        return subsets.setdefault(indices, len(subsets))
+    
+    dispatch = tuple(
+        number(tuple(c for c, first in enumerate(firsts) if first is None or chr(code) in first.chars))
+        for code in range(128)
+    )
+    default = number(tuple(c for c, first in enumerate(firsts) if first is None or first.other))
+    return list(subsets), dispatch, default
+
 class LexerMeta(RequiredAttributes("ignore")):
     @classmethod
     def __prepare__(meta, name, bases):
@@ -89,9 +735,28 @@ class LexerMeta(RequiredAttributes("ignore")):
         d["_ignores"] = {}
         return d
     
+    def __init__(cls, name, bases, attrs):
+        super().__init__(name, bases, attrs)
+        cls._type_ids = {name: token_type_id(name) for name in cls.tokens}
+        # generated lexers (see LexerGenerator) come with their table
+        if "_table" not in attrs:
+            cls._table = RuleTable(cls.ordered_rules(), cls.ignore, cls._type_ids, keywords=cls.keywords)
+        cls._bytes_tables = {}
+    
+    def ordered_rules(cls) -> List[Tuple[str, Rule]]:
+        """(name, Rule) pairs in the order they are tried"""
+        return list(itertools.chain(cls._rules.items(), cls._ignores.items()))
+    
+    def bytes_table(cls, encoding: str = "utf-8") -> RuleTable:
+        """The rules compiled for bytes input, built on first use"""
+        if encoding not in cls._bytes_tables:
+            cls._bytes_tables[encoding] = RuleTable(cls.ordered_rules(), cls.ignore, cls._type_ids, encoding, cls._table.layout, cls.keywords)
+        return cls._bytes_tables[encoding]
+    
     @property
     def tokens(cls):
-        return tuple(cls._rules.keys())
+        keyword_types = [name for name in cls.keywords.values() if name not in cls._rules]
+        return tuple(cls._rules.keys()) + tuple(dict.fromkeys(keyword_types))
 
 
 class LexError(Exception):
@@ -104,7 +769,7 @@ class LexError(Exception):
     def __str__(self):
         ret = f"\n  Line {self.lineno}:\n"
         if self.lineText:
-            ret += f"  {self.lineText}\n  {' '*(self.column-1)}^\n"
+            ret += f"  {self.lineText}\n  {' '*self.column}^\n"
         return ret + f"{self.msg}"
 
 
@@ -112,95 +777,603 @@ class LexError(Exception):
 # modify documentation
 # add other support?
 class Lexer(metaclass=LexerMeta):
+    """Regex based lexer.
+
+    The input is never copied while lexing: `text` holds the source (or, when
+    streaming, a window of it) and `pos` is the cursor into it. Modifiers that
+    need to consume more input than their regex matched should use `peek` and
+    `advance`, which also pull in more input when streaming.
+    """
     ignore = None
+    keywords: Dict[str, str] = {} # keyword text -> token type
+    split_at = r"\n" # where lex_parallel may split the input
     _rules: Dict[str, Rule]
     _ignores: Dict[str, Rule]
-    _lineno: int
     
-    def __init__(self):
+    def __init__(self, instrument: bool = False):
         self.token_list: List[Token] = []
+        # per rule stats, see _scan_instrumented
+        self.stats: Optional[LexerStats] = LexerStats() if instrument else None
         self.init()
     
     def init(self):
-        self.current_line = ""
-        self._lineno = 1
-        self.lineno = 1
-        self.column = 0
+        self.text = ""
+        self.pos = 0
+        self.base = 0 # offset of text[0] in the whole input
+        self._chunks = None # rest of the input when streaming
+        self._table = type(self)._table
+        self.line_index = LineIndex()
         self.token_list = []
     
     @property
     def lineno(self) -> int:
-        return self._lineno
+        """Line of the cursor. Lines are counted from the input, assigning
+        to this (or to `column`) has no effect."""
+        return self.line_index.position(self.base + self.pos).lineno
     
     @lineno.setter
     def lineno(self, value):
-        if self._lineno < value:
-            self.lines.append(self.current_line)
-            self.current_line = ""
-        self._lineno = value
+        pass
+    
+    @property
+    def column(self) -> int:
+        return self.line_index.position(self.base + self.pos).col
+    
+    @column.setter
+    def column(self, value):
+        pass
+    
+    @property
+    def current_line(self) -> str:
+        """Text consumed since the start of the current line"""
+        return self.text[max(0, self.pos - self.column):self.pos]
+    
+    @property
+    def source(self) -> str:
+        """The input that hasn't been consumed yet.
+
+        Kept for older modifiers; this copies the rest of the input, so use
+        `peek` instead. Assigning to it replaces the unconsumed input.
+        """
+        return self.text[self.pos:]
+    
+    @source.setter
+    def source(self, value: str):
+        self.text = self.text[:self.pos] + value
+        # the consumed part is unchanged, so stored offsets stay valid
+        if isinstance(self.token_list, TokenBuffer):
+            self.token_list.source = self.text
+        if self.line_index.source is not None:
+            self.line_index.reset(self.text)
+    
+    def peek(self, n: int = 1) -> str:
+        """Returns the next `n` characters without consuming them. The result
+        is shorter than `n` at the end of the input."""
+        while self.pos + n > len(self.text) and self._fill():
+            pass
+        return self.text[self.pos:self.pos + n]
+    
+    def advance(self, n: int):
+        """Consumes the next `n` characters"""
+        self.pos += n
+    
+    def at_end(self) -> bool:
+        while self.pos >= len(self.text):
+            if not self._fill():
+                return True
+        return False
+    
+    def _fill(self) -> bool:
+        """Appends the next chunk of a streamed input to the window.
+        Returns False once the input is exhausted."""
+        if self._chunks is None:
+            return False
+        for chunk in self._chunks:
+            if chunk:
+                self._append(chunk)
+                return True
+        self._chunks = None
+        return False
+    
+    def _append(self, chunk: str):
+        self.line_index.extend(chunk, self.base + len(self.text))
+        self.text += chunk
+    
+    def _compact(self):
+        """Drops the consumed part of a streamed input's window"""
+        cut = self.pos
+        self.text = self.text[cut:]
+        self.base += cut
+        self.pos = 0
     
     def Token(self, tokenType, value):
-        token = Token(
-            tokenType, value,
-            Pos(self.lineno, self.column - len(value)), Pos(self.lineno, self.column)
+        """Creates a token that ends at the cursor"""
+        end = self.base + self.pos
+        if isinstance(value, str) and value.isidentifier():
+            value = intern(value)
+        return Token(tokenType, value, end - len(value), end, self.line_index)
+    
+    def SourceToken(self, tokenType, start, end):
+        return SourceToken(
+            tokenType, self.text, self.base + start, self.base + end,
+            self.line_index, self._table.encoding
         )
-        return token
     
-    def step_source(self, to_index):
-        self.column += to_index
-        self.current_line += self.source[:to_index]
-        self.source = self.source[to_index:]
+    step_source = advance
+    
+    def match_rule(self):
+        """Finds the highest priority rule matching at the cursor.
+        Returns a (name, rule, match) tuple, or `None` if nothing matches."""
+        table = self._table
+        if self.pos < len(self.text):
+            master, groups, compiled = table.dispatch.get(self.text[self.pos], table.default)
+        else:
+            master, groups, compiled = table.master, table.groups, table.compiled
+        if self.stats is not None:
+            return self._match_timed(compiled, self.text, self.pos)
+        if master is not None:
+            m = master.match(self.text, self.pos)
+            if m is not None:
+                token_name, rule, _ = groups[m.lastindex]
+                return token_name, rule, m
+            compiled = compiled[groups[0]:] # the rules that couldn't be merged
+        for token_name, rule, pattern in compiled:
+            m = pattern.match(self.text, self.pos)
+            if m:
+                return token_name, rule, m
+        return None
     
     def getToken(self) -> Token:
-        for token_name, rule in itertools.chain(self._rules.items(), self._ignores.items()):
-            for regex in rule.match:
-                r = re.match(regex, self.source)
-                if r:
-                    self.step_source(r.span()[1])
-                    rv = self.Token(token_name, r.group())
-                    if rule.modifier:
-                        rv = rule.modifier(self, rv)
-                    return rv if not token_name.startswith("ignore_") else None
-        raise LexError(
-            f"Found Unexpected character '{self.source[0]}' while tokenizing!",
-            self.lineno, self.column, self.current_line + self.source[0]
-        )
-        
+        found = self.match_rule()
+        # a match running into the end of a streamed window may continue
+        while self._chunks is not None and (found is None or found[2].end() == len(self.text)):
+            if not self._fill():
+                break
+            found = self.match_rule()
+        if found is None:
+            char = self.peek()
+            lineno, column = self.line_index.position(self.base + self.pos)
+            end = self.text.find("\n" if isinstance(self.text, str) else b"\n", self.pos)
+            line = self.text[self.pos - column:end if end != -1 else len(self.text)]
+            if isinstance(line, bytes):
+                line = line.decode(self._table.encoding, "replace")
+            raise LexError(
+                f"Found Unexpected character '{char}' while tokenizing!",
+                lineno, column, line.rstrip("\r")
+            )
+        return self._apply(*found)
+    
+    def _apply(self, token_name, rule, m) -> Optional[Token]:
+        """Consumes a match, returning its token after the rule's modifier"""
+        self.advance(m.end() - self.pos)
+        if rule.modifier is None and token_name.startswith("ignore_"):
+            return None
+        table = self._table
+        if table.encoding is None:
+            rv = self.Token(token_name, m.group())
+        else:
+            rv = self.SourceToken(token_name, m.start(), m.end())
+        if token_name in table.promoted:
+            rv.type = table.keyword_types.get(m.group(), token_name)
+        if rule.modifier and self.stats is not None:
+            start = time.perf_counter_ns()
+            rv = rule.modifier(self, rv)
+            self.stats.rule(token_name).modifier_time += time.perf_counter_ns() - start
+        elif rule.modifier:
+            rv = rule.modifier(self, rv)
+        return rv if not token_name.startswith("ignore_") else None
 
     def lex_string(self, source: str) -> LexerResult:
         self.init()
-        self.source = source
-        self.lines = []
+        self.text = source
+        self.line_index = LineIndex(source)
+        self.token_list = TokenBuffer(source, type(self).tokens, line_index=self.line_index)
+        self._scan()
+        return LexerResult(self.token_list, source=self.text, line_index=self.line_index)
+    
+    def lex_bytes(self, source, encoding: str = "utf-8") -> LexerResult:
+        """Lexes a bytes-like `source` (bytes, mmap, ...) with the rules
+        compiled to bytes patterns.
+
+        Token values are only sliced out of the source when accessed, as
+        `bytes`; `SourceToken.text` decodes them. Modifiers see the same
+        tokens.
+        """
+        self.init()
+        self._table = type(self).bytes_table(encoding)
+        self.text = source
+        self.line_index = LineIndex(source)
+        self.token_list = TokenBuffer(source, type(self).tokens, encoding, self.line_index)
+        self._scan()
+        return LexerResult(self.token_list, source=self.text, line_index=self.line_index, encoding=encoding)
+    
+    def lex_mmap(self, path, encoding: str = "utf-8") -> LexerResult:
+        """Memory-maps the file at `path` and lexes it with `lex_bytes`. The
+        mapping stays open for as long as the result or its tokens use it."""
+        with open(path, "rb") as f:
+            try:
+                source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # empty files can't be mapped
+                source = b""
+        return self.lex_bytes(source, encoding)
+    
+    def _scan(self, stop: Optional[int] = None):
+        """Lexes from the cursor to the end of `text`, or until the cursor
+        (past any ignored characters) reaches `stop`"""
+        if self.stats is not None:
+            return self._scan_instrumented(stop)
+        table = self._table
+        skip = table.skip.match
+        dispatch = table.dispatch
+        default = table.default
+        promoted = table.promoted
+        keyword_ids = table.keyword_ids
+        buffer = self.token_list
+        limit = stop if stop is not None else sys.maxsize
+        
+        while True:
+            text = self.text # modifiers may replace the unconsumed input
+            pos = skip(text, self.pos).end()
+            self.pos = pos
+            if pos >= len(text) or pos >= limit:
+                break
+            master, groups, _ = dispatch.get(text[pos], default)
+            m = master.match(text, pos) if master is not None else None
+            if m is None:
+                # unmergeable rules or an error, take the general path
+                token = self.getToken()
+                if token:
+                    buffer.append(token, pos, self.pos)
+                continue
+            token_name, rule, type_id = groups[m.lastindex]
+            if rule.modifier is None:
+                # plain tokens are stored as offsets, without a Token object
+                end = m.end()
+                if type_id >= 0:
+                    if type_id in promoted:
+                        type_id = keyword_ids.get(text[pos:end], type_id)
+                    buffer.add(type_id, pos, end)
+                self.pos = end
+            else:
+                token = self._apply(token_name, rule, m)
+                if token:
+                    buffer.append(token, pos, self.pos)
+    
+    def _scan_instrumented(self, stop: Optional[int] = None):
+        """`_scan` for an instrumented lexer. The candidate rules are tried
+        one at a time instead of through the master pattern, which finds the
+        same match, so that each rule can be timed."""
+        table = self._table
+        skip = table.skip.match
+        buffer = self.token_list
+        limit = stop if stop is not None else sys.maxsize
+        self._compile_rules()
+        
+        while True:
+            text = self.text
+            pos = skip(text, self.pos).end()
+            self.pos = pos
+            if pos >= len(text) or pos >= limit:
+                break
+            found = self._match_timed(table.dispatch.get(text[pos], table.default)[2], text, pos)
+            if found is None:
+                self.getToken() # raises the LexError
+                continue
+            token_name, rule, m = found
+            if rule.modifier is None:
+                end = m.end()
+                if not token_name.startswith("ignore_"):
+                    type_id = buffer.type_id(token_name)
+                    if type_id in table.promoted:
+                        type_id = table.keyword_ids.get(m.group(), type_id)
+                    buffer.add(type_id, pos, end)
+                self.pos = end
+            else:
+                # _apply times the modifier
+                token = self._apply(token_name, rule, m)
+                if token:
+                    buffer.append(token, pos, self.pos)
+    
+    def _match_timed(self, compiled, text, pos: int):
+        """`match_rule` for an instrumented lexer, trying the `compiled`
+        rules one at a time and timing each"""
+        clock = time.perf_counter_ns
+        for token_name, rule, pattern in compiled:
+            rule_stats = self.stats.rule(token_name)
+            start = clock()
+            m = pattern.match(text, pos)
+            rule_stats.regex_time += clock() - start
+            rule_stats.attempts += 1
+            if m:
+                rule_stats.successes += 1
+                return token_name, rule, m
+        return None
+    
+    def _compile_rules(self):
+        """Compiles the rule patterns ahead of an instrumented run, not to
+        time the compiling"""
+        for _, _, pattern in self._table.compiled:
+            pattern.compile()
+    
+    def lex_parallel(self, source: str, workers: Optional[int] = None, executor: Optional[Executor] = None, lookahead: int = 65536) -> LexerResult:
+        """Lexes `source` in `workers` pieces in parallel, in a process pool
+        (or in `executor`), and merges the tokens. The result equals
+        `lex_string(source)`.
+
+        The pieces end after a match of the class's `split_at` regex (a
+        newline by default). Every piece is lexed from its start, then
+        checked against where the previous piece's lexing actually ended, so
+        a split inside a token (like a newline in a string) only costs
+        lexing that piece again here. That relies on tokens not depending on
+        earlier ones: modifiers must not keep state between tokens or use
+        `lineno`/`column`. As with `lex_iter`, no rule may need to look
+        more than `lookahead` characters past the end of a piece.
+        """
+        workers = workers or os.cpu_count() or 1
+        bounds = self._split_points(source, workers)
+        if len(bounds) <= 2:
+            return self.lex_string(source)
+        pieces = [
+            (type(self), source[start:stop + lookahead], start, stop, lookahead, stop + lookahead >= len(source))
+            for start, stop in zip(bounds, bounds[1:])
+        ]
+        if executor is None:
+            with ProcessPoolExecutor(min(workers, len(pieces))) as pool:
+                results = list(pool.map(_lex_piece, *zip(*pieces)))
+        else:
+            results = list(executor.map(_lex_piece, *zip(*pieces)))
         
-        while len(self.source) > 0:
-            while len(self.source) > 0 and self.source[0] in self.ignore:
-                self.step_source(1)
-            if len(self.source) == 0:
+        self.init()
+        self.text = source
+        self.line_index = LineIndex(source)
+        self.line_index.starts = array("Q", [0])
+        for result in results:
+            self.line_index.starts.extend(result.line_starts)
+        self.token_list = TokenBuffer(source, type(self).tokens, line_index=self.line_index)
+        for c, (result, stop) in enumerate(zip(results, bounds[1:])):
+            if result.end is not None and (c == 0 or result.first == self.pos):
+                result.merge_into(self.token_list)
+                self.pos = result.end
+            else:
+                # the previous piece ended inside a token of this one
+                self._scan(stop)
+        return LexerResult(self.token_list, source=source, line_index=self.line_index)
+    
+    def _split_points(self, source: str, pieces: int) -> List[int]:
+        """Offsets splitting `source` into up to `pieces` similar pieces,
+        including 0 and the end"""
+        split_at = re.compile(type(self).split_at)
+        bounds = [0]
+        for c in range(1, pieces):
+            m = split_at.search(source, max(bounds[-1], len(source) * c // pieces))
+            if m is None:
                 break
+            if bounds[-1] < m.end() < len(source):
+                bounds.append(m.end())
+        bounds.append(len(source))
+        return bounds
+    
+    def relex(self, previous: LexerResult, edit_start: int, edit_end: int, new_text: str) -> LexerResult:
+        """Lexes the source of `previous` with the part from `edit_start` to
+        `edit_end` replaced by `new_text`, reusing the tokens of `previous`
+        away from the edit. The result equals `lex_string` on the new source.
+
+        Lexing restarts at the token before the first one touched by the
+        edit, and stops as soon as a token starts where one of the old tokens
+        after the edit started. The tokens of `previous` before and after
+        that are shared with the result, which only records how far they
+        moved, so the cost depends on the edit, not the input size. Like
+        `lex_parallel`, this relies on modifiers not keeping state between
+        tokens, and on rules not looking further back or ahead than the
+        tokens next to the edit.
+        """
+        old = previous.tokens
+        old_source = previous.source
+        source = old_source[:edit_start] + new_text + old_source[edit_end:]
+        if not isinstance(old, TokenBuffer) or not isinstance(old_source, str):
+            return self.lex_string(source)
+        delta = len(new_text) - (edit_end - edit_start)
+        
+        # restart one token early, the edit may extend the token before it
+        touched = old.find_end(edit_start)
+        first = max(touched - 1, 0)
+        restart = old.start_of(first) if touched > 0 else 0
+        
+        self.init()
+        self.text = source
+        if previous.line_index is not None:
+            self.line_index = previous.line_index.replaced(source, edit_start, edit_end, new_text)
+        else:
+            self.line_index = LineIndex(source)
+        middle = TokenBuffer(source, old.type_names, line_index=self.line_index)
+        self.token_list = middle
+        self.pos = restart
+        
+        # lex until reaching the start of an old token after the edit
+        resync = old.find_start(edit_end)
+        synced = False
+        while resync < len(old) and self.pos < len(self.text):
+            target = old.start_of(resync) + delta
+            self._scan(target)
+            if self.pos == target:
+                synced = True
+                break
+            resync = old.find_start(self.pos - delta, resync)
+        if not synced:
+            self._scan()
+            resync = len(old)
+        
+        # the old tokens are shared with `previous`, not copied
+        segments = old.segments(0, first) + middle.segments(0, len(middle)) + old.segments(resync, len(old), delta)
+        middle.source = None # read through the spliced buffer
+        buffer = TokenBuffer.spliced(self.text, self.line_index, segments)
+        return LexerResult(buffer, source=self.text, line_index=self.line_index)
+    
+    def lex_iter(self, chunks: Iterable[str], lookahead: int = 65536) -> Iterator[Token]:
+        """Lexes an input given as an iterable of string chunks, yielding
+        tokens as they are found.
+
+        Only a window of the input is kept in memory. The window holds at
+        least `lookahead` characters past the cursor (until the input runs
+        out), so the result equals `lex_string` on the joined chunks as long
+        as no rule needs to look further than that to decide on a match.
+        """
+        self.init()
+        self._chunks = iter(chunks)
+        skip = self._table.skip.match
+        if self.stats is not None:
+            self._compile_rules()
+        
+        while True:
+            if len(self.text) - self.pos < lookahead and self._chunks is not None:
+                if self.pos >= lookahead:
+                    self._compact()
+                while len(self.text) - self.pos < 2 * lookahead and self._fill():
+                    pass
+            text = self.text
+            pos = skip(text, self.pos).end()
+            self.pos = pos
+            if pos >= len(text):
+                if self._chunks is None:
+                    break
+                continue
             token = self.getToken()
             if token:
-                self.token_list.append(token)
+                yield token
+    
+    def lex_file(self, fileobj: TextIO, chunk_size: int = 65536, lookahead: int = 65536) -> Iterator[Token]:
+        """Lexes an open text file, see `lex_iter`"""
+        return self.lex_iter(iter(lambda: fileobj.read(chunk_size), ""), lookahead)
+    
+    async def lex_async(self, reader, encoding: str = "utf-8", chunk_size: int = 65536, lookahead: int = 65536) -> AsyncIterator[Token]:
+        """Lexes the bytes read from an `asyncio.StreamReader` (or anything
+        with an async `read(n)` method), decoded with `encoding`, yielding
+        tokens as they are found.
+
+        The lexer waits for input without blocking the event loop. Like
+        `lex_iter`, it keeps a window of at least `lookahead` characters past
+        the cursor, and the tokens equal those of `lex_string` as long as no
+        rule needs to look further than that.
+        """
+        self.init()
+        decoder = codecs.getincrementaldecoder(encoding)()
+        skip = self._table.skip.match
+        if self.stats is not None:
+            self._compile_rules()
+        at_eof = False
         
-        self.lines.append(self.current_line) # final line
-        return LexerResult(self.token_list, self.lines)
+        while True:
+            while not at_eof and len(self.text) - self.pos < lookahead:
+                data = await reader.read(chunk_size)
+                at_eof = not data
+                if self.pos >= lookahead:
+                    self._compact()
+                self._append(decoder.decode(data, final=at_eof))
+            text = self.text
+            pos = skip(text, self.pos).end()
+            self.pos = pos
+            if pos >= len(text):
+                if at_eof:
+                    break
+                continue
+            token = self.getToken()
+            if token:
+                yield token
 
 
 del Lexer.ignore
 
+
+class _Piece:
+    """The tokens of a piece of the input lexed by `lex_parallel`, with
+    offsets into the whole input"""
+    def __init__(self, buffer: TokenBuffer, first: Optional[int], end: Optional[int], line_starts: array) -> None:
+        self.type_names = buffer.type_names
+        self.types = buffer.types
+        self.starts = buffer.starts
+        self.ends = buffer.ends
+        self.objects = buffer.objects
+        self.first = first # where lexing started, past ignored characters
+        self.end = end # where it stopped, None if the piece couldn't be lexed alone
+        self.line_starts = line_starts
+        # Token objects whose offsets need the line index of the whole input
+        self.located: List[int] = []
+    
+    def merge_into(self, buffer: TokenBuffer):
+        count = len(buffer)
+        types = self.types
+        ids = [buffer.type_id(name) for name in self.type_names]
+        if ids != list(range(len(ids))):
+            types = array("I", [ids[t] for t in types])
+        for index in self.located:
+            self.objects[index]._lines = buffer.line_index
+        for index, tok in self.objects.items():
+            buffer.objects[count + index] = tok
+        buffer.types.extend(types)
+        buffer.starts.extend(self.starts)
+        buffer.ends.extend(self.ends)
+
+def _lex_piece(lexer_cls, window: str, start: int, stop: int, lookahead: int, complete: bool) -> _Piece:
+    """Lexes `window`, the input from offset `start` with `lookahead`
+    characters past `stop`, until reaching `stop`. For `Lexer.lex_parallel`."""
+    lexer = lexer_cls()
+    lexer.text = window
+    lexer.line_index = LineIndex(window)
+    lexer.token_list = TokenBuffer(window, lexer_cls.tokens, line_index=lexer.line_index)
+    first = lexer._table.skip.match(window).end()
+    end = None
+    try:
+        lexer._scan(stop - start)
+        # a match running far into the lookahead may have needed more input
+        if complete or lexer.pos <= stop - start + lookahead // 2:
+            end = lexer.pos + start
+    except LexError:
+        pass # lexed again by lex_parallel, which reports the error
+    
+    buffer = lexer.token_list
+    buffer.starts = array("Q", [s + start for s in buffer.starts])
+    buffer.ends = array("Q", [e + start for e in buffer.ends])
+    line_starts = array("Q")
+    i = window.find("\n", 0, stop - start)
+    while i != -1:
+        line_starts.append(start + i + 1)
+        i = window.find("\n", i + 1, stop - start)
+    
+    piece = _Piece(buffer, first + start, end, line_starts)
+    for index, tok in buffer.objects.items():
+        if tok._lines is not None:
+            tok._start += start
+            tok._end += start
+            tok._lines = None
+            piece.located.append(index)
+    return piece
+
+
 class TokenStream:
     def __init__(self, lexer_result: Union[LexerResult, List[Token]]) -> None:
         if isinstance(lexer_result, list):
             lexer_result = LexerResult(lexer_result, [])
-        self.tokens = lexer_result.tokens
+        tokens = lexer_result.tokens
+        if not isinstance(tokens, TokenBuffer):
+            tokens = TokenBuffer.from_tokens(tokens)
+        self.tokens = tokens
+        self.lexer_result = lexer_result
         self.lines = lexer_result.lines
         self.pos = 0
     
+    def line_text(self, lineno: int) -> str:
+        return self.lexer_result.line_text(lineno)
+    
     def mark(self):
         return self.pos
     
     def goto(self, pos):
         self.pos = pos
     
+    def release(self, pos):
+        """Called once the parser won't backtrack behind `pos`. The tokens of
+        a lexed input are all kept, see `LazyTokenStream`."""
+    
     def get_token(self):
         tok = self.peek_token()
         self.pos += 1
@@ -215,9 +1388,74 @@ class TokenStream:
             return Token("EOF", "<EOF>", start=eof_pos, end=eof_pos)
         return self.tokens[self.pos]
     
+    def peek_type(self) -> str:
+        """Type of the next token, without creating the token"""
+        if self.pos >= len(self.tokens):
+            return "EOF"
+        return self.tokens.type_of(self.pos)
+    
     def fetch(self, pos):
         old = self.pos
         self.pos = pos
         rv = self.peek_token()
         self.pos = old
         return rv
+
+
+class BacktrackError(IndexError):
+    """Raised when a parser reads a token that a `LazyTokenStream` has
+    released, having backtracked behind a commit point"""
+
+class LazyTokenStream(TokenStream):
+    """TokenStream that pulls tokens from an iterator (such as
+    `Lexer.lex_iter`) as the parser reaches them.
+
+    Tokens are kept until `release` is called, so a caller that knows the
+    parser won't backtrack behind a position can bound memory to the tokens
+    after it.
+    """
+    def __init__(self, tokens: Iterable[Token]) -> None:
+        self._source = iter(tokens)
+        self.tokens: List[Token] = [] # tokens from `offset` onwards
+        self.offset = 0
+        self.lexer_result = LexerResult([])
+        self.lines = None
+        self.pos = 0
+        self._last = None
+    
+    def _pull(self, pos) -> bool:
+        """Reads tokens until `pos` is buffered. Returns False if the input
+        ends first."""
+        while pos - self.offset >= len(self.tokens):
+            if self._source is None:
+                return False
+            tok = next(self._source, None)
+            if tok is None:
+                self._source = None
+                return False
+            self.tokens.append(tok)
+            self._last = tok
+        return True
+    
+    def release(self, pos):
+        """Drops the tokens before `pos`"""
+        if pos > self.offset:
+            self._pull(pos - 1)
+            del self.tokens[:pos - self.offset]
+            self.offset = pos
+    
+    def peek_token(self):
+        if self.pos < self.offset:
+            raise BacktrackError(
+                f"token {self.pos} was released at a commit point at token {self.offset}; "
+                "the grammar backtracks behind a `~`"
+            )
+        if not self._pull(self.pos):
+            eof_pos = Pos(0, 0)
+            if self._last is not None:
+                eof_pos = Pos(self._last.end.lineno, self._last.end.col + 1)
+            return Token("EOF", "<EOF>", start=eof_pos, end=eof_pos)
+        return self.tokens[self.pos - self.offset]
+    
+    def peek_type(self) -> str:
+        return self.peek_token().type
@@ -0,0 +1,246 @@
+"""Generates standalone lexer modules from Lexer classes
+
+The generated module defines the same lexer with its scanner tables worked
+out in advance, so importing it doesn't analyse any regexes, and with a
+scanning loop specialised to its rules. Modifiers and other methods are
+copied by source.
+"""
+from typing import *
+import inspect
+import textwrap
+import types
+import ast
+import builtins
+from contextlib import contextmanager
+
+from .lexer import Lexer, RuleTable
+
+
+HEADER = """# Code @generated by parsergen; do not edit!
+from parsergen.lexer import Lexer, Rule, RuleTable, token_type_id
+"""
+
+SCAN = """
+def _scan(self, stop=None):
+    if stop is not None or self.stats is not None or self._table is not {class_name}._table:
+        return Lexer._scan(self, stop) # bytes input, lex_parallel or instrumented
+    buffer = self.token_list
+    add = buffer.add
+    skip = self._table.skip.match
+    keyword_ids = self._table.keyword_ids
+    dispatch = _SCANNERS
+    default = _DEFAULT_SCANNER
+    while True:
+        text = self.text # modifiers may replace the unconsumed input
+        pos = skip(text, self.pos).end()
+        self.pos = pos
+        if pos >= len(text):
+            break
+        match, kinds, groups = dispatch.get(text[pos], default)
+        m = match(text, pos) if match is not None else None
+        if m is None:
+            token = self.getToken()
+            if token:
+                buffer.append(token, pos, self.pos)
+            continue
+        kind = kinds[m.lastindex]
+        if kind >= 0:
+            stop = m.end()
+            add(kind, pos, stop)
+            self.pos = stop
+        elif kind == -1:
+            self.pos = m.end()
+        elif kind == -3:
+            stop = m.end()
+            add(keyword_ids.get(text[pos:stop], groups[m.lastindex][2]), pos, stop)
+            self.pos = stop
+        else:
+            token_name, rule, _ = groups[m.lastindex]
+            token = self._apply(token_name, rule, m)
+            if token:
+                buffer.append(token, pos, self.pos)
+"""
+
+# group kinds of the generated scanning loop, besides token type ids
+IGNORED = -1
+MODIFIED = -2
+KEYWORD = -3 # may be promoted to a keyword type
+
+
+class LexerGenerator:
+    """Generates the source of a module defining a precompiled version of a
+    Lexer class"""
+    def __init__(self) -> None:
+        self.result = ""
+        self._indent = 0
+        self.imports: Set[str] = set()
+
+    def push(self, line: str):
+        lines = line.split("\n")
+        for l in lines:
+            self.result += ((self._indent * "    ") + l).rstrip() + "\n"
+
+    @contextmanager
+    def indent(self):
+        saved = self._indent
+        try:
+            self._indent += 1
+            yield
+        finally:
+            self._indent = saved
+
+    def generate(self, lexer: Type[Lexer]) -> str:
+        self.result = ""
+        self.imports = set()
+        table = lexer._table
+        tokens = lexer.tokens
+        name = lexer.__name__
+
+        # ids are numbered per process, see token_type_id
+        for token_type in tokens:
+            self.push(f"{token_type} = token_type_id({token_type!r})")
+        self.push(f"TOKEN_TYPES = {tokens!r}")
+        self.push("")
+        self.gen_layout(table.layout)
+        self.push("")
+        self.push("")
+        self.push(f"class {name}(Lexer):")
+        with self.indent():
+            self.push(f"ignore = {lexer.ignore!r}")
+            if lexer.keywords:
+                self.push(f"keywords = {lexer.keywords!r}")
+            self.gen_attributes(lexer)
+            self.push("")
+            self.gen_rules("_rules", lexer._rules)
+            self.gen_rules("_ignores", lexer._ignores)
+            self.push("_table = RuleTable(")
+            self.push("    list(_rules.items()) + list(_ignores.items()), ignore,")
+            self.push("    {name: token_type_id(name) for name in TOKEN_TYPES},")
+            self.push("    layout=(_SUBSETS, _DISPATCH, _DEFAULT),")
+            if lexer.keywords:
+                self.push("    keywords=keywords,")
+            self.push(")")
+            self.push(SCAN.format(class_name=name))
+        self.push("")
+        self.push("_KINDS = [")
+        for kinds in self.kinds(table):
+            self.push(f"    ({', '.join(kinds)}{',' if len(kinds) == 1 else ''}),")
+        self.push("]")
+        self.push("_SCANNER_LIST = [")
+        self.push("    (master.match if master is not None else None, kinds, groups)")
+        self.push(f"    for (master, groups, _), kinds in zip({name}._table.subsets, _KINDS)")
+        self.push("]")
+        self.push("_SCANNERS = {chr(code): _SCANNER_LIST[n] for code, n in enumerate(_DISPATCH)}")
+        self.push("_DEFAULT_SCANNER = _SCANNER_LIST[_DEFAULT]")
+
+        return HEADER + "".join(f"{i}\n" for i in sorted(self.imports)) + "\n" + self.result
+
+    def gen_layout(self, layout):
+        subsets, dispatch, default = layout
+        self.push("# rules that can match starting with each ASCII character")
+        self.push("_SUBSETS = [")
+        for indices in subsets:
+            self.push(f"    {indices!r},")
+        self.push("]")
+        self.push("_DISPATCH = (")
+        for start in range(0, len(dispatch), 16):
+            self.push("    " + " ".join(f"{n}," for n in dispatch[start:start + 16]))
+        self.push(")")
+        self.push(f"_DEFAULT = {default}")
+
+    def gen_attributes(self, lexer: Type[Lexer]):
+        rule_names = set(lexer._rules) | set(lexer._ignores)
+        # modifiers given with @token aren't kept in the class namespace
+        for _, rule in lexer.ordered_rules():
+            if rule.modifier is not None and vars(lexer).get(rule.modifier.__name__) is not rule.modifier:
+                self.push("")
+                self.gen_function(rule.modifier)
+        for key, value in vars(lexer).items():
+            if key.startswith("__") or key in ("ignore", "keywords", "_rules", "_ignores", "_table", "_type_ids", "_bytes_tables", "token"):
+                continue
+            if isinstance(value, (staticmethod, classmethod)):
+                raise ValueError(f"Can't generate {key!r}: only plain methods are copied")
+            if isinstance(value, types.FunctionType):
+                self.push("")
+                self.gen_function(value)
+            elif key in rule_names:
+                continue
+            elif self.is_literal(value):
+                self.push(f"{key} = {value!r}")
+            else:
+                raise ValueError(f"Can't generate attribute {key!r} of {lexer.__name__}")
+
+    def is_literal(self, value) -> bool:
+        try:
+            return ast.literal_eval(repr(value)) == value
+        except (ValueError, SyntaxError):
+            return False
+
+    def gen_function(self, func: types.FunctionType):
+        try:
+            source = textwrap.dedent(inspect.getsource(func))
+        except (OSError, TypeError):
+            raise ValueError(f"Can't find the source of {func.__qualname__}")
+        # drop the decorators, the rules are given in _rules
+        node = ast.parse(source).body[0]
+        lines = source.split("\n")[node.lineno - 1:]
+        self.push("\n".join(lines).rstrip())
+        self.imports |= self.global_imports(func)
+
+    def global_imports(self, func: types.FunctionType) -> Set[str]:
+        """Imports for the module level names `func` uses"""
+        names = set()
+        codes = [func.__code__]
+        while codes:
+            code = codes.pop()
+            names |= set(code.co_names)
+            codes += [c for c in code.co_consts if isinstance(c, types.CodeType)]
+
+        imports = set()
+        for name in sorted(names):
+            if name not in func.__globals__:
+                continue
+            value = func.__globals__[name]
+            if isinstance(value, types.ModuleType):
+                if value.__name__ == name:
+                    imports.add(f"import {name}")
+                else:
+                    imports.add(f"import {value.__name__} as {name}")
+            elif getattr(builtins, name, None) is not value:
+                imports.add(f"from {func.__module__} import {name}")
+        return imports
+
+    def gen_rules(self, attr: str, rules):
+        self.push(f"{attr} = {{")
+        for name, rule in rules.items():
+            match = ", ".join(self.regex(regex) for regex in rule.match)
+            modifier = f", {rule.modifier.__name__}" if rule.modifier else ""
+            self.push(f"    {name!r}: Rule([{match}]{modifier}),")
+        self.push("}")
+
+    def regex(self, regex) -> str:
+        if hasattr(regex, "pattern"):
+            self.imports.add("import re")
+            return f"re.compile({regex.pattern!r}, {int(regex.flags)})"
+        return repr(regex)
+
+    def kinds(self, table: RuleTable) -> List[List[str]]:
+        """For each dispatch subset, the source of what the generated loop
+        does with the match of each group: store a token of that type (its
+        constant), skip it (IGNORED) or call `_apply` (MODIFIED)"""
+        result = []
+        for _, groups, _ in table.subsets:
+            kinds = []
+            for c, group in enumerate(groups):
+                if c == 0 or group is None: # groups[0] counts the rules
+                    kinds.append("None")
+                    continue
+                name, rule, type_id = group
+                if rule.modifier is not None:
+                    kinds.append(str(MODIFIED))
+                elif type_id in table.promoted:
+                    kinds.append(str(KEYWORD))
+                else:
+                    kinds.append(name if type_id >= 0 else str(IGNORED))
+            result.append(kinds)
+        return result
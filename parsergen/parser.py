@@ -89,6 +89,9 @@ class GrammarPrinter:
     def process_NotPredicate(self, p: NotPredicate) -> str:
         return "!" + self.process(p.expr)
     
+    def process_Commit(self, c: Commit) -> str:
+        return "~"
+    
     def process_ExprList(self, expr_list: ExprList) -> str:
         rv = "("
         for c, part in enumerate(expr_list.exprs):
@@ -104,6 +107,9 @@ class GrammarPrinter:
         result = ""
         gap = max([len(name) for name in self._grammar])
         for name, rules in self._grammar.items():
+            for rule in rules:
+                for annotation in rule.annotations:
+                    result += f"@{annotation}\n"
             if len(rules) <= 1:
                 result += f"{name}  :  "
             else:
@@ -1,6 +1,12 @@
-from typing import Optional
-from .lexer import TokenStream, Pos
+from typing import *
+from .lexer import TokenStream, LazyTokenStream, LexerResult, TokenBuffer, Pos, BacktrackError
 from functools import wraps
+from collections import OrderedDict
+from itertools import islice
+from dataclasses import dataclass
+from abc import ABC, abstractmethod
+import asyncio
+import threading
 
 class Filler:
     def __repr__(self) -> str:
@@ -21,10 +27,12 @@ class Node:
         return f"Node({self.type!r}, {self.children!r})"
 
 def memoize(func):
+    """Memoizes a method by position and arguments. Parsers generated by
+    earlier versions use this, new ones use `memoize_rule`."""
     @wraps(func)
     def memoize_wrapper(self, *args):
         pos = self.mark()
-        memo = self.memos
+        memo = self.call_memos
         key = (pos, func, args)
         if key in memo:
             res, endpos = memo[key]
@@ -42,7 +50,7 @@ def memoize_left_rec(func):
     @wraps(func)
     def memoize_left_rec_wrapper(self, *args):
         pos = self.mark()
-        memo = self.memos
+        memo = self.call_memos
         key = (pos, func, args)
         if key in memo:
             res, endpos = memo[key]
@@ -51,19 +59,208 @@ def memoize_left_rec(func):
             # Prime the cache with a failure.
             memo[key] = lastres, lastpos = None, pos
             # Loop until no longer parse is obtained.
-            while True:
-                self.goto(pos)
-                res = func(self, *args)
-                endpos = self.mark()
-                if endpos <= lastpos:
-                    break
-                memo[key] = lastres, lastpos = res, endpos
+            # the loop backtracks, so commits are ignored and the row is kept
+            self.growing.append(pos)
+            try:
+                while True:
+                    self.goto(pos)
+                    res = func(self, *args)
+                    endpos = self.mark()
+                    if endpos <= lastpos:
+                        break
+                    memo[key] = lastres, lastpos = res, endpos
+            finally:
+                self.growing.pop()
             res = lastres
             self.goto(lastpos)
         return res
     return memoize_left_rec_wrapper
 
 
+def _memo_row(self, pos) -> list:
+    # results of rule `n` at `pos` are kept in row[2n], and the end
+    # position in row[2n + 1], which is None until the rule has been tried
+    row = self.memos[pos] = [None] * (2 * self.memo_size)
+    return row
+
+
+def memoize_rule(rule_id: int):
+    """Memoizes a rule method given its id, a number below the parser's
+    `memo_size`. Results are kept in a row of slots per position, so a
+    lookup doesn't build or hash a key."""
+    res_slot = 2 * rule_id
+    end_slot = res_slot + 1
+    
+    def decorator(func):
+        @wraps(func)
+        def memoize_wrapper(self):
+            stream = self.token_stream
+            pos = stream.pos
+            row = self.memos.get(pos)
+            if row is None:
+                row = _memo_row(self, pos)
+            else:
+                endpos = row[end_slot]
+                if endpos is not None:
+                    stream.pos = endpos
+                    return row[res_slot]
+            res = func(self)
+            row[res_slot] = res
+            row[end_slot] = stream.pos
+            return res
+        return memoize_wrapper
+    return decorator
+
+
+def memoize_left_rec_rule(rule_id: int):
+    """`memoize_rule` for left recursive rules, growing the result until
+    it stops getting longer"""
+    res_slot = 2 * rule_id
+    end_slot = res_slot + 1
+    
+    def decorator(func):
+        @wraps(func)
+        def memoize_left_rec_wrapper(self):
+            stream = self.token_stream
+            pos = stream.pos
+            row = self.memos.get(pos)
+            if row is None:
+                row = _memo_row(self, pos)
+            else:
+                endpos = row[end_slot]
+                if endpos is not None:
+                    stream.pos = endpos
+                    return row[res_slot]
+            # Prime the cache with a failure.
+            lastres = row[res_slot] = None
+            lastpos = row[end_slot] = pos
+            # Loop until no longer parse is obtained.
+            # the loop backtracks, so commits are ignored and the row is kept
+            self.growing.append(pos)
+            try:
+                while True:
+                    stream.pos = pos
+                    res = func(self)
+                    endpos = stream.pos
+                    if endpos <= lastpos:
+                        break
+                    lastres = row[res_slot] = res
+                    lastpos = row[end_slot] = endpos
+            finally:
+                self.growing.pop()
+            stream.pos = lastpos
+            return lastres
+        return memoize_left_rec_wrapper
+    return decorator
+
+
+@dataclass
+class MemoStats:
+    created: int = 0 # rows of results created, one per position
+    evicted: int = 0 # rows dropped by the memo policy
+    peak: int = 0 # most rows held at once
+
+
+class MemoPolicy(ABC):
+    """Decides which memoized results a parser keeps. Policies provide the
+    parser's `memos` table, mapping positions to rows of results."""
+    @abstractmethod
+    def table(self, parser: "GeneratedParser"):
+        ...
+    
+    @staticmethod
+    def parse(spec: str) -> "MemoPolicy":
+        """Reads a policy from a string: 'unbounded', 'lru <entries>' or
+        'window <tokens>', as given with `@memo_policy`"""
+        name, *args = spec.split()
+        policies = {"unbounded": Unbounded, "lru": LRU, "window": Window}
+        if name not in policies:
+            raise ValueError(f"Unknown memo policy {spec!r}")
+        try:
+            return policies[name](*map(int, args))
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid memo policy {spec!r}") from None
+
+
+class Unbounded(MemoPolicy):
+    """Keeps every result, the default"""
+    def table(self, parser):
+        return {}
+
+
+class LRU(MemoPolicy):
+    """Keeps the results of the `max_entries` positions used most recently"""
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+    
+    def table(self, parser):
+        return _LRUMemos(parser, self.max_entries)
+
+
+class Window(MemoPolicy):
+    """Keeps the results at the `size` positions behind the furthest one
+    reached and after it"""
+    def __init__(self, size: int) -> None:
+        self.size = size
+    
+    def table(self, parser):
+        return _WindowMemos(parser, self.size)
+
+
+class _LRUMemos(OrderedDict):
+    def __init__(self, parser, max_entries: int) -> None:
+        super().__init__()
+        self.parser = parser
+        self.max_entries = max_entries
+        self.stats = MemoStats()
+    
+    def get(self, pos, default=None):
+        row = super().get(pos, default)
+        if row is not None:
+            self.move_to_end(pos)
+        return row
+    
+    def __setitem__(self, pos, row):
+        super().__setitem__(pos, row)
+        stats = self.stats
+        stats.created += 1
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            growing = self.parser.growing
+            oldest = islice(self, excess + len(growing))
+            for key in [key for key in oldest if key not in growing][:excess]:
+                del self[key]
+                stats.evicted += 1
+        stats.peak = max(stats.peak, len(self))
+
+
+class _WindowMemos(dict):
+    def __init__(self, parser, size: int) -> None:
+        super().__init__()
+        self.parser = parser
+        self.size = size
+        self.furthest = 0
+        self.low = 0 # no rows before this
+        self.stats = MemoStats()
+    
+    def __setitem__(self, pos, row):
+        super().__setitem__(pos, row)
+        stats = self.stats
+        stats.created += 1
+        stats.peak = max(stats.peak, len(self))
+        if pos > self.furthest:
+            self.furthest = pos
+            # drop the rows behind the window once it has moved on by
+            # its size, so each row is looked at a constant number of times
+            limit = pos - self.size
+            if limit - self.low >= self.size:
+                growing = self.parser.growing
+                for key in [key for key in self if key < limit and key not in growing]:
+                    del self[key]
+                    stats.evicted += 1
+                self.low = limit
+
+
 class ParseError(Exception):
     def __init__(self, msg, start: Pos, end: Pos, lineText=""):
         self.msg = msg
@@ -80,11 +277,31 @@ class ParseError(Exception):
 
 class GeneratedParser:
     _or = lambda _, a, b: a or b
+    memo_size = 0 # number of rules memoized with `memoize_rule`
+    memo_policy: Union[MemoPolicy, str, None] = None # see `MemoPolicy.parse`
 
-    def __init__(self, token_stream: TokenStream) -> None:
-        self.memos = {}
+    def __init__(self, token_stream: TokenStream, memo_policy: Union[MemoPolicy, str, None] = None) -> None:
+        policy = memo_policy if memo_policy is not None else self.memo_policy
+        if policy is None:
+            policy = Unbounded()
+        elif isinstance(policy, str):
+            policy = MemoPolicy.parse(policy)
+        self.memos: Dict[int, list] = policy.table(self) # position -> row, see `memoize_rule`
+        self.call_memos = {}
         self.token_stream = token_stream
+        # generated code matches tokens against the type ids of a lexed input
+        # (see token_type_id), or calls expect() past _count
+        tokens = getattr(token_stream, "tokens", None)
+        if isinstance(tokens, TokenBuffer) and tokens.encoding is None:
+            self.token_arrays = (tokens.types, tokens, len(tokens))
+            # for comparing constants with the source text, see gen_ConstantString
+            self.token_spans = (tokens.source, tokens.starts, tokens.ends, tokens.objects)
+        else:
+            self.token_arrays = (None, None, 0)
+            self.token_spans = (None, None, None, None)
         self.error_pos = -1
+        self.growing: List[int] = [] # positions left recursive rules are growing at
+        self.commit_pos = 0 # position of the last commit point reached
 
     def fail(self):
         pos = self.mark()
@@ -95,32 +312,62 @@ class GeneratedParser:
         if self.error_pos == -1:
             return None
         tok = self.fetch(self.error_pos)
-        number_of_lines = len(self.token_stream.lines)
         return ParseError(
             f"Unexpected token {tok.error_format()}", 
             tok.start,
             tok.end,
-            lineText=self.token_stream.lines[tok.start.lineno-1] if tok.start.lineno-1 < number_of_lines and number_of_lines else ""
+            lineText=self.token_stream.line_text(tok.start.lineno)
         )
     
+    @property
+    def memo_stats(self) -> MemoStats:
+        """How many rows of memoized results were created and evicted. For
+        unbounded memos, the counts are those of the rows still held."""
+        stats = getattr(self.memos, "stats", None)
+        if stats is None:
+            stats = MemoStats(created=len(self.memos), peak=len(self.memos))
+        return stats
+    
+    def commit(self):
+        """Called at a commit point (`~`) of the grammar: the parser won't
+        backtrack behind the current position, so the memo entries and
+        tokens before it are dropped. Rules and alternations that started
+        before it fail from then on instead of trying their other
+        alternatives; a `LazyTokenStream` raises `BacktrackError` if the
+        parser still reads a token before it, e.g. after an optional item
+        that failed behind the commit point."""
+        if self.growing:
+            return True
+        pos = self.mark()
+        self.commit_pos = pos
+        memos = self.memos
+        for key in [key for key in memos if key < pos]:
+            del memos[key]
+        # in place, as the memoize wrappers of the rules being parsed hold it
+        memo = self.call_memos
+        for key in [key for key in memo if key[0] < pos]:
+            del memo[key]
+        self.token_stream.release(pos)
+        if self.error_pos < pos:
+            self.error_pos = -1
+        return True
+    
     def mark(self):
         return self.token_stream.mark()
     
     def goto(self, pos):
         self.token_stream.goto(pos)
     
-    @memoize
     def expect(self, type):
-        tok = self.peek_token()
-        if tok.type == type:
-            self.token_stream.pos += 1
-            return tok
+        stream = self.token_stream
+        if stream.peek_type() == type:
+            return stream.get_token()
         return None
     
-    @memoize
     def expect_constant(self, value):
         tok = self.peek_token()
-        if tok.value == value:
+        v = tok.value
+        if v == value or (isinstance(v, bytes) and tok.text == value):
             self.token_stream.pos += 1
             return tok
         return None
@@ -141,4 +388,126 @@ class GeneratedParser:
                     return False
         elif part is None: # TODO: check if this causes issues
             return False
-        return True
\ No newline at end of file
+        return True
+
+
+class _Cancelled(BaseException):
+    """Unwinds a parser thread whose parse_async call was cancelled"""
+
+
+class _SteppedParse:
+    """Runs a parser in a thread of the event loop's default executor, which
+    `asyncio.run` shuts down before it returns. The loop keeps running other
+    tasks during the parse; whenever the parser needs more tokens it waits
+    for the loop to get it the next batch."""
+    def __init__(self, parser_cls, tokens, rule: str, batch_size: int) -> None:
+        self.parser_cls = parser_cls
+        self.tokens = tokens if isinstance(tokens, AsyncIterator) else iter(tokens)
+        self.rule = rule
+        self.batch_size = batch_size
+        self.loop = asyncio.get_running_loop()
+        self.resume = threading.Semaphore(0)
+        self.request: Optional[asyncio.Future] = None
+        self.batch: List = []
+        self.cancelled = False
+    
+    def _post(self, kind, value=None):
+        # nobody waits for the answers of a cancelled parse, and its loop
+        # may be closed already
+        if self.cancelled or self.loop.is_closed():
+            return
+        self.loop.call_soon_threadsafe(self._answer, self.request, (kind, value))
+    
+    @staticmethod
+    def _answer(request: asyncio.Future, answer):
+        if not request.done():
+            request.set_result(answer)
+    
+    def _batches(self):
+        # runs in the parser thread
+        while True:
+            self._post("tokens")
+            self.resume.acquire()
+            if self.cancelled:
+                raise _Cancelled()
+            if not self.batch:
+                return
+            yield from self.batch
+    
+    def _parse(self):
+        self.resume.acquire()
+        try:
+            if self.cancelled:
+                return
+            parser = self.parser_cls(LazyTokenStream(self._batches()))
+            result = getattr(parser, self.rule)()
+            self._post("done", (result, parser.error() if result is None else None))
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            self._post("error", e)
+    
+    async def _next_batch(self) -> List:
+        batch = []
+        if isinstance(self.tokens, AsyncIterator):
+            async for tok in self.tokens:
+                batch.append(tok)
+                if len(batch) >= self.batch_size:
+                    break
+        else:
+            for tok in self.tokens:
+                batch.append(tok)
+                if len(batch) >= self.batch_size:
+                    break
+        return batch
+    
+    async def run(self):
+        self.request = self.loop.create_future()
+        worker = self.loop.run_in_executor(None, self._parse)
+        try:
+            while True:
+                self.resume.release()
+                kind, value = await self.request
+                if kind != "tokens":
+                    await worker
+                    if kind == "error":
+                        raise value
+                    return value
+                self.batch = await self._next_batch()
+                self.request = self.loop.create_future()
+        finally:
+            if not worker.done():
+                # the parser thread stops when it next asks for tokens
+                self.cancelled = True
+                self.resume.release()
+
+
+async def parse_async(parser_cls, tokens, rule: str = "start", executor=None, yield_every: int = 1000) -> Tuple[Any, Optional[ParseError]]:
+    """Parses `tokens` with `parser_cls` without blocking the event loop,
+    returning the result of `rule` and the parse error if it failed.
+
+    `tokens` can be an async iterator of tokens (see `Lexer.lex_async`), any
+    iterable of tokens or a `LexerResult`. With an `executor`, the tokens are
+    collected and the parser runs in the executor. Otherwise the parser runs
+    in a thread of the loop's default executor, and the loop reads the
+    tokens in batches of `yield_every` as the parser needs them.
+    """
+    if isinstance(tokens, LexerResult):
+        tokens = iter(tokens.tokens)
+    if executor is None:
+        return await _SteppedParse(parser_cls, tokens, rule, yield_every).run()
+    
+    if isinstance(tokens, AsyncIterator):
+        collected = []
+        async for tok in tokens:
+            collected.append(tok)
+            if len(collected) % yield_every == 0:
+                await asyncio.sleep(0)
+        tokens = collected
+    return await asyncio.get_running_loop().run_in_executor(executor, _parse, parser_cls, list(tokens), rule)
+
+
+def _parse(parser_cls, tokens, rule):
+    parser = parser_cls(TokenStream(tokens))
+    result = getattr(parser, rule)()
+    return result, parser.error() if result is None else None
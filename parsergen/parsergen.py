@@ -10,22 +10,45 @@ from typing import *
 
 from .lexer import TokenStream
 from .parser import *
+from .parser_utils import MemoPolicy
 from pprint import pprint
+import keyword
 from contextlib import contextmanager
 
 
 HEADER = """# Code @generated by parsergen; do not edit!
 from parsergen.parser_utils import GeneratedParser, TokenStream, Node, Filler
-from parsergen.parser_utils import memoize, memoize_left_rec
+from parsergen.parser_utils import memoize, memoize_left_rec, memoize_rule, memoize_left_rec_rule
+from parsergen.lexer import token_type_id
 from functools import reduce
 """
 
+# locals of generated methods, which named items can't be bound to directly
+RESERVED_LOCALS = {
+    "self", "pos", "part", "parts", "children", "predicate_pos",
+    "_stream", "_types", "_tokens", "_count", "_at", "_next",
+    "_source", "_starts", "_ends", "_objects",
+}
+
 class Generator:
-    def __init__(self) -> None:
+    def __init__(self, straight_line: bool = False, docstrings: bool = True, inline_size: int = 6) -> None:
+        """With `straight_line`, alternatives bind each item to a local and
+        return as soon as they fail instead of collecting a `parts` list,
+        see `gen_straight_statement`. `docstrings` puts the grammar of each
+        alternative and helper in the generated code. Groups, alternations
+        and quantifiers of at most `inline_size` grammar nodes are matched
+        in their caller rather than by a helper method, see `inline`."""
         self.result = ""
         self._indent = 0
         self.counter = 0
         self.queue = []
+        self.token_types: List[str] = [] # matched inline, by their constant
+        self.uses_tokens = False
+        self.uses_spans = False # whether constants are matched against the source
+        self.target = "part" # local the gen_ methods store the match of an item in
+        self.straight_line = straight_line
+        self.docstrings = docstrings
+        self.inline_size = inline_size
         self.config = {
             "class_name": "CustomParser",
             "inherits_from": "GeneratedParser",
@@ -46,47 +69,296 @@ class Generator:
         finally:
             self._indent = saved
     
-    def statement_mapping_graph(self, rules: Dict[str, List[Statement]]):
-        mapping = {}
-        for name, rs in rules.items():
-            mapping[name] = set()
-            for r in rs:
-                mapping[name] |= self.map_node(r)
-        return mapping
-
-    def map_node(self, node) -> Set[str]:
-        result = set()
+    @contextmanager
+    def method_body(self, node=None):
+        """Indents the body of a method, which starts with the grammar of
+        `node` as its docstring, then loads the locals for inline token
+        matching if it matches any tokens"""
+        self.uses_tokens = False
+        self.uses_spans = False
+        with self.indent():
+            if node is not None:
+                self.gen_docstring(node)
+            start = len(self.result)
+            yield
+            if self.uses_tokens:
+                saved = self.result
+                self.result = ""
+                self.push("_stream = self.token_stream")
+                self.push("_types, _tokens, _count = self.token_arrays")
+                if self.uses_spans:
+                    self.push("_source, _starts, _ends, _objects = self.token_spans")
+                self.result = saved[:start] + self.result + saved[start:]
+    
+    def walk(self, node) -> Iterator:
+        """Yields `node` and every item in it"""
+        yield node
         if isinstance(node, Statement):
-            for part in node.grammar:
-                result |= self.map_node(part)
-        if isinstance(node, ExprList):
-            for part in node.exprs:
-                result |= self.map_node(part)
-        if isinstance(node, (Quantifier, NamedItem)):
-            result |= self.map_node(node.expr)
+            children = node.grammar
+        elif isinstance(node, (ExprList, OrOp)):
+            children = node.exprs
+        elif isinstance(node, (Quantifier, NamedItem, Predicate)):
+            children = [node.expr]
+        else:
+            children = []
+        for child in children:
+            yield from self.walk(child)
+    
+    def leftmost_calls(self, node, nullable: Dict[str, bool], calls: Set[str]) -> bool:
+        """Adds the rules `node` can call before it has consumed a token to
+        `calls`. Returns whether `node` can match without consuming one."""
         if isinstance(node, StatementPointer):
-            result |= {node.target}
-        return result
-    
-    def is_left_recursive(self, grammar, name: str):
-        data = self.statement_mapping_graph(grammar)
-        locations = self.located_in(data, name)
-        while True:
-            current = set()
-            prev = locations.copy()
-            for loc in locations:
-                current |= self.located_in(data, loc)
-            locations |= current
-            for loc in data[name]:
-                if loc in locations:
-                    return True
-            if locations == prev:
-                break
-            
-        return False
-
-    def located_in(self, data: Dict[str, Set[str]], name: str) -> Set[str]:
-        return {k for k in data if name in data[k]}
+            calls.add(node.target)
+            return nullable.get(node.target, False)
+        if isinstance(node, (Statement, ExprList)):
+            items = node.grammar if isinstance(node, Statement) else node.exprs
+            for item in items:
+                if not self.leftmost_calls(item, nullable, calls):
+                    return False
+            return True
+        if isinstance(node, OrOp):
+            results = [self.leftmost_calls(choice, nullable, calls) for choice in node.exprs]
+            return any(results)
+        if isinstance(node, Quantifier):
+            return self.leftmost_calls(node.expr, nullable, calls) or not isinstance(node, OneOrMore)
+        if isinstance(node, NamedItem):
+            return self.leftmost_calls(node.expr, nullable, calls)
+        if isinstance(node, Predicate):
+            # tried at the same position, but never consumes
+            self.leftmost_calls(node.expr, nullable, calls)
+            return True
+        return isinstance(node, Commit)
+    
+    def strongly_connected(self, graph: Dict[str, Set[str]]) -> List[List[str]]:
+        """Tarjan's algorithm: the strongly connected components of `graph`,
+        each after the components it has edges to. Edges to names that
+        aren't in `graph` are left out. Iterative, so that long chains of
+        rules don't hit the recursion limit."""
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        components = []
+        for root in graph:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(graph[root]))]
+            while work:
+                node, edges = work[-1]
+                for target in edges:
+                    if target not in graph:
+                        continue
+                    if target not in index:
+                        index[target] = low[target] = len(index)
+                        stack.append(target)
+                        on_stack.add(target)
+                        work.append((target, iter(graph[target])))
+                        break
+                    if target in on_stack:
+                        low[node] = min(low[node], index[target])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+    
+    def left_recursion(self, grammar: Dict[str, List[Statement]]) -> Tuple[Set[str], Set[str]]:
+        """Finds the rules that can call themselves before consuming a
+        token, as cycles of the graph of calls in leftmost position. Returns
+        them and the leaders among them: the rules that grow their result,
+        such that every cycle goes through one. The leaders are the targets
+        of the edges back to the path of a depth first search of each
+        cycle, starting from the rule defined first."""
+        _, nullable = self.first_sets(grammar)
+        graph: Dict[str, Set[str]] = {name: set() for name in grammar}
+        for name, stmts in grammar.items():
+            for stmt in stmts:
+                self.leftmost_calls(stmt, nullable, graph[name])
+        
+        order = {name: c for c, name in enumerate(grammar)}
+        left_recursive: Set[str] = set()
+        leaders: Set[str] = set()
+        for component in self.strongly_connected(graph):
+            members = set(component)
+            if len(component) == 1 and component[0] not in graph[component[0]]:
+                continue
+            left_recursive |= members
+            start = min(component, key=order.__getitem__)
+            visited = {start}
+            path = {start}
+            work = [(start, iter(sorted(graph[start] & members, key=order.__getitem__)))]
+            while work:
+                node, edges = work[-1]
+                for target in edges:
+                    if target in path:
+                        leaders.add(target)
+                    elif target not in visited:
+                        visited.add(target)
+                        path.add(target)
+                        work.append((target, iter(sorted(graph[target] & members, key=order.__getitem__))))
+                        break
+                else:
+                    work.pop()
+                    path.discard(node)
+        return left_recursive, leaders
+    
+    def width(self, node) -> Optional[int]:
+        """Number of tokens `node` always matches, None if it varies"""
+        if isinstance(node, (TokenPointer, ConstantString)):
+            return 1
+        if isinstance(node, (Predicate, Commit)):
+            return 0
+        if isinstance(node, NamedItem):
+            return self.width(node.expr)
+        if isinstance(node, (Statement, ExprList)):
+            items = node.grammar if isinstance(node, Statement) else node.exprs
+            widths = [self.width(item) for item in items]
+            return None if None in widths else sum(widths)
+        if isinstance(node, OrOp):
+            widths = {self.width(choice) for choice in node.exprs}
+            return widths.pop() if len(widths) == 1 else None
+        return None
+    
+    def first(self, node, firsts: Dict[str, Optional[Set[str]]], nullable: Dict[str, bool]) -> Tuple[Optional[Set[str]], bool]:
+        """Token types a match of `node` can start with, and whether it can
+        match without consuming a token. The set is None if it can't be
+        known from token types alone: constant strings, tokens without a
+        constant, and predicates and commit points, which look further
+        ahead or have effects even when the match fails straight away."""
+        if isinstance(node, TokenPointer):
+            return ({node.target} if self.inline_token(node.target) else None), False
+        if isinstance(node, StatementPointer):
+            return firsts.get(node.target), nullable.get(node.target, False)
+        if isinstance(node, ConstantString):
+            return None, False
+        if isinstance(node, (Predicate, Commit)):
+            return None, True
+        if isinstance(node, NamedItem):
+            return self.first(node.expr, firsts, nullable)
+        if isinstance(node, (Statement, ExprList)):
+            items = node.grammar if isinstance(node, Statement) else node.exprs
+            result: Optional[Set[str]] = set()
+            for item in items:
+                item_first, item_nullable = self.first(item, firsts, nullable)
+                result = None if result is None or item_first is None else result | item_first
+                if not item_nullable:
+                    return result, False
+            return result, True
+        if isinstance(node, OrOp):
+            result = set()
+            any_nullable = False
+            for choice in node.exprs:
+                choice_first, choice_nullable = self.first(choice, firsts, nullable)
+                result = None if result is None or choice_first is None else result | choice_first
+                any_nullable = any_nullable or choice_nullable
+            return result, any_nullable
+        if isinstance(node, Quantifier):
+            expr_first, expr_nullable = self.first(node.expr, firsts, nullable)
+            return expr_first, expr_nullable or not isinstance(node, OneOrMore)
+        return None, False
+    
+    def first_sets(self, grammar: Dict[str, List[Statement]]) -> Tuple[Dict[str, Optional[Set[str]]], Dict[str, bool]]:
+        """FIRST sets and nullability of every rule, see `first`. Rules are
+        visited after the rules they call, so each set only has to be
+        widened from empty until nothing changes within recursive groups
+        of rules."""
+        calls = {
+            name: {node.target for stmt in stmts for node in self.walk(stmt) if isinstance(node, StatementPointer)}
+            for name, stmts in grammar.items()
+        }
+        firsts: Dict[str, Optional[Set[str]]] = {name: set() for name in grammar}
+        nullable = {name: False for name in grammar}
+        for component in self.strongly_connected(calls):
+            changed = True
+            while changed:
+                changed = False
+                for name in component:
+                    result: Optional[Set[str]] = set()
+                    any_nullable = False
+                    for stmt in grammar[name]:
+                        stmt_first, stmt_nullable = self.first(stmt, firsts, nullable)
+                        any_nullable = any_nullable or stmt_nullable
+                        result = None if result is None or stmt_first is None else result | stmt_first
+                    if result != firsts[name] or any_nullable != nullable[name]:
+                        firsts[name] = result
+                        nullable[name] = any_nullable
+                        changed = True
+        return firsts, nullable
+    
+    def call_sites(self, node, rule: str, fixed: bool, sites: Dict[str, List[Tuple[str, bool]]]):
+        """Finds the rules `node` calls. A call site is `fixed` if it is
+        always at the same offset from the start of `rule`, and only tried
+        once each time `rule` is."""
+        if isinstance(node, StatementPointer):
+            sites.setdefault(node.target, []).append((rule, fixed))
+        elif isinstance(node, (Statement, ExprList)):
+            items = node.grammar if isinstance(node, Statement) else node.exprs
+            for item in items:
+                self.call_sites(item, rule, fixed, sites)
+                fixed = fixed and self.width(item) is not None
+        elif isinstance(node, OrOp):
+            for choice in node.exprs:
+                self.call_sites(choice, rule, fixed, sites)
+        elif isinstance(node, (ZeroOrMore, OneOrMore)):
+            # each repetition is at a different offset
+            self.call_sites(node.expr, rule, False, sites)
+        elif isinstance(node, (ZeroOrOne, NamedItem, Predicate)):
+            self.call_sites(node.expr, rule, fixed, sites)
+    
+    def memoized_rules(self, grammar: Dict[str, List[Statement]], left_recursive: Set[str], leaders: Set[str]) -> Set[str]:
+        """Rules that can be tried more than once at the same position, and
+        so are worth memoizing: all except those with a single call site at
+        a fixed offset from the start of a caller that is itself only tried
+        once per position. `@memo` and `@nomemo` annotations override this.
+        Of the left recursive rules, the leaders are always memoized and the
+        others never are, as their results change while a leader grows."""
+        sites: Dict[str, List[Tuple[str, bool]]] = {}
+        annotations = {}
+        for name, stmts in grammar.items():
+            for stmt in stmts:
+                self.call_sites(stmt, name, True, sites)
+                for annotation in stmt.annotations:
+                    if annotation not in ("memo", "nomemo"):
+                        raise ValueError(f"Unknown annotation @{annotation} on rule {name!r}")
+                    annotations[name] = annotation
+            if annotations.get(name) == "nomemo" and name in leaders:
+                raise ValueError(f"Left recursive rule {name!r} can't be @nomemo")
+            if annotations.get(name) == "memo" and name in left_recursive - leaders:
+                raise ValueError(f"Left recursive rule {name!r} can't be @memo, only the leaders of its cycle are")
+        
+        once: Dict[str, bool] = {} # whether a rule is tried at most once per position
+        def tried_once(name: str) -> bool:
+            if name not in once:
+                once[name] = False # unreachable through a cycle of single callers
+                callers = sites.get(name, [])
+                if not callers:
+                    once[name] = True # only called by the user
+                elif len(callers) == 1 and name not in left_recursive:
+                    caller, fixed = callers[0]
+                    # left recursive rules run their body again at the same position
+                    once[name] = fixed and caller not in left_recursive and (
+                        annotations.get(caller) != "nomemo" or tried_once(caller)
+                    )
+            return once[name]
+        
+        return {
+            name for name in grammar
+            if annotations.get(name) == "memo" or name in leaders
+            or name not in left_recursive and annotations.get(name) != "nomemo" and not tried_once(name)
+        }
     
     def process_sections(self, parser_definition: ParserDefinition) -> Dict[str, List[Statement]]:
         rules_list = []
@@ -112,37 +384,117 @@ class Generator:
         self.config[call.name] = call.value
 
     def generate_parser_class(self, grammar: Dict[str, List[Statement]]):
+        self.token_types = []
+        for stmts in grammar.values():
+            for node in (node for stmt in stmts for node in self.walk(stmt)):
+                if isinstance(node, TokenPointer) and self.inline_token(node.target) and node.target not in self.token_types:
+                    self.token_types.append(node.target)
+        # the same ids as in the token buffers of lexers, see token_type_id
+        for name in self.token_types:
+            self.push(f"{name} = token_type_id({name!r})")
+        guards = self.alternative_guards(grammar)
+        self.cuts = any(isinstance(node, Commit) for stmts in grammar.values() for stmt in stmts for node in self.walk(stmt))
+        if self.token_types:
+            self.push("")
         
         self.push(f"class {self.config['class_name']}({self.config['inherits_from']}):")
         with self.indent():
+            left_recursive, leaders = self.left_recursion(grammar)
+            memoized = self.memoized_rules(grammar, left_recursive, leaders)
+            # each memoized rule gets memo slots of its own, see memoize_rule
+            rule_ids = {name: c for c, name in enumerate(name for name in grammar if name in memoized)}
+            self.push(f"memo_size = {len(rule_ids)}")
+            if self.config.get("memo_policy"):
+                MemoPolicy.parse(self.config["memo_policy"]) # check it
+                self.push(f"memo_policy = {self.config['memo_policy']!r}")
+            self.push("")
             for name, stmts in grammar.items():
-                if self.is_left_recursive(grammar, name):
-                    self.push(f"@memoize_left_rec")
-                else:
-                    self.push(f"@memoize")
+                if name in leaders:
+                    self.push(f"@memoize_left_rec_rule({rule_ids[name]})")
+                elif name in memoized:
+                    self.push(f"@memoize_rule({rule_ids[name]})")
                 self.push(f"def {name}(self):")
                 queue = []
-                with self.indent():
+                with self.method_body():
                     self.push(f"pos = self.mark()")
-                    for stmt in stmts:
-                        self.gen_statement(stmt, queue)
+                    if any(guards[name]):
+                        # type of the next token, None if it isn't known yet
+                        self.uses_tokens = True
+                        self.push("_next = _types[pos] if pos < _count else None")
+                    for c, (stmt, guard) in enumerate(zip(stmts, guards[name])):
+                        last = c == len(stmts) - 1
+                        if c > 0:
+                            self.gen_cut("pos")
+                        if guard is None:
+                            self.gen_alternative(stmt, queue, last)
+                            continue
+                        # skip alternatives that can't start with the next token,
+                        # failing at the same position as trying them would
+                        self.push(f"if _next is None or {guard}:")
+                        with self.indent():
+                            self.gen_alternative(stmt, queue, last)
+                        self.result = self.result.rstrip() + "\n"
+                        self.push("else:")
+                        self.push("    self.fail()\n")
                     self.push(f"return None\n")
                 self.resolve_queue(queue)
         return HEADER + self.config["header"] + self.result
     
+    def alternative_guards(self, grammar: Dict[str, List[Statement]]) -> Dict[str, List[Optional[str]]]:
+        """For each alternative of each rule, the condition on `_next` under
+        which it can match, or None to always try it. Sets of several token
+        types are emitted as module level constants."""
+        firsts, nullable = self.first_sets(grammar)
+        constants: Dict[FrozenSet[str], str] = {}
+        guards = {}
+        for name, stmts in grammar.items():
+            guards[name] = []
+            for stmt in stmts:
+                stmt_first, stmt_nullable = self.first(stmt, firsts, nullable)
+                if stmt_first is None or stmt_nullable:
+                    guards[name].append(None)
+                elif len(stmt_first) == 1:
+                    guards[name].append(f"_next == {next(iter(stmt_first))}")
+                else:
+                    types = frozenset(stmt_first)
+                    if types not in constants:
+                        constants[types] = f"_first_{len(constants)}"
+                        self.push(f"{constants[types]} = frozenset(({', '.join(sorted(types))}))")
+                    guards[name].append(f"_next in {constants[types]}")
+        return guards
+    
+    def gen_cut(self, pos: str):
+        """Emits the check before trying another alternative: if the parser
+        committed after `pos`, the alternatives starting there fail without
+        trying the others, see `GeneratedParser.commit`"""
+        if self.cuts:
+            self.push(f"if {pos} < self.commit_pos: return None")
+    
+    def gen_docstring(self, node):
+        if self.docstrings:
+            self.push(f'"""\n{GrammarPrinter(None).process(node)}\n"""')
+    
+    def gen_alternative(self, stmt: Statement, queue, last: bool):
+        if self.straight_line:
+            self.gen_straight_statement(stmt, queue, last)
+        else:
+            self.gen_statement(stmt, queue)
+    
     def gen_statement(self, stmt: Statement, queue):
-        self.push(f'"""\n{GrammarPrinter(None).process(stmt)}\n"""')
+        self.gen_docstring(stmt)
         self.push("parts = []")
         named_items = []
         self.push("for _ in range(1):")
         with self.indent():
-            for c, item in enumerate(stmt.grammar):
+            c = 0 # index of the item's part
+            for item in stmt.grammar:
                 if isinstance(item, NamedItem):
                     named_items.append((c, item))
                     item = item.expr
                 self.gen(item, queue)
-                if not isinstance(item, Predicate):
+                if not isinstance(item, (Predicate, Commit)):
                     # don't generate extra clause for Predicates
+                    c += 1
                     self.push("if not self.match(part):")
                     with self.indent():
                         self.push("self.fail()")
@@ -158,20 +510,132 @@ class Generator:
         
         self.push(f"self.goto(pos)\n")
     
+    def gen_straight_statement(self, stmt: Statement, queue, last: bool):
+        """Emits an alternative without a parts list: each item is stored in
+        the local its name or the action needs, or left in `part`. The last
+        alternative of a rule returns as soon as an item fails; the others
+        run in a `while True` block they break out of, so that a failure
+        falls through to the next alternative. Either way the checks stay
+        at the same depth however long the alternative is."""
+        self.gen_docstring(stmt)
+        items = []
+        renames = [] # named items that would clash with the generator's locals
+        for c, item in enumerate(stmt.grammar):
+            name = None
+            if isinstance(item, NamedItem):
+                name, item = item.name, item.expr
+            if isinstance(item, (Predicate, Commit)):
+                target = "part"
+            elif name is not None and name not in RESERVED_LOCALS and not name.startswith("_"):
+                target = name
+            elif name is not None or not stmt.action:
+                target = f"_{c}"
+                if name is not None:
+                    renames.append((name, target))
+            else:
+                target = "part"
+            items.append((item, target))
+        
+        def gen_success():
+            for name, target in renames:
+                self.push(f"{name} = {target}")
+            if stmt.action:
+                self.push(f"return {stmt.action}")
+            else:
+                parts = [target for item, target in items if not isinstance(item, (Predicate, Commit))]
+                self.push(f"return Node({stmt.name!r}, [{', '.join(parts)}])")
+        
+        def gen_items(exit: List[str]):
+            for item, target in items:
+                _, failed = self.gen_item(item, target, queue)
+                if failed is not None:
+                    self.push(f"if {failed}:")
+                    with self.indent():
+                        self.push("self.fail()")
+                        for line in exit:
+                            self.push(line)
+            gen_success()
+        
+        if last:
+            gen_items(["self.goto(pos)", "return None"])
+            return
+        # a loop that only runs once, as the success path returns
+        self.push("while True:")
+        with self.indent():
+            gen_items(["break"])
+        self.push("self.goto(pos)\n")
+    
+    def gen_item(self, item: Expr, target: str, queue) -> Tuple[Optional[str], Optional[str]]:
+        """Emits the match of an item in a straight line alternative or
+        sequence, storing it in `target`. Returns the conditions under which
+        it matched and failed, None if it can't fail."""
+        if isinstance(item, Commit):
+            self.gen(item, queue)
+            return None, None
+        if isinstance(item, Predicate):
+            self.push("predicate_pos = self.mark()")
+            self.gen(item.expr, queue)
+            self.push("self.goto(predicate_pos)")
+            conditions = ("self.match(part)", "not self.match(part)")
+            return conditions if isinstance(item, AndPredicate) else conditions[::-1]
+        saved = self.target
+        self.target = target
+        try:
+            self.gen(item, queue)
+        finally:
+            self.target = saved
+        if isinstance(item, (TokenPointer, ConstantString)):
+            return f"{target} is not None", f"{target} is None" # a token, never a list
+        return f"self.match({target})", f"not self.match({target})"
+    
     def gen(self, item: Expr, queue):
         return getattr(self, f"gen_{type(item).__name__}")(item, queue)
     
     #def construct(self, f: str, args: List[str]):
     #    return f"{f}({', '.join(repr(arg) for arg in args)})"
     
+    def inline_token(self, name: str) -> bool:
+        """Whether tokens of type `name` are matched inline, comparing ids
+        with a module level constant of that name"""
+        return name != "EOF" and name.isidentifier() and not keyword.iskeyword(name)
+    
     def gen_TokenPointer(self, item: TokenPointer, queue):
-        self.push(f"part = self.expect({item.target!r})")
+        if not self.inline_token(item.target):
+            self.push(f"{self.target} = self.expect({item.target!r})")
+            return
+        # inline version of self.expect, which handles the end of the tokens
+        self.uses_tokens = True
+        self.push("_at = _stream.pos")
+        self.push("if _at >= _count:")
+        self.push(f"    {self.target} = self.expect({item.target!r})")
+        self.push(f"elif _types[_at] == {item.target}:")
+        self.push(f"    {self.target} = _tokens[_at]")
+        self.push("    _stream.pos = _at + 1")
+        self.push("else:")
+        self.push(f"    {self.target} = None")
     
     def gen_StatementPointer(self, item: StatementPointer, queue):
-        self.push(f"part = self.{item.target}()")
+        self.push(f"{self.target} = self.{item.target}()")
     
     def gen_ConstantString(self, item: ConstantString, queue):
-        self.push(f"part = self.expect_constant({item.value!r})")
+        # inline version of self.expect_constant, which compares the source
+        # text of a token and only makes its Token once it matched; tokens
+        # kept as objects may have had their values changed by a modifier
+        self.uses_tokens = self.uses_spans = True
+        self.push("_at = _stream.pos")
+        self.push("if _at >= _count:")
+        self.push(f"    {self.target} = self.expect_constant({item.value!r})")
+        self.push("elif _at in _objects:")
+        self.push(f"    {self.target} = _objects[_at]")
+        self.push(f"    if {self.target}.value == {item.value!r}:")
+        self.push("        _stream.pos = _at + 1")
+        self.push("    else:")
+        self.push(f"        {self.target} = None")
+        self.push(f"elif _ends[_at] - _starts[_at] == {len(item.value)} and _source.startswith({item.value!r}, _starts[_at]):")
+        self.push(f"    {self.target} = _tokens[_at]")
+        self.push("    _stream.pos = _at + 1")
+        self.push("else:")
+        self.push(f"    {self.target} = None")
     
     def gen_AndPredicate(self, item: AndPredicate, queue):
         self.push("predicate_pos = self.mark()")
@@ -192,38 +656,142 @@ class Generator:
             self.push("break")
 
     
+    def gen_Commit(self, item: Commit, queue):
+        self.push("part = self.commit()")
+    
+    def inline(self, item: Expr) -> bool:
+        """Whether to match `item` in the calling method: if it is small, and
+        has no predicates or commit points, which rely on `part` and
+        `predicate_pos` not being used by the items around them."""
+        nodes = list(self.walk(item))
+        return len(nodes) <= self.inline_size and not any(isinstance(node, (Predicate, Commit)) for node in nodes)
+    
+    def gen_comment(self, item: Expr):
+        if self.docstrings:
+            self.push(f"# {GrammarPrinter(None).process(item)}")
+    
     def gen_ZeroOrMore(self, item: ZeroOrMore, queue):
+        if self.inline(item):
+            return self.inline_loop(item, queue)
         queue.append((item, self.counter))
-        self.push(f"part = self._loop_{self.counter}()")
+        self.push(f"{self.target} = self._loop_{self.counter}()")
         self.counter += 1
     
     def gen_OneOrMore(self, item: OneOrMore, queue):
+        if self.inline(item):
+            return self.inline_loop(item, queue)
         queue.append((item, self.counter))
-        self.push(f"part = self._loop_{self.counter}()")
+        self.push(f"{self.target} = self._loop_{self.counter}()")
         self.counter += 1
     
     def gen_ZeroOrOne(self, item: ZeroOrOne, queue):
+        if self.inline(item):
+            return self.inline_ZeroOrOne(item, queue)
         queue.append((item, self.counter))
-        self.push(f"part = self._maybe_{self.counter}()")
+        self.push(f"{self.target} = self._maybe_{self.counter}()")
         self.counter += 1
     
     def gen_OrOp(self, item: OrOp, queue):
+        if self.inline(item):
+            return self.inline_OrOp(item, queue)
         queue.append((item, self.counter))
-        self.push(f"part = self._or_{self.counter}()")
+        self.push(f"{self.target} = self._or_{self.counter}()")
         self.counter += 1
 
     def gen_ExprList(self, item: ExprList, queue):
+        if self.inline(item):
+            return self.inline_ExprList(item, queue)
         queue.append((item, self.counter))
-        self.push(f"part = self._expr_list_{self.counter}()")
+        self.push(f"{self.target} = self._expr_list_{self.counter}()")
+        self.counter += 1
+    
+    # The inline_ methods emit the same steps as the matching helper method,
+    # with locals numbered by the counter so that nested ones don't clash.
+    
+    def inline_loop(self, item: Quantifier, queue):
+        c = self.counter
+        self.counter += 1
+        target = self.target
+        self.gen_comment(item)
+        self.push(f"_children_{c} = []")
+        self.push("while True:")
+        with self.indent():
+            self.push(f"_pos_{c} = self.mark()")
+            self.gen(item.expr, queue)
+            self.push(f"if self.match({target}): _children_{c}.append({target})")
+            self.push("else:")
+            with self.indent():
+                if isinstance(item, OneOrMore):
+                    self.push(f"if len(_children_{c}) == 0:")
+                    self.push("    self.fail()")
+                self.push(f"self.goto(_pos_{c})")
+                self.push("break")
+        if isinstance(item, OneOrMore):
+            self.push(f"{target} = _children_{c} if len(_children_{c}) > 0 else None")
+        else:
+            self.push(f"{target} = _children_{c}")
+    
+    def inline_ZeroOrOne(self, item: ZeroOrOne, queue):
+        c = self.counter
+        self.counter += 1
+        self.gen_comment(item)
+        self.push(f"_pos_{c} = self.mark()")
+        self.gen(item.expr, queue)
+        self.push(f"if not self.match({self.target}):")
+        self.push(f"    self.goto(_pos_{c})")
+        self.push(f"    {self.target} = Filler()")
+    
+    def inline_OrOp(self, item: OrOp, queue):
+        c = self.counter
         self.counter += 1
+        self.gen_comment(item)
+        self.push(f"_pos_{c} = self.mark()")
+        def gen_choices(choices):
+            self.gen(choices[0], queue)
+            self.push(f"if not self.match({self.target}):")
+            with self.indent():
+                self.push(f"self.goto(_pos_{c})")
+                if len(choices) > 1 and self.cuts:
+                    self.push(f"if _pos_{c} < self.commit_pos:")
+                    self.push(f"    {self.target} = None")
+                    self.push("else:")
+                    with self.indent():
+                        gen_choices(choices[1:])
+                elif len(choices) > 1:
+                    gen_choices(choices[1:])
+                else:
+                    self.push("self.fail()")
+                    self.push(f"{self.target} = None")
+        gen_choices(item.exprs)
+    
+    def inline_ExprList(self, item: ExprList, queue):
+        c = self.counter
+        self.counter += 1
+        target = self.target
+        self.gen_comment(item)
+        self.push(f"_pos_{c} = self.mark()")
+        self.push(f"{target} = None")
+        parts = [f"_{c}_{n}" for n in range(len(item.exprs))]
+        def gen_parts(n):
+            if n == len(item.exprs):
+                self.push(f"{target} = [{', '.join(parts)}]")
+                return
+            matched, _ = self.gen_item(item.exprs[n], parts[n], queue)
+            self.push(f"if {matched}:")
+            with self.indent():
+                gen_parts(n + 1)
+            self.push("else:")
+            self.push("    self.fail()")
+        gen_parts(0)
+        self.push(f"if {target} is None:")
+        self.push(f"    self.goto(_pos_{c})")
     
     def resolve(self, item: Expr, c, queue):
         return getattr(self, f"resolve_{type(item).__name__}")(item, c, queue)
     
     def resolve_ZeroOrMore(self, item: ZeroOrMore, c, queue):
         self.push(f"def _loop_{c}(self):")
-        with self.indent():
-            self.push(f'"""\n{GrammarPrinter(None).process(item)}\n"""')
+        with self.method_body(item):
             self.push("children = []")
             self.push("while True:")
             with self.indent():
@@ -238,8 +806,7 @@ class Generator:
     
     def resolve_OneOrMore(self, item: OneOrMore, c, queue):
         self.push(f"def _loop_{c}(self):")
-        with self.indent():
-            self.push(f'"""\n{GrammarPrinter(None).process(item)}\n"""')
+        with self.method_body(item):
             self.push("children = []")
             self.push("while True:")
             with self.indent():
@@ -257,8 +824,7 @@ class Generator:
     
     def resolve_ZeroOrOne(self, item: ZeroOrOne, c, queue):
         self.push(f"def _maybe_{c}(self):")
-        with self.indent():
-            self.push(f'"""\n{GrammarPrinter(None).process(item)}\n"""')
+        with self.method_body(item):
             self.push("pos = self.mark()")
             self.gen(item.expr, queue)
             self.push("if self.match(part): return part")
@@ -267,15 +833,17 @@ class Generator:
     
     def resolve_ExprList(self, item: ExprList, c, queue):
         self.push(f"def _expr_list_{c}(self):")
-        with self.indent():
-            self.push(f'"""\n{GrammarPrinter(None).process(item)}\n"""')
+        with self.method_body(item):
             self.push("pos = self.mark()")
+            if self.straight_line:
+                self.gen_straight_sequence(item, queue)
+                return
             self.push("parts = []")
             self.push("for _ in range(1):")
             with self.indent():
                 for part in item.exprs:
                     self.gen(part, queue)
-                    if not isinstance(part, Predicate):
+                    if not isinstance(part, (Predicate, Commit)):
                         # don't generate extra clause for Predicates
                         self.push("if not self.match(part):")
                         with self.indent():
@@ -286,12 +854,28 @@ class Generator:
             self.push("self.goto(pos)")
             self.push("return None")
     
+    def gen_straight_sequence(self, item: ExprList, queue):
+        parts = []
+        for c, part in enumerate(item.exprs):
+            target = "part" if isinstance(part, (Predicate, Commit)) else f"_{c}"
+            _, failed = self.gen_item(part, target, queue)
+            if failed is not None:
+                self.push(f"if {failed}:")
+                with self.indent():
+                    self.push("self.fail()")
+                    self.push("self.goto(pos)")
+                    self.push("return None")
+            if target != "part":
+                parts.append(target)
+        self.push(f"return [{', '.join(parts)}]")
+    
     def resolve_OrOp(self, item: OrOp, c, queue):
         self.push(f"def _or_{c}(self):")
-        with self.indent():
-            self.push(f'"""\n{GrammarPrinter(None).process(item)}\n"""')
+        with self.method_body(item):
             self.push("pos = self.mark()")
             for choice in item.exprs:
+                if choice is not item.exprs[0]:
+                    self.gen_cut("pos")
                 self.gen(choice, queue)
                 self.push("if self.match(part): return part")
                 self.push("self.goto(pos)")
@@ -0,0 +1,332 @@
+"""Static analysis of the regular expressions used by Lexer rules"""
+from typing import *
+import re
+import string
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError: # Python < 3.11
+    import sre_parse, sre_constants
+
+ASCII = frozenset(chr(c) for c in range(128))
+DIGITS = frozenset(string.digits)
+SPACES = frozenset(" \t\n\r\f\v")
+WORD = frozenset(string.ascii_letters + string.digits + "_")
+
+CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: DIGITS,
+    sre_constants.CATEGORY_NOT_DIGIT: ASCII - DIGITS,
+    sre_constants.CATEGORY_SPACE: SPACES,
+    sre_constants.CATEGORY_NOT_SPACE: ASCII - SPACES,
+    sre_constants.CATEGORY_WORD: WORD,
+    sre_constants.CATEGORY_NOT_WORD: ASCII - WORD,
+}
+
+# the non-ASCII characters that match ASCII ones under IGNORECASE
+ASCII_FOLDS = {
+    0x130: "iI", # LATIN CAPITAL LETTER I WITH DOT ABOVE
+    0x131: "iI", # LATIN SMALL LETTER DOTLESS I
+    0x17f: "sS", # LATIN SMALL LETTER LONG S
+    0x212a: "kK", # KELVIN SIGN
+}
+
+# zero width items, which never decide the first character
+ZERO_WIDTH = {sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT}
+REPEATS = {
+    sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+    getattr(sre_constants, "POSSESSIVE_REPEAT", sre_constants.MAX_REPEAT),
+}
+
+
+class Unknown(Exception):
+    pass
+
+
+class FirstChars(NamedTuple):
+    """Characters a regex match can start with: a set of ASCII characters,
+    and whether it can also start with a non-ASCII one."""
+    chars: FrozenSet[str]
+    other: bool
+
+
+def first_chars(regex) -> Optional[FirstChars]:
+    """Works out which characters a match of `regex` can start with.
+
+    The result may include characters that can't actually start a match, but
+    never misses one. Returns `None` if the regex can match the empty string
+    or uses something that isn't understood (backreferences, conditionals).
+    """
+    flags = 0
+    if hasattr(regex, "pattern"):
+        flags = regex.flags
+        regex = regex.pattern
+    if isinstance(regex, bytes):
+        regex = regex.decode("latin-1")
+    try:
+        parsed = sre_parse.parse(regex, flags)
+        chars, other, nullable = _sequence(list(parsed), bool(parsed.state.flags & re.IGNORECASE))
+    except (Unknown, re.error):
+        return None
+    if nullable:
+        return None
+    return FirstChars(frozenset(chars), other)
+
+
+def _sequence(items, icase) -> Tuple[Set[str], bool, bool]:
+    chars = set()
+    other = False
+    for op, av in items:
+        c, o, nullable = _item(op, av, icase)
+        chars |= c
+        other |= o
+        if not nullable:
+            return chars, other, False
+    return chars, other, True
+
+
+def _fold(chars: Set[str], other: bool, icase: bool) -> Tuple[Set[str], bool, bool]:
+    if icase:
+        # case folding can also reach non-ASCII characters (e.g. KELVIN SIGN)
+        chars = chars | {c.swapcase() for c in chars}
+        other = True
+    return chars, other, False
+
+
+def _ascii_folds(low: int, high: int) -> Set[str]:
+    """ASCII characters that code points `low` to `high` match under
+    IGNORECASE, besides themselves"""
+    return {c for code, chars in ASCII_FOLDS.items() if low <= code <= high for c in chars}
+
+
+def _item(op, av, icase) -> Tuple[Set[str], bool, bool]:
+    if op is sre_constants.LITERAL:
+        if av < 128:
+            return _fold({chr(av)}, False, icase)
+        return (_ascii_folds(av, av) if icase else set()), True, False
+    if op is sre_constants.NOT_LITERAL:
+        return set(ASCII) - ({chr(av)} if not icase else set()), True, False
+    if op is sre_constants.ANY:
+        return set(ASCII), True, False
+    if op is sre_constants.IN:
+        return _in(av, icase)
+    if op is sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, p = av
+        icase = (icase or bool(add_flags & re.IGNORECASE)) and not del_flags & re.IGNORECASE
+        return _sequence(p, icase)
+    if op is getattr(sre_constants, "ATOMIC_GROUP", None):
+        return _sequence(av, icase)
+    if op is sre_constants.BRANCH:
+        chars = set()
+        other = False
+        nullable = False
+        for branch in av[1]:
+            c, o, n = _sequence(branch, icase)
+            chars |= c
+            other |= o
+            nullable |= n
+        return chars, other, nullable
+    if op in REPEATS:
+        low, _, p = av
+        chars, other, nullable = _sequence(p, icase)
+        return chars, other, nullable or low == 0
+    if op in ZERO_WIDTH:
+        return set(), False, True
+    raise Unknown(op)
+
+
+START_ANCHORS = {sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING}
+BOUNDARIES = {sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY}
+# what the assertions a regex starts with become when matching in place:
+# the lexer used to match against the rest of the input, where nothing
+# comes before the token start
+START_REWRITES = {
+    "^": "", "\\A": "",
+    "\\b": "(?=\\w)", "\\B": "(?!\\w)",
+    "(?<=": "(?=(?!)", # a lookbehind never held
+    "(?<!": "(?!(?!)", # a negative one always did
+}
+_LEADING_FLAGS = re.compile(r"(?:\(\?[aiLmsux]+\))*")
+_START_ASSERTION = re.compile(r"\^|\\[AbB]|\(\?<[=!]")
+
+
+def rewrite_start_assertions(regex):
+    """Rules used to be matched against the rest of the input, so the
+    zero-width assertions at the start of a regex only saw the token: `^`,
+    `\\A` and `\\b` before a word character always held, lookbehinds never
+    did. Returns `regex` with those rewritten to hold as they did, as rules
+    are now matched in place, in the whole input.
+    Raises ValueError for such assertions elsewhere that can look before
+    the token start, such as `a?^b`, `(x|\\b)y` or `a(?<=ba)`."""
+    flags = 0
+    source = regex
+    if hasattr(regex, "pattern"):
+        flags = regex.flags
+        source = regex.pattern
+    text = source.decode("latin-1") if isinstance(source, bytes) else source
+    pos = _LEADING_FLAGS.match(text).end()
+    rewritten = text[:pos]
+    m = _START_ASSERTION.match(text, pos)
+    while m is not None:
+        rewritten += START_REWRITES[m.group()]
+        pos = m.end()
+        if m.group().startswith("(?<"):
+            break # the rest of the lookbehind follows
+        m = _START_ASSERTION.match(text, pos)
+    text = rewritten + text[pos:]
+    try:
+        found, _ = _before_start(list(sre_parse.parse(text, flags)), 0)
+    except re.error:
+        return regex
+    if found is not None:
+        raise ValueError(f"{source!r} has {found} that can look before the token start, it can only be at the start of the regex")
+    if pos == 0:
+        return regex
+    if isinstance(source, bytes):
+        text = text.encode("latin-1")
+    return re.compile(text, flags) if hasattr(regex, "pattern") else text
+
+
+def _before_start(items, consumed: int) -> Tuple[Optional[str], int]:
+    """Finds an assertion in `items` that looks before the token start when
+    they are matched `consumed` characters into the token. Returns its
+    description, or None, and the least number of characters they match."""
+    width = 0
+    for op, av in items:
+        at = consumed + width
+        found, w = None, 0
+        if op is sre_constants.AT:
+            if at == 0 and av in START_ANCHORS:
+                found = "a ^ or \\A anchor"
+            elif at == 0 and av in BOUNDARIES:
+                found = "a \\b or \\B"
+        elif op is sre_constants.SUBPATTERN:
+            found, w = _before_start(av[3], at)
+        elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+            found, w = _before_start(av, at)
+        elif op is sre_constants.BRANCH:
+            results = [_before_start(branch, at) for branch in av[1]]
+            found = next((f for f, _ in results if f is not None), None)
+            w = min(w for _, w in results)
+        elif op in REPEATS:
+            found, w = _before_start(av[2], at)
+            w *= av[0]
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if av[0] < 0:
+                if av[1].getwidth()[1] > at:
+                    found = "a lookbehind"
+            else:
+                found, _ = _before_start(av[1], at)
+        elif op in (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN, sre_constants.CATEGORY):
+            w = 1
+        if found is not None:
+            return found, 0
+        width += w
+    return None, width
+
+
+def _in(items, icase) -> Tuple[Set[str], bool, bool]:
+    chars = set()
+    other = False
+    negate = False
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            negate = True
+        elif op is sre_constants.LITERAL:
+            if av < 128:
+                chars.add(chr(av))
+            else:
+                other = True
+                if icase:
+                    chars |= _ascii_folds(av, av)
+        elif op is sre_constants.RANGE:
+            low, high = av
+            chars |= {chr(c) for c in range(low, min(high, 127) + 1)}
+            other |= high >= 128
+            if icase:
+                chars |= _ascii_folds(low, high)
+        elif op is sre_constants.CATEGORY and av in CATEGORIES:
+            chars |= CATEGORIES[av]
+            other = True
+        else:
+            raise Unknown(op)
+    if negate:
+        return set(ASCII), True, False
+    return _fold(chars, other, icase)
+
+
+GROUP_REFERENCES = {sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS}
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+FLAG_LETTERS = {re.IGNORECASE: "i", re.MULTILINE: "m", re.DOTALL: "s", re.VERBOSE: "x"}
+
+
+def has_group_references(regex: str) -> bool:
+    """Whether `regex` refers to its own groups, with backreferences (`\\1`,
+    `(?P=name)`) or conditionals (`(?(1)...)`), whose numbers change once it
+    is merged into a larger pattern. Also True if it can't be parsed."""
+    try:
+        return _group_references(sre_parse.parse(regex))
+    except re.error:
+        return True
+
+
+def _group_references(items) -> bool:
+    for op, av in items:
+        if op in GROUP_REFERENCES:
+            return True
+        if op is sre_constants.SUBPATTERN:
+            found = _group_references(av[3])
+        elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+            found = _group_references(av)
+        elif op is sre_constants.BRANCH:
+            found = any(_group_references(branch) for branch in av[1])
+        elif op in REPEATS:
+            found = _group_references(av[2])
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            found = _group_references(av[1])
+        else:
+            found = False
+        if found:
+            return True
+    return False
+
+
+def scoped_flags(regex: str, flags: int = 0) -> Optional[str]:
+    """`regex` with its leading inline global flags, and `flags`, turned
+    into a scoped group: `(?i)set` becomes `(?i:set)`, which only applies
+    to it once merged into a larger pattern. Returns None if it has global
+    flags elsewhere, or flags that can't be scoped."""
+    letters = ""
+    for flag, letter in FLAG_LETTERS.items():
+        if flags & flag:
+            letters += letter
+    if flags & ~(re.UNICODE | sum(FLAG_LETTERS)):
+        return None
+    pos = 0
+    m = _GLOBAL_FLAGS.match(regex)
+    while m is not None:
+        letters += m.group(1)
+        pos = m.end()
+        m = _GLOBAL_FLAGS.match(regex, pos)
+    rest = regex[pos:]
+    # look for more of them, outside of escapes and character classes
+    i = 0
+    while i < len(rest):
+        if rest[i] == "\\":
+            i += 2
+        elif rest[i] == "[":
+            i += 2 if rest.startswith("[^", i) else 1
+            if rest.startswith("]", i):
+                i += 1 # a ] right after the [ is part of the class
+            while i < len(rest) and rest[i] != "]":
+                i += 2 if rest[i] == "\\" else 1
+            i += 1
+        elif _GLOBAL_FLAGS.match(rest, i):
+            return None
+        else:
+            i += 1
+    if not letters:
+        return rest
+    if set(letters) - set("imsx"):
+        return None
+    # a comment ends at a newline in verbose mode, not at the )
+    return f"(?{''.join(sorted(set(letters)))}:{rest}{chr(10) if 'x' in letters else ''})"
@@ -1,4 +1,5 @@
 from .test_generator import *
+from .test_lexer import *
 import unittest
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,5 +1,6 @@
 from parsergen.grammar_utils import *
 from parsergen.parsergen import *
+from parsergen.parser_utils import LRU, Window, MemoPolicy, BacktrackError
 import unittest
 
 def construct_parser(grammar: str) -> GeneratedParser:
@@ -122,4 +123,609 @@ class ErrorTest(unittest.TestCase):
         ]))
         self.assertIsNone(t.expr())
         self.assertEqual(t.error_pos, 2)
-        self.assertIsInstance(t.error(), ParseError)
\ No newline at end of file
+        self.assertIsInstance(t.error(), ParseError)
+
+class AsyncParseTest(unittest.TestCase):
+    def test_parse_async(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from parsergen.parser_utils import parse_async
+        with open("parsergen/metagrammar.gram") as f:
+            pgram = f.read()
+        expected = parse_all(GrammarLexer().lex_string(pgram))
+        
+        async def parse(executor):
+            reader = asyncio.StreamReader()
+            reader.feed_data(pgram.encode())
+            reader.feed_eof()
+            ticks = 0
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0)
+            task = asyncio.ensure_future(ticker())
+            tokens = GrammarLexer().lex_async(reader, chunk_size=256)
+            result = await parse_async(GrammarParser, tokens, "parser_definition", executor=executor, yield_every=50)
+            task.cancel()
+            return result, ticks
+        
+        (result, error), ticks = asyncio.run(parse(None))
+        self.assertIsNone(error)
+        self.assertEqual(repr(result), repr(expected))
+        self.assertGreater(ticks, 10) # the loop kept running during the parse
+        
+        with ThreadPoolExecutor(1) as executor:
+            (result, error), _ = asyncio.run(parse(executor))
+        self.assertEqual(repr(result), repr(expected))
+    
+    def test_error(self):
+        import asyncio
+        from parsergen.parser_utils import parse_async
+        p = construct_parser("""
+        expr  : (A B C D) | (A B A D) EOF;
+        """)
+        tokens = [Token(char, "") for char in "A B E D" if char != " "]
+        result, error = asyncio.run(parse_async(p, tokens, "expr", yield_every=1))
+        self.assertIsNone(result)
+        self.assertIsInstance(error, ParseError)
+        
+        failing = construct_parser("""
+        expr  : A { 1 / 0 };
+        """)
+        with self.assertRaises(ZeroDivisionError):
+            asyncio.run(parse_async(failing, [Token("A", "")], "expr"))
+    
+    def test_cancel(self):
+        import asyncio
+        import threading
+        import time
+        from parsergen.parser_utils import parse_async
+        p = construct_parser("""
+        expr  : A* EOF;
+        """)
+        errors = []
+        
+        class Slow(p):
+            def expr(self):
+                time.sleep(0.2) # still parsing when the task is cancelled
+                return super().expr()
+        
+        async def tokens():
+            yield Token("A", "")
+            await asyncio.sleep(60) # never sends the rest
+        
+        async def cancelled():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            task = asyncio.ensure_future(parse_async(Slow, tokens(), "expr", yield_every=1))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        
+        threads = threading.active_count()
+        asyncio.run(parse_async(p, [Token("A", "")] * 3, "expr"))
+        self.assertEqual(threading.active_count(), threads)
+        asyncio.run(cancelled())
+        self.assertEqual(threading.active_count(), threads)
+        self.assertEqual(errors, [])
+
+
+class CommitTest(unittest.TestCase):
+    GRAMMAR = """
+    start   :  s=(section ~)* EOF { len(s) };
+    section :  ID COLON value ';';
+            :  ID COLON value value ';';
+    value   :  ID;
+            :  NUM;
+    """
+    
+    def tokens(self, count):
+        for c in range(count):
+            yield Token("ID", f"k{c}")
+            yield Token("COLON", ":")
+            yield Token("NUM", c)
+            if c % 2:
+                yield Token("ID", "x")
+            yield Token("SEMI", ";")
+    
+    def test_bounded_memory(self):
+        p = construct_parser(self.GRAMMAR)
+        largest = 0
+        
+        class Watched(p):
+            def commit(self):
+                nonlocal largest
+                largest = max(largest, len(self.memos), len(self.token_stream.tokens))
+                return super().commit()
+        
+        stream = LazyTokenStream(self.tokens(2000))
+        parser = Watched(stream)
+        self.assertEqual(parser.start(), 2000)
+        self.assertLess(largest, 20)
+        self.assertEqual(p(TokenStream(list(self.tokens(50)))).start(), 50)
+    
+    def test_error_after_commit(self):
+        p = construct_parser(self.GRAMMAR)
+        tokens = list(self.tokens(10))
+        tokens.insert(42, Token("COLON", ":")) # k9 : : 9 x ;
+        parser = p(LazyTokenStream(tokens))
+        self.assertIsNone(parser.start())
+        self.assertEqual(parser.error_pos, 42)
+        self.assertIsInstance(parser.error(), ParseError)
+    
+    def test_left_recursion(self):
+        # commits inside the growth loop of a left recursive rule are ignored
+        p = construct_parser("""
+        start :  e=expr EOF { e };
+        expr  :  l=expr ADD ~ r=NUM { l + r.value };
+              :  n=NUM { n.value };
+        """)
+        tokens = [Token("NUM", 1), Token("ADD", "+"), Token("NUM", 2), Token("ADD", "+"), Token("NUM", 3)]
+        self.assertEqual(p(LazyTokenStream(tokens)).start(), 6)
+    
+    def test_cut(self):
+        # once a section is committed, start's other alternatives aren't tried
+        grammar = self.GRAMMAR.replace("{ len(s) };", """{ len(s) };
+            :  any* EOF { 'fallback' };
+    any     :  ID;
+            :  COLON;
+            :  NUM;
+            :  SEMI;
+    choice  :  ((ID ~ NUM) | (ID COLON)) { 'choice' };
+    inlined :  (committed | (ID COLON)) { 'inlined' };
+    committed : ID ~ NUM;
+    """)
+        tokens = list(self.tokens(10))
+        tokens.insert(42, Token("COLON", ":")) # k9 : : 9 x ;
+        for straight_line in (False, True):
+            g = Generator(straight_line=straight_line)
+            exec(g.generate(grammar, display=False), globals())
+            p = globals()[g.config["class_name"]]
+            self.assertEqual(p(TokenStream(tokens[:3])).start(), "fallback")
+            for stream in (TokenStream(tokens), LazyTokenStream(tokens)):
+                parser = p(stream)
+                self.assertIsNone(parser.start())
+                self.assertEqual(parser.error_pos, 42)
+            # the same for the choices of a group, whether it is a helper
+            # method or matched inline
+            for rule in ("choice", "inlined"):
+                self.assertEqual(getattr(p(TokenStream([Token("ID", "a"), Token("NUM", 1)])), rule)(), rule)
+                parser = p(TokenStream([Token("ID", "a"), Token("COLON", ":")]))
+                self.assertIsNone(getattr(parser, rule)())
+                self.assertEqual(parser.error_pos, 1)
+    
+    def test_backtrack_error(self):
+        # an optional item that fails behind the commit point can't be undone
+        p = construct_parser("""
+        start   :  s=section? ids=ID* EOF { ids };
+        section :  ID ~ COLON NUM;
+        """)
+        tokens = [Token("ID", "a"), Token("ID", "b")]
+        self.assertEqual(len(p(TokenStream(tokens)).start()), 2)
+        with self.assertRaisesRegex(BacktrackError, "token 0 was released at a commit point at token 1"):
+            p(LazyTokenStream(tokens)).start()
+
+
+class MemoTest(unittest.TestCase):
+    def test_rule_ids(self):
+        p = construct_parser("""
+        start :  a=pair EOF { a };
+              :  b=pair pair EOF { b };
+        pair  :  A B;
+        """)
+        self.assertEqual(p.memo_size, 1) # start is only called by the user
+        t = p(TokenStream([Token(char, "") for char in "ABAB"]))
+        self.assertIsNotNone(t.start())
+        self.assertEqual(sorted(t.memos), [0, 2])
+        self.assertEqual(len(t.memos[0]), 2) # a result and end position per rule
+        self.assertEqual(t.memos[0][1], 2) # pair was only parsed once at 0
+    
+    def test_legacy_decorators(self):
+        # parsers generated by earlier versions memoize with bare decorators
+        class LegacyParser(GeneratedParser):
+            @memoize_left_rec
+            def expr(self):
+                pos = self.mark()
+                left = self.expr()
+                if left is not None and self.expect("ADD") is not None:
+                    right = self.expect("N")
+                    if right is not None:
+                        return left + right.value
+                self.goto(pos)
+                n = self.expect("N")
+                return n.value if n is not None else None
+        
+        tokens = [Token("N", 1), Token("ADD", "+"), Token("N", 2), Token("ADD", "+"), Token("N", 3)]
+        t = LegacyParser(TokenStream(tokens))
+        self.assertEqual(t.expr(), 6)
+        self.assertEqual(t.memos, {})
+
+
+class MemoPolicyTest(unittest.TestCase):
+    GRAMMAR = """
+    start :  e=expr EOF { e };
+    expr  :  l=expr ADD r=term { l + r };
+          :  t=term { t };
+    term  :  LPAREN e=expr RPAREN { e };
+          :  n=NUM { n.value };
+    """
+    
+    def tokens(self, count):
+        tokens = [Token("NUM", 1)]
+        for c in range(count):
+            tokens += [Token("ADD", "+"), Token("LPAREN", "("), Token("NUM", c), Token("RPAREN", ")")]
+        return tokens
+    
+    def test_policies(self):
+        p = construct_parser(self.GRAMMAR)
+        tokens = self.tokens(500)
+        expected = 1 + sum(range(500))
+        
+        t = p(TokenStream(tokens))
+        self.assertEqual(t.start(), expected)
+        self.assertEqual(t.memo_stats.evicted, 0)
+        
+        for policy in (LRU(50), "lru 50", Window(20), "window 20"):
+            t = p(TokenStream(tokens), memo_policy=policy)
+            self.assertEqual(t.start(), expected)
+            stats = t.memo_stats
+            self.assertGreater(stats.evicted, 0)
+            self.assertLessEqual(stats.peak, 60)
+            self.assertLessEqual(len(t.memos), 60)
+        
+        with self.assertRaises(TypeError): # policies must provide a table
+            MemoPolicy()
+    
+    def test_grammar_config(self):
+        p = construct_parser("@memo_policy = 'window 8'\n" + self.GRAMMAR)
+        self.assertEqual(p.memo_policy, "window 8")
+        t = p(TokenStream(self.tokens(100)))
+        self.assertEqual(t.start(), 1 + sum(range(100)))
+        self.assertIsInstance(t.memos, dict)
+        self.assertGreater(t.memo_stats.evicted, 0)
+        
+        with self.assertRaises(ValueError):
+            construct_parser("@memo_policy = 'lru many'\n" + self.GRAMMAR)
+
+
+
+class SelectiveMemoTest(unittest.TestCase):
+    def memoized(self, grammar):
+        g = Generator()
+        rules = g.process_sections(parse_all(GrammarLexer().lex_string(grammar)))
+        return g.memoized_rules(rules, *g.left_recursion(rules))
+    
+    def test_selective(self):
+        self.assertEqual(self.memoized("""
+        start  :  a=first EOF { a };
+        first  :  A s=second* { s };
+        second :  B third;
+               :  B fourth;
+        third  :  C;
+        fourth :  C?;
+        """), {"second"})
+        self.assertEqual(self.memoized("""
+        start  :  A? b=inner { b };
+        inner  :  B;
+        """), {"inner"}) # tried at different offsets from the start of start
+        self.assertEqual(self.memoized("""
+        expr   :  l=expr ADD r=term;
+               :  t=term;
+        term   :  N;
+        """), {"expr", "term"})
+    
+    def test_annotations(self):
+        grammar = """
+        start  :  A? b=inner { b };
+        @nomemo
+        inner  :  B c=innermost { c };
+        innermost  :  c=C { c };
+        @memo
+        other  :  D;
+        """
+        self.assertEqual(self.memoized(grammar), {"innermost", "other"})
+        p = construct_parser(grammar)
+        t = p(TokenStream([Token("A", ""), Token("B", ""), Token("C", "c")]))
+        self.assertEqual(t.start().value, "c")
+        
+        with self.assertRaises(ValueError):
+            self.memoized("@nomemo\nexpr : expr A; : A;")
+        with self.assertRaises(ValueError):
+            self.memoized("@fast\nexpr : A;")
+
+
+class InlineTokenTest(unittest.TestCase):
+    class WordLexer(Lexer):
+        @token(r"[0-9]+")
+        def NUM(self, t):
+            t.value = int(t.value)
+            return t
+        
+        WORD = r"[a-z]+"
+        ignore = " "
+    
+    def test_streams(self):
+        p = construct_parser("""
+        start :  items=item* EOF { items };
+        item  :  'let' w=WORD n=NUM { (w.value, n.value) };
+              :  w=WORD { w.value };
+        """)
+        # the generated code compares the ids the lexer stores
+        self.assertEqual(self.WordLexer._type_ids["WORD"], token_type_id("WORD"))
+        source = "let x 1 y let z 22 let"
+        expected = [("x", 1), "y", ("z", 22), "let"]
+        for stream in (
+            TokenStream(self.WordLexer().lex_string(source)),
+            TokenStream(list(self.WordLexer().lex_string(source).tokens)),
+            LazyTokenStream(self.WordLexer().lex_iter([source])),
+        ):
+            self.assertEqual(p(stream).start(), expected)
+        
+        t = p(TokenStream(self.WordLexer().lex_string("x let 1 2")))
+        self.assertIsNone(t.start())
+        self.assertEqual(t.error_pos, 2)
+    
+    def test_constants(self):
+        # constants are compared with the source text, or with the value
+        # of tokens a modifier changed
+        class QuoteLexer(Lexer):
+            @token(r"'[a-z]+'")
+            def QUOTED(self, t):
+                t.value = t.value[1:-1]
+                return t
+            
+            WORD = r"[a-z]+"
+            ignore = " "
+        
+        p = construct_parser("""
+        start :  items=item* EOF { items };
+        item  :  'let' { 'let' };
+              :  t=QUOTED { t.value };
+              :  w=WORD { w.value };
+        """)
+        source = "let 'let' lets 'le' le"
+        for stream in (
+            TokenStream(QuoteLexer().lex_string(source)),
+            TokenStream(list(QuoteLexer().lex_string(source).tokens)),
+        ):
+            self.assertEqual(p(stream).start(), ["let", "let", "lets", "le", "le"])
+
+
+class DispatchTest(unittest.TestCase):
+    GRAMMAR = """
+    start :  items=item* EOF { items };
+    item  :  n=NUM { n.value };
+          :  w=WORD '=' v=value { (w.value, v) };
+          :  w=WORD { w.value };
+          :  x=maybe_num { x };
+    value :  n=NUM { n.value };
+          :  !NUM w=WORD { w.value };
+    maybe_num :  NUM? '!' { 'bang' };
+    """
+    
+    def test_first_sets(self):
+        g = Generator()
+        rules = g.process_sections(parse_all(GrammarLexer().lex_string(self.GRAMMAR)))
+        firsts, nullable = g.first_sets(rules)
+        self.assertEqual(firsts["item"], None) # through the constant string '!'
+        self.assertEqual(firsts["value"], None) # through the predicate
+        self.assertEqual(firsts["start"], None)
+        self.assertFalse(nullable["item"])
+        guards = g.alternative_guards(rules)
+        self.assertEqual(guards["item"], ["_next == NUM", "_next == WORD", "_next == WORD", None])
+        self.assertEqual(guards["value"], ["_next == NUM", None])
+        
+        rules = g.process_sections(parse_all(GrammarLexer().lex_string("""
+        a :  b* c { 0 };
+        b :  X { 0 };
+          :  { 0 };
+        c :  Y { 0 };
+          :  Z { 0 };
+        """)))
+        firsts, nullable = g.first_sets(rules)
+        self.assertEqual(firsts, {"a": {"X", "Y", "Z"}, "b": {"X"}, "c": {"Y", "Z"}})
+        self.assertEqual(nullable, {"a": False, "b": True, "c": False})
+    
+    def test_same_results(self):
+        class Lexer_(Lexer):
+            NUM  = r"[0-9]+"
+            WORD = r"[a-z]+"
+            EQ   = r"="
+            BANG = r"!"
+            ignore = " "
+        
+        class NoDispatch(Generator):
+            def alternative_guards(self, grammar):
+                return {name: [None] * len(stmts) for name, stmts in grammar.items()}
+        
+        p = construct_parser(self.GRAMMAR)
+        self.assertIn("_next == WORD", Generator().generate(self.GRAMMAR, display=False))
+        g = NoDispatch()
+        exec(g.generate(self.GRAMMAR, display=False), globals())
+        unguarded = globals()[g.config["class_name"]]
+        
+        for source in ("1 a = 2 b = c d 3 !", "1 a = = 2", "a b =", "4 ! = 1", "a = 1 1 !"):
+            for stream in (
+                lambda: TokenStream(Lexer_().lex_string(source)),
+                lambda: LazyTokenStream(Lexer_().lex_iter([source])),
+            ):
+                t, u = p(stream()), unguarded(stream())
+                self.assertEqual(t.start(), u.start(), source)
+                self.assertEqual(t.error_pos, u.error_pos, source)
+
+
+class StraightLineTest(unittest.TestCase):
+    def construct(self, grammar: str, **options):
+        g = Generator(straight_line=True, **options)
+        rules = g.process_sections(parse_all(GrammarLexer().lex_string(grammar)))
+        g.config["header"] = ""
+        code = g.generate_parser_class(rules)
+        self.assertNotIn("range(1)", code)
+        self.assertNotIn("parts", code)
+        exec(code, globals())
+        return globals()[g.config["class_name"]]
+    
+    def test_metagrammar(self):
+        with open("parsergen/metagrammar.gram") as f:
+            pgram = f.read()
+        p = self.construct(pgram, docstrings=False)
+        default = load_metagram()
+        l = GrammarLexer()
+        self.assertEqual(repr(p(TokenStream(l.lex_string(pgram))).parser_definition()), repr(parse_all(l.lex_string(pgram))))
+        
+        t, u = p(TokenStream(l.lex_string("a : B C { 1 };\nb : | ;\n"))), default(TokenStream(l.lex_string("a : B C { 1 };\nb : | ;\n")))
+        self.assertIsNone(t.parser_definition())
+        u.parser_definition()
+        self.assertEqual(t.error_pos, u.error_pos)
+    
+    def test_items(self):
+        grammar = """
+        start :  pos=A _b=B? (C | D) !E ~ n=node { (pos.type, _b, n) };
+              :  A E { 'e' };
+        node  :  (C D)* E;
+        """
+        tokens = lambda s: TokenStream([Token(char, "") for char in s])
+        p = self.construct(grammar)
+        t = p(tokens("AC"))
+        self.assertIsNone(t.start())
+        self.assertEqual(t.error_pos, 2)
+        self.assertEqual(p(tokens("AE")).start(), "e")
+        self.assertEqual(
+            p(tokens("ABDCDE")).start(),
+            ("A", Token("B", ""), Node("node", [[[Token("C", ""), Token("D", "")]], Token("E", "")])),
+        )
+        r = p(tokens("ADCDE")).start()
+        self.assertIsInstance(r[1], Filler)
+        
+        # the same as the default mode
+        default = construct_parser(grammar)
+        for source in ("AC", "AE", "ABDCDE", "ADCDE", "ADE", "ABCDCE", ""):
+            t, u = p(tokens(source)), default(tokens(source))
+            self.assertEqual(repr(t.start()), repr(u.start()), source)
+            self.assertEqual(t.error_pos, u.error_pos, source)
+    
+    def test_long_alternative(self):
+        # the items of an alternative don't nest, which would go past
+        # Python's indentation limit
+        items = " ".join("A" * 120)
+        p = self.construct(f"start :  {items} B;\n      :  {items} {{ 'a' }};\n")
+        tokens = lambda s: TokenStream([Token(char, "") for char in s])
+        self.assertEqual(p(tokens("A" * 120)).start(), "a")
+        self.assertIsInstance(p(tokens("A" * 120 + "B")).start(), Node)
+        t = p(tokens("A" * 60))
+        self.assertIsNone(t.start())
+        self.assertEqual(t.error_pos, 60)
+
+
+class InlineHelperTest(unittest.TestCase):
+    GRAMMAR = """
+    start :  items=item* EOF { items };
+    item  :  a=A b=(B | C D)? cs=C+ { (a, b, cs) };
+          :  ds=(D (A | B)*)+ { ds };
+          :  big=(A B C D A B C D) { big };
+          :  E !A { 'e' };
+          :  (A ~ B) { 'commit' };
+    """
+    
+    def construct(self, **options):
+        g = Generator(**options)
+        code = g.generate(self.GRAMMAR, display=False)
+        exec(code, globals())
+        return code, globals()[g.config["class_name"]]
+    
+    def test_helpers(self):
+        code, _ = self.construct()
+        self.assertEqual(code.count("def _or_"), 0)
+        self.assertEqual(code.count("def _maybe_"), 0)
+        self.assertEqual(code.count("def _loop_"), 1) # ds, of 8 nodes
+        # the group in ds, big, and the one with a commit point
+        self.assertEqual(code.count("def _expr_list_"), 3)
+        code, _ = self.construct(inline_size=0)
+        self.assertEqual(code.count("def _or_"), 2)
+    
+    def test_helper_docstrings(self):
+        # the locals loaded for token matching come after the docstring
+        for straight_line in (False, True):
+            _, p = self.construct(inline_size=0, straight_line=straight_line, docstrings=True)
+            helpers = [getattr(p, name) for name in dir(p) if name.startswith(("_or_", "_maybe_", "_loop_", "_expr_list_"))]
+            self.assertEqual(len(helpers), 12)
+            for helper in helpers:
+                self.assertTrue(helper.__doc__, helper.__name__)
+            self.assertEqual(p._maybe_1.__doc__.strip(), "(B | C D)?")
+        _, p = self.construct(inline_size=0, docstrings=False)
+        self.assertIsNone(p._maybe_1.__doc__)
+    
+    def test_same_results(self):
+        tokens = lambda s: TokenStream([Token(char, "") for char in s])
+        parsers = [self.construct(**options)[1] for options in (
+            {"inline_size": 0}, {}, {"inline_size": 100}, {"straight_line": True}, {"straight_line": True, "inline_size": 100},
+        )]
+        for source in ("ABCC", "ACDC", "AC", "DAB", "DDBA", "ABCDABCD", "ABCDABC", "E", "EA", "AB", "ABD", "DC", "A"):
+            results = []
+            for p in parsers:
+                t = p(tokens(source))
+                results.append((repr(t.start()), t.error_pos))
+            self.assertEqual(results, [results[0]] * len(parsers), source)
+
+
+class LeftRecursionTest(unittest.TestCase):
+    def analyse(self, grammar):
+        g = Generator()
+        return g.left_recursion(g.process_sections(parse_all(GrammarLexer().lex_string(grammar))))
+    
+    def test_leftmost_calls(self):
+        # factor calls itself, but only after consuming an item
+        with open("examples/calc.gram") as f:
+            self.assertEqual(self.analyse(f.read()), ({"expr", "term"}, {"expr", "term"}))
+        with open("parsergen/metagrammar.gram") as f:
+            self.assertEqual(self.analyse(f.read()), (set(), set()))
+        # through optional items, nullable rules and predicates
+        self.assertEqual(self.analyse("""
+        a :  O? a P;
+          :  N;
+        b :  e c;
+          :  N;
+        c :  b P;
+        e :  O*;
+        d :  &d N;
+        f :  N f;
+          :  N;
+        """), ({"a", "b", "c", "d"}, {"a", "b", "d"}))
+    
+    def test_leaders(self):
+        grammar = """
+        a :  l=b X { ('a', l) };
+          :  Y { 'y' };
+        b :  l=a Z { ('b', l) };
+          :  W { 'w' };
+        """
+        self.assertEqual(self.analyse(grammar), ({"a", "b"}, {"a"}))
+        self.assertEqual(self.analyse("""
+        a :  b X;
+          :  c Y;
+          :  N;
+        b :  a Z;
+          :  c Z;
+        c :  b W;
+          :  N;
+        """)[1], {"a", "b"})
+        
+        p = construct_parser(grammar)
+        tokens = lambda s: TokenStream([Token(char, "") for char in s])
+        self.assertEqual(p(tokens("YZXZX")).a(), ("a", ("b", ("a", ("b", "y")))))
+        self.assertEqual(p(tokens("WXZ")).a(), ("a", "w"))
+        self.assertEqual(p(tokens("WXZ")).b(), ("b", ("a", "w")))
+        
+        with self.assertRaises(ValueError):
+            construct_parser(grammar.replace("b :", "@memo\nb :"))
+    
+    def test_large(self):
+        # a cycle through every rule, and as long a chain of callers
+        n = 3000
+        grammar = "".join(f"r{i} :  r{i + 1} A;\n" for i in range(n))
+        grammar += f"r{n} :  r0 B;\n   :  C;\n"
+        grammar += "".join(f"s{i} :  s{i + 1};\n" for i in range(n)) + f"s{n} :  C;\n"
+        left_recursive, leaders = self.analyse(grammar)
+        self.assertEqual(left_recursive, {f"r{i}" for i in range(n + 1)})
+        self.assertEqual(leaders, {"r0"})
@@ -0,0 +1,570 @@
+from parsergen.lexer import *
+from parsergen.regex_utils import first_chars, scoped_flags
+import unittest
+
+
+class CalcLexer(Lexer):
+    @token(r"0x[0-9a-fA-F]+", r"[0-9]+")
+    def INT(self, t):
+        if t.value.startswith("0x"):
+            t.value = int(t.value[2:], base=16)
+        else:
+            t.value = int(t.value)
+        return t
+
+    ADD    =  r"\+"
+    POW    =  r"\*\*"
+    MUL    =  r"\*"
+    SET    =  r"set"
+    ID     =  r"[A-Za-z_]+"
+
+    ignore = " \t\r\n"
+    ignore_comment = r"\#.*"
+
+
+class MasterRegexTest(unittest.TestCase):
+    def test_declaration_order(self):
+        tokens = CalcLexer().lex_string("set x ** 0x1f * 2 # comment").tokens
+        self.assertEqual(
+            [(t.type, t.value) for t in tokens],
+            [("SET", "set"), ("ID", "x"), ("POW", "**"), ("INT", 31), ("MUL", "*"), ("INT", 2)]
+        )
+    
+    def test_backreference_fallback(self):
+        class QuoteLexer(Lexer):
+            STRING = r"(['\"]).*?\1"
+            ID     = r"[a-z]+"
+            ignore = " "
+        
+        self.assertIsNone(QuoteLexer._table.master)
+        tokens = QuoteLexer().lex_string("a 'b' \"c\"").tokens
+        self.assertEqual([t.value for t in tokens], ["a", "'b'", '"c"'])
+    
+    def test_conditional_fallback(self):
+        # (?(1)...) refers to its group by number, so TAG isn't merged; the
+        # rules before it still are
+        class TagLexer(Lexer):
+            ID  = r"[b-z]+"
+            TAG = r"(<)?a(?(1)>)"
+            GT  = r">"
+            LT  = r"<"
+            ignore = " "
+        
+        self.assertEqual(TagLexer._table.master.pattern, "([b-z]+)")
+        tokens = TagLexer().lex_string("<a> a b <").tokens
+        self.assertEqual([(t.type, t.value) for t in tokens], [("TAG", "<a>"), ("TAG", "a"), ("ID", "b"), ("LT", "<")])
+    
+    def test_scoped_flags(self):
+        # the flags of a merged rule don't apply to the others
+        class FlagLexer(Lexer):
+            SET = r"(?i)set"
+            ID  = r"[a-z]+"
+            ignore = " "
+        
+        self.assertEqual(FlagLexer._table.master.pattern, "((?i:set))|([a-z]+)")
+        self.assertEqual([t.type for t in FlagLexer().lex_string("SeT x").tokens], ["SET", "ID"])
+        with self.assertRaises(LexError):
+            FlagLexer().lex_string("X")
+        
+        self.assertEqual(scoped_flags("(?i)(?m)a"), "(?im:a)")
+        self.assertEqual(scoped_flags("(?x)a # b"), "(?x:a # b\n)")
+        self.assertEqual(scoped_flags("[(?i)]x"), "[(?i)]x")
+        self.assertIsNone(scoped_flags("a(?i)b"))
+        self.assertIsNone(scoped_flags("(?a)b"))
+    
+    def test_error(self):
+        with self.assertRaises(LexError):
+            CalcLexer().lex_string("1 + $")
+
+
+class FirstCharTest(unittest.TestCase):
+    def test_first_chars(self):
+        self.assertEqual(first_chars(r"[0-9]+").chars, frozenset("0123456789"))
+        self.assertFalse(first_chars(r"[0-9]+").other)
+        self.assertEqual(first_chars(r"a?b|c").chars, frozenset("abc"))
+        self.assertIsNone(first_chars(r"a*"))
+        self.assertIsNone(first_chars(r"(a?)\1b"))
+        
+        folded = first_chars(r"(?i)set")
+        self.assertEqual(folded.chars, frozenset("sS"))
+        self.assertTrue(folded.other)
+    
+    def test_non_ascii_folds(self):
+        # non-ASCII characters that match ASCII ones under IGNORECASE
+        self.assertEqual(first_chars("(?i)\u212a").chars, frozenset("kK"))
+        self.assertEqual(first_chars("(?i)[\u0100-\u0180]").chars, frozenset("iIsS"))
+        self.assertEqual(first_chars("\u212a").chars, frozenset())
+        
+        class FoldLexer(Lexer):
+            KELVIN = "(?i)\u212a"
+            LONG_ST = "(?i)\u017ft"
+            ignore = " "
+        
+        tokens = FoldLexer().lex_string("k st K \u212a").tokens
+        self.assertEqual([t.type for t in tokens], ["KELVIN", "LONG_ST", "KELVIN", "KELVIN"])
+    
+    def test_dispatch(self):
+        table = CalcLexer._table
+        names = [name for name, _, _ in table.dispatch["*"][2]]
+        self.assertEqual(names, ["POW", "MUL"])
+        self.assertEqual([name for name, _, _ in table.dispatch["s"][2]], ["SET", "ID"])
+        self.assertEqual(table.dispatch["$"][2], [])
+        
+        tokens = CalcLexer().lex_bytes(b"set x ** y").tokens
+        self.assertEqual([t.type for t in tokens], ["SET", "ID", "POW", "ID"])
+
+
+class IgnoreTest(unittest.TestCase):
+    def test_special_characters(self):
+        class PunctuationLexer(Lexer):
+            ID = r"[a-z]+"
+            ignore = " ]^-\\"
+            ignore_comment = r"\#.*"
+        
+        source = "a]^b \\-c # d\n"
+        with self.assertRaises(LexError):
+            PunctuationLexer().lex_string(source)
+        tokens = PunctuationLexer().lex_string(source[:-1]).tokens
+        self.assertEqual([t.value for t in tokens], ["a", "b", "c"])
+        self.assertEqual([t.value for t in PunctuationLexer().lex_iter([source[:-1]])], ["a", "b", "c"])
+        self.assertEqual([t.text for t in PunctuationLexer().lex_bytes(source[:-1].encode()).tokens], ["a", "b", "c"])
+
+    
+    def test_start_anchors(self):
+        # a rule is tried at every token start, where a leading anchor holds
+        class AnchorLexer(Lexer):
+            ID   = r"[a-z]+"
+            HASH = r"^#"
+            END  = r"(?m)\A;"
+            ignore = " "
+        
+        for result in (AnchorLexer().lex_string("a #;"), AnchorLexer().lex_bytes(b"a #;")):
+            self.assertEqual([t.type for t in result.tokens], ["ID", "HASH", "END"])
+        self.assertEqual([t.type for t in AnchorLexer().lex_iter(["a ", "#"])], ["ID", "HASH"])
+        
+        with self.assertRaisesRegex(ValueError, "HASH"):
+            class BadAnchorLexer(Lexer):
+                HASH = r"#?^!"
+                ignore = " "
+    
+    def test_start_assertions(self):
+        # \b and lookbehinds at the start of a rule only saw the token
+        class AssertionLexer(Lexer):
+            NUM  = r"[0-9]+"
+            FOO  = r"\bfoo"
+            DOT  = r"\B\."
+            X    = r"x"
+            LB   = r"(?<=x)y"
+            NLB  = r"(?<!z)w"
+            ID   = r"[a-z]+"
+            ignore = " "
+        
+        expected = [("NUM", "123"), ("FOO", "foo"), ("X", "x"), ("ID", "y"), ("X", "x"), ("NLB", "w"), ("ID", "a"), ("DOT", ".")]
+        for result in (AssertionLexer().lex_string("123foo xy xw a."), AssertionLexer().lex_bytes(b"123foo xy xw a.")):
+            self.assertEqual([(t.type, t.text if isinstance(t.value, bytes) else t.value) for t in result.tokens], expected)
+        
+        for regex in (r"a?\bfoo", r"(x|\B)y", r"a(?<=ba)"):
+            with self.assertRaisesRegex(ValueError, "WORD.*before the token start"):
+                class BadLexer(Lexer):
+                    WORD = regex
+                    ignore = " "
+
+
+class CursorTest(unittest.TestCase):
+    def test_modifier_cursor(self):
+        class BlockLexer(Lexer):
+            @token(r"/\*")
+            def COMMENT(self, t):
+                while not self.at_end() and self.peek(2) != "*/":
+                    self.advance(1)
+                self.advance(2)
+                t.value = "comment"
+                return t
+            
+            @token(r"!")
+            def BANG(self, t):
+                # older modifiers rewrite the unconsumed input
+                self.source = "x" + self.source
+                return t
+            
+            ID = r"[a-z]+"
+            ignore = " "
+        
+        tokens = BlockLexer().lex_string("a /* b */ c!").tokens
+        self.assertEqual(
+            [(t.type, t.value) for t in tokens],
+            [("ID", "a"), ("COMMENT", "comment"), ("ID", "c"), ("BANG", "!"), ("ID", "x")]
+        )
+
+
+class StreamingTest(unittest.TestCase):
+    def test_lex_iter(self):
+        from parsergen.grammar_utils import GrammarLexer
+        with open("parsergen/metagrammar.gram") as f:
+            grammar = f.read()
+        
+        expected = GrammarLexer().lex_string(grammar).tokens
+        chunks = (grammar[i:i + 7] for i in range(0, len(grammar), 7))
+        self.assertEqual(list(GrammarLexer().lex_iter(chunks, lookahead=16)), expected)
+    
+    def test_lazy_token_stream(self):
+        source = "set x ** 2 " * 3 + "# comment"
+        stream = LazyTokenStream(CalcLexer().lex_iter([source[:5], source[5:]]))
+        self.assertEqual(stream.peek_token().type, "SET")
+        self.assertEqual(len(stream.tokens), 1)
+        
+        stream.goto(4)
+        stream.release(4)
+        self.assertEqual(stream.get_token().type, "SET")
+        with self.assertRaises(IndexError):
+            stream.fetch(0)
+        
+        stream.goto(100)
+        self.assertEqual(stream.peek_token().type, "EOF")
+        self.assertEqual(stream.offset + len(stream.tokens), 12)
+
+
+class BytesModeTest(unittest.TestCase):
+    class WordLexer(Lexer):
+        @token(r"[0-9]+")
+        def INT(self, t):
+            t.value = int(t.value)
+            return t
+        
+        WORD = r"[a-zé]+"
+        ignore = " \n"
+        ignore_comment = r"\#.*"
+    
+    def test_lex_mmap(self):
+        import os, tempfile
+        source = "café 12 # note\nword 3\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "input.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(source)
+            result = self.WordLexer().lex_mmap(path)
+            
+            tokens = result.tokens
+            self.assertEqual([t.type for t in tokens], ["WORD", "INT", "WORD", "INT"])
+            self.assertEqual(tokens[2].span, (len("café 12 # note\n".encode()), len("café 12 # note\nword".encode())))
+            self.assertEqual(tokens[1].value, 12)
+            self.assertEqual(tokens[0].value, "café".encode())
+            self.assertEqual([t.text for t in tokens], [t.value for t in self.WordLexer().lex_string(source).tokens])
+            result.source.close()
+
+
+class TokenBufferTest(unittest.TestCase):
+    def test_views(self):
+        tokens = CalcLexer().lex_string("x * 12\tset").tokens
+        self.assertIsInstance(tokens, TokenBuffer)
+        self.assertEqual(len(tokens), 4)
+        self.assertEqual(list(tokens.objects), [2]) # only the modified INT token
+        self.assertEqual(tokens.type_of(1), "MUL")
+        self.assertEqual(tokens[-1], Token("SET", "set", Pos(1, 7), Pos(1, 10)))
+        self.assertEqual(tokens[1:3], [Token("MUL", "*", Pos(1, 2), Pos(1, 3)), Token("INT", 12, Pos(1, 4), Pos(1, 6))])
+    
+    def test_token_stream(self):
+        stream = TokenStream(CalcLexer().lex_string("x 1"))
+        self.assertEqual(stream.peek_type(), "ID")
+        self.assertEqual(stream.get_token().value, "x")
+        self.assertEqual(stream.get_token().value, 1)
+        self.assertEqual(stream.peek_type(), "EOF")
+        self.assertEqual(stream.peek_token().start, Pos(1, 4))
+
+
+class TokenPositionTest(unittest.TestCase):
+    def test_lazy_positions(self):
+        class LineLexer(Lexer):
+            ID = r"[a-z]+"
+            ignore = " \n"
+        
+        tokens = LineLexer().lex_string("ab cd\n  ef\nab").tokens
+        self.assertIsNone(tokens.line_index.starts) # not needed yet
+        self.assertEqual([(t.start, t.end) for t in tokens], [
+            (Pos(1, 0), Pos(1, 2)), (Pos(1, 3), Pos(1, 5)), (Pos(2, 2), Pos(2, 4)), (Pos(3, 0), Pos(3, 2))
+        ])
+        self.assertEqual(tokens[3].start_offset, 11)
+        self.assertIs(tokens[0].value, tokens[3].value) # interned
+        
+        tok = tokens[2]
+        tok.end = Pos(5, 5)
+        self.assertEqual((tok.start, tok.end), (Pos(2, 2), Pos(5, 5)))
+    
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            Token("A", "a").extra = 1
+
+
+class LineTextTest(unittest.TestCase):
+    def test_line_text(self):
+        result = CalcLexer().lex_string("x\t1\r\nset y\n")
+        self.assertIsNone(result.lines)
+        self.assertEqual(result.line_text(1), "x\t1")
+        self.assertEqual(result.line_text(2), "set y")
+        self.assertEqual(result.line_text(3), "")
+        self.assertEqual(result.line_text(4), "")
+        self.assertEqual(TokenStream(result).line_text(2), "set y")
+    
+    def test_lex_error(self):
+        with self.assertRaises(LexError) as cm:
+            CalcLexer().lex_string("1\n2 + $ + 3\n")
+        self.assertEqual((cm.exception.lineno, cm.exception.column), (2, 4))
+        self.assertEqual(cm.exception.lineText, "2 + $ + 3")
+    
+    def test_rewritten_source(self):
+        class RewriteLexer(Lexer):
+            @token(r"!")
+            def BANG(self, t):
+                self.source = "x" if isinstance(self.text, str) else b"x"
+                return t
+            
+            ID = r"[a-z]+"
+            ignore = " "
+        
+        for result in (RewriteLexer().lex_string("a! \nb"), RewriteLexer().lex_bytes(b"a! \nb")):
+            self.assertEqual([t.type for t in result.tokens], ["ID", "BANG", "ID"])
+            self.assertEqual(result.line_text(1), "a!x")
+            self.assertEqual(result.tokens[2].start, Pos(1, 2))
+
+
+class LexerGeneratorTest(unittest.TestCase):
+    def generated(self, lexer):
+        from parsergen.lexer_generator import LexerGenerator
+        namespace = {}
+        exec(compile(LexerGenerator().generate(lexer), "<generated>", "exec"), namespace)
+        return namespace
+    
+    def test_same_tokens(self):
+        module = self.generated(CalcLexer)
+        self.assertEqual(module["TOKEN_TYPES"], CalcLexer.tokens)
+        self.assertEqual(module["POW"], CalcLexer._type_ids["POW"])
+        
+        source = "set x ** 0x1f * 2 # comment\ny+1"
+        self.assertEqual(module["CalcLexer"]().lex_string(source).tokens, CalcLexer().lex_string(source).tokens)
+        with self.assertRaises(LexError):
+            module["CalcLexer"]().lex_string("1 + $")
+    
+    def test_copied_methods(self):
+        from parsergen.grammar_utils import GrammarLexer
+        GeneratedLexer = self.generated(GrammarLexer)["GrammarLexer"]
+        source = "start : e=expr 'a\\'b' { e };\n"
+        self.assertEqual(GeneratedLexer().lex_string(source).tokens, GrammarLexer().lex_string(source).tokens)
+
+
+class ParallelLexer(Lexer):
+    STRING = r'"[^"]*"'
+    
+    @token(r"[0-9]+")
+    def INT(self, t):
+        t.value = int(t.value)
+        return t
+    
+    ID     = r"[A-Za-z_]+"
+    ADD    = r"\+"
+    
+    ignore = " \t\n"
+
+
+class ParallelTest(unittest.TestCase):
+    def test_same_as_lex_string(self):
+        # strings spanning lines make some of the splits fall inside tokens
+        source = "".join(
+            f'x{c} + {c}\n' if c % 7 else f'"multi\nline {c}" + y\n'
+            for c in range(200)
+        )
+        lexer = ParallelLexer()
+        expected = lexer.lex_string(source)
+        for workers in (2, 5, 16):
+            result = lexer.lex_parallel(source, workers=workers)
+            self.assertEqual(result.tokens, expected.tokens)
+            self.assertEqual([t.start for t in result.tokens], [t.start for t in expected.tokens])
+            self.assertEqual(result.line_text(8), expected.line_text(8))
+    
+    def test_error(self):
+        source = "a + 1\n" * 50 + "b $\n" + "c\n" * 50
+        with self.assertRaises(LexError) as cm:
+            ParallelLexer().lex_parallel(source, workers=4)
+        self.assertEqual((cm.exception.lineno, cm.exception.column), (51, 2))
+
+
+class RelexTest(unittest.TestCase):
+    def check(self, source, start, end, text):
+        lexer = ParallelLexer()
+        previous = lexer.lex_string(source)
+        previous.line_text(1) # build the line index, so it is reused
+        result = lexer.relex(previous, start, end, text)
+        expected = lexer.lex_string(source[:start] + text + source[end:])
+        self.assertEqual(result.tokens, expected.tokens)
+        self.assertEqual([t.start for t in result.tokens], [t.start for t in expected.tokens])
+        self.assertEqual(result.line_text(3), expected.line_text(3))
+        return result
+    
+    def test_edits(self):
+        source = 'a + 12\nb + "x\ny" + 3\nc + d\n'
+        self.check(source, 0, 0, "z")
+        self.check(source, 1, 1, "bc") # extends a token
+        self.check(source, 4, 6, "345 + e")
+        self.check(source, 11, 11, '"z" + ')
+        self.check(source, 7, 7, "\n\n")
+        self.check(source, 0, len(source), "")
+        self.check(source, len(source), len(source), "x + 1")
+    
+    def test_random_edits(self):
+        import random
+        rng = random.Random(0)
+        source = "".join(f'x{c} + {c}\n' if c % 7 else f'"s\n{c}" + y\n' for c in range(60))
+        pieces = ["", "a", "1", " ", "\n", "+", '"', "q + 4\n"]
+        for _ in range(200):
+            start = rng.randrange(len(source) + 1)
+            end = min(start + rng.randrange(5), len(source))
+            text = rng.choice(pieces)
+            try:
+                ParallelLexer().lex_string(source[:start] + text + source[end:])
+            except LexError:
+                continue
+            self.check(source, start, end, text)
+    
+    def test_chained_edits(self):
+        # each result shares the tokens and lines of the one before it
+        import random
+        rng = random.Random(1)
+        lexer = ParallelLexer()
+        source = "".join(f'x{c} + {c}\n' if c % 7 else f'"s\n{c}" + y\n' for c in range(60))
+        result = lexer.lex_string(source)
+        result.line_text(1)
+        pieces = ["", "a", "1", " ", "\n", "+", "q + 4\n"]
+        for _ in range(300):
+            start = rng.randrange(len(source) + 1)
+            end = min(start + rng.randrange(3), len(source))
+            text = rng.choice(pieces)
+            try:
+                ParallelLexer().lex_string(source[:start] + text + source[end:])
+            except LexError:
+                continue
+            result = lexer.relex(result, start, end, text)
+            source = source[:start] + text + source[end:]
+        expected = lexer.lex_string(source)
+        self.assertEqual(result.tokens, expected.tokens)
+        self.assertEqual([t.end for t in result.tokens], [t.end for t in expected.tokens])
+        self.assertEqual(result.line_text(5), expected.line_text(5))
+        self.assertEqual(result.tokens.types, expected.tokens.types)
+        self.assertEqual(result.tokens.starts, expected.tokens.starts)
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_stats(self):
+        lexer = CalcLexer(instrument=True)
+        source = "set x ** 0x1f * 2 # comment\nsettle"
+        self.assertEqual(lexer.lex_string(source).tokens, CalcLexer().lex_string(source).tokens)
+        
+        stats = lexer.stats.as_dict()
+        self.assertEqual(stats["INT"]["successes"], 2)
+        self.assertEqual(stats["SET"]["attempts"], 2) # only tried on "s"
+        self.assertEqual(stats["SET"]["successes"], 2)
+        self.assertEqual(stats["ID"]["attempts"], 2)
+        self.assertEqual(stats["ignore_comment"]["successes"], 1)
+        self.assertGreater(stats["INT"]["modifier_time"], 0)
+        self.assertNotIn("ADD", stats)
+        self.assertIn("ignore_comment", lexer.stats.table())
+    
+    def test_streaming(self):
+        # lex_iter and lex_async go through the same timed rules
+        import asyncio
+        source = "set x ** 0x1f * 2 # comment\nsettle"
+        lexer = CalcLexer(instrument=True)
+        lexer.lex_string(source)
+        expected = lexer.stats.as_dict()
+        
+        lexer = CalcLexer(instrument=True)
+        self.assertEqual(list(lexer.lex_iter([source[:9], source[9:]])), list(CalcLexer().lex_string(source).tokens))
+        self.assertEqual(lexer.stats.as_dict().keys(), expected.keys())
+        for name, stats in lexer.stats.as_dict().items():
+            self.assertEqual((stats["attempts"], stats["successes"]), (expected[name]["attempts"], expected[name]["successes"]), name)
+        self.assertGreater(lexer.stats.as_dict()["INT"]["modifier_time"], 0)
+        
+        async def lex():
+            reader = asyncio.StreamReader()
+            reader.feed_data(source.encode())
+            reader.feed_eof()
+            return [tok async for tok in lexer.lex_async(reader)]
+        
+        lexer = CalcLexer(instrument=True)
+        asyncio.run(lex())
+        self.assertEqual(lexer.stats.as_dict()["SET"]["successes"], 2)
+        self.assertEqual(lexer.stats.as_dict()["ignore_comment"]["successes"], 1)
+    
+    def test_disabled(self):
+        self.assertIsNone(CalcLexer().stats)
+
+
+class KeywordLexer(Lexer):
+    INT  = r"[0-9]+"
+    ID   = r"[A-Za-z_]+"
+    SET  = r"="
+    
+    keywords = {"set": "SET", "to": "TO"}
+    ignore = " \n"
+
+
+class KeywordTest(unittest.TestCase):
+    def test_promotion(self):
+        self.assertEqual(KeywordLexer.tokens, ("INT", "ID", "SET", "TO"))
+        source = "set settle to 1 = total"
+        expected = [("SET", "set"), ("ID", "settle"), ("TO", "to"), ("INT", "1"), ("SET", "="), ("ID", "total")]
+        tokens = KeywordLexer().lex_string(source).tokens
+        self.assertEqual([(t.type, t.value) for t in tokens], expected)
+        tokens = KeywordLexer().lex_bytes(source.encode()).tokens
+        self.assertEqual([(t.type, t.text) for t in tokens], expected)
+        lexer = KeywordLexer(instrument=True)
+        self.assertEqual(lexer.lex_string(source).tokens, KeywordLexer().lex_string(source).tokens)
+    
+    def test_modifier(self):
+        class ModifiedLexer(Lexer):
+            @token(r"[a-z]+")
+            def ID(self, t):
+                t.value = t.value.upper()
+                return t
+            
+            keywords = {"if": "IF"}
+            ignore = " "
+        
+        tokens = ModifiedLexer().lex_string("if iffy").tokens
+        self.assertEqual([(t.type, t.value) for t in tokens], [("IF", "IF"), ("ID", "IFFY")])
+        lexer = ModifiedLexer(instrument=True)
+        self.assertEqual(lexer.lex_string("if iffy").tokens, tokens)
+        self.assertEqual(lexer.stats.as_dict()["ID"]["successes"], 2)
+    
+    def test_unmatched_keyword(self):
+        with self.assertRaises(ValueError):
+            class BadLexer(Lexer):
+                ID = r"[a-z]+"
+                keywords = {"if!": "IF"}
+                ignore = " "
+    
+    def test_generated(self):
+        namespace = {}
+        from parsergen.lexer_generator import LexerGenerator
+        exec(compile(LexerGenerator().generate(KeywordLexer), "<generated>", "exec"), namespace)
+        source = "set settle to 1 = total"
+        self.assertEqual(namespace["KeywordLexer"]().lex_string(source).tokens, KeywordLexer().lex_string(source).tokens)
+        self.assertEqual(namespace["TO"], token_type_id("TO"))
+
+
+class AsyncTest(unittest.TestCase):
+    def test_lex_async(self):
+        import asyncio
+        # small chunks split tokens and multi-byte characters between reads
+        source = "".join(f'x{c} + {c}\n"é {c}" + y\n' for c in range(300))
+        
+        async def lex():
+            reader = asyncio.StreamReader()
+            data = source.encode()
+            for start in range(0, len(data), 7):
+                reader.feed_data(data[start:start + 7])
+            reader.feed_eof()
+            return [tok async for tok in ParallelLexer().lex_async(reader, chunk_size=5, lookahead=64)]
+        
+        tokens = asyncio.run(lex())
+        expected = ParallelLexer().lex_string(source).tokens
+        self.assertEqual(tokens, list(expected))
+        self.assertEqual([t.start for t in tokens], [t.start for t in expected])